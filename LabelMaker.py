@@ -2,15 +2,27 @@
 
 import tkinter as tk
 import tkinter.messagebox
-import os
 
 from PIL import ImageTk, Image
 from tkinter import ttk
-from static.MajorTypes import get_majortypes, get_subtypes, get_macs, get_vendors, get_assemblers, get_shapes, get_magazines
-from make_label_gui import load_barcodes
+from static.catalogue import catalogue, Family
+from label_engine import JobSpec, label_info, strip_options, stream_job
+from make_label_gui import set_preview_sink, strip_size
+from strip_preview import StripPages
+from job_stream import prune_jobs
 from stash_printed import Stasher
+from print_spooler import PrintSpooler, LP_COMMAND
+from raw_printer import PrinterPool
 from argparse import ArgumentParser
 
+# Count spinbox step (labels per strip) by major code, 14 for everything else
+COUNT_STEPS = dict([(code, 2) for code in ["WE", "WW", "WH", "CM", "SC"]] +
+                   [(code, 8) for code in ["BC", "BI", "TC", "TI", "TP", "TB", "TM"]] +
+                   [(code, 10) for code in ["ML", "MH"]])
+
+# Tile PCBs and tile modules get their own inputs whatever their family
+TILE_BOARD_INPUTS = {"TP": "PCB", "TB": "PCB", "TM": "Module"}
+
 # Class to make previewing widget of labels
 class LabelPreview(tk.Frame):
     
@@ -29,7 +41,12 @@ class LabelPreview(tk.Frame):
 
     def create_img_widget(self, im_path="./tmp/tmp_label.png"):
 
-        self.im = ImageTk.PhotoImage(Image.open(im_path))
+        # Last preview handed over by make_label_gui, shown by Update without reading the disk
+        self.latest = None
+
+        shown = Image.open(im_path)
+        self.im = ImageTk.PhotoImage(shown)
+        self.im_format = (shown.mode, shown.size)
         
         self.im_lbl = tk.Label(self, image = self.im, width = 700, height = 600) #height 600
         self.im_lbl.pack(fill=tk.X)
@@ -37,27 +54,81 @@ class LabelPreview(tk.Frame):
         self.update_btn = tk.Button(self, text = "Update", font=('Ariel', 24), command=self.update_img_widget)
         self.update_btn.pack(padx=20, pady=20)
 
+        # Paging through every strip of the last job, the mouse wheel over the image does the same
+        self.pages = None
+        self.page_num = 0
+
+        self.page_frame = tk.Frame(self)
+        self.page_frame.pack(padx=20)
+        self.prev_btn = tk.Button(self.page_frame, text = "<", font=('Ariel', 24), command=lambda: self.turn_page(-1), state = "disabled")
+        self.prev_btn.pack(side="left", padx=10)
+        self.page_lbl = tk.Label(self.page_frame, text = "", font=('Ariel', 18), width = 16)
+        self.page_lbl.pack(side="left")
+        self.next_btn = tk.Button(self.page_frame, text = ">", font=('Ariel', 24), command=lambda: self.turn_page(1), state = "disabled")
+        self.next_btn.pack(side="left", padx=10)
+        self.im_lbl.bind("<MouseWheel>", lambda e: self.turn_page(-1 if e.delta > 0 else 1))
+        self.im_lbl.bind("<Button-4>", lambda e: self.turn_page(-1))
+        self.im_lbl.bind("<Button-5>", lambda e: self.turn_page(1))
+
+        set_preview_sink(self.show_image)
+
+    def set_pages(self, pages):
+
+        # strip_preview.StripPages of a new job, opened on the last strip like the generation preview
+        if self.pages is not None:
+            self.pages.close()
+
+        self.pages = pages
+        self.show_page(len(pages) - 1)
+
+    def turn_page(self, step):
+
+        if self.pages is not None:
+            self.show_page(min(max(self.page_num + step, 0), len(self.pages) - 1))
+
+    def show_page(self, page_num):
+
+        self.page_num = page_num
+        self.show_image(self.pages.page(page_num))
+        self.page_lbl.configure(text = "Strip {} of {}".format(page_num + 1, len(self.pages)))
+        self.prev_btn["state"] = "normal" if page_num > 0 else "disabled"
+        self.next_btn["state"] = "normal" if page_num < len(self.pages) - 1 else "disabled"
+
+    def show_image(self, im):
+
+        # Strips of the same size are pasted into the existing PhotoImage, the widgets stay as they are
+        self.latest = im
+        if (im.mode, im.size) == self.im_format:
+            self.im.paste(im)
+        else:
+            self.im = ImageTk.PhotoImage(im)
+            self.im_format = (im.mode, im.size)
+            self.im_lbl.configure(image = self.im)
+
     def update_img_widget(self, im_path="./tmp/tmp_label.png"):
-        
-        self.im_lbl.destroy()
-        self.update_btn.destroy()
 
-        self.im = ImageTk.PhotoImage(Image.open(im_path))
-        
-        self.im_lbl = tk.Label(self, image = self.im, width = 700, height = 600)
-        self.im_lbl.pack(fill=tk.X)
-         
-        self.update_btn = tk.Button(self, text = "Update", font=('Ariel', 24), command=self.update_img_widget)
-        self.update_btn.pack(padx=20, pady=20)
+        if self.latest is not None:
+            self.show_image(self.latest)
+        else:
+            self.show_image(Image.open(im_path))
 
 class PrintOut(tk.Frame):
 
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, *args, lp_command=LP_COMMAND, raw_printers=None, **kwargs):
 
         tk.Frame.__init__(self, parent, *args, **kwargs)
         self.grid_propagate(0)
         self.parent = parent
 
+        # Printing happens on the spooler thread, status comes back through poll_spooler
+        self.spooler = PrintSpooler(lp_command, PrinterPool(raw_printers) if raw_printers else None)
+        self.job = None
+        self.job_length = None
+        self.stock = None
+        # Length the printer is known to be set to, None until a job carrying it prints
+        self.label_length = None
+        self.outstanding = 0
+
         self.pack(side = "left", padx=20, pady=20, fill=tk.X)
 
     def create_output_widgets(self):
@@ -78,15 +149,50 @@ class PrintOut(tk.Frame):
         
         self.print_btn = tk.Button(self, text="Print", command=self.print_label)
         self.print_btn.pack(padx=20,pady=20)
+
+        self.poll_spooler()
     
     def update_text(self, text):
         self.main_tb.insert(tk.END, "{}\n".format(text))
         self.main_tb.see(tk.END)
 
     def print_label(self):
+        if self.job is None:
+            self.update_text("No labels made yet, nothing to print")
+            return
         self.main_tb.insert(tk.END, "\nPrinting Label...\n")
         #self.stasher.backup()
-        os.system("lp -d Zebra -o raw tmp/tmp.zpl")
+        # Pressing Print again after a failure resumes from the last confirmed strip.
+        # The printer keeps its label length, it is left off only when nothing else is
+        # queued and the last job printed at this length. Several raw printers each
+        # have their own length, so there it always goes
+        shared = self.spooler.printers is None or len(self.spooler.printers.printers) == 1
+        known = shared and not self.outstanding and self.job_length == self.label_length
+        self.spooler.submit_job(self.job, None if known else self.job_length)
+        self.outstanding += 1
+
+    def set_job(self, job):
+        # The job is printed at the stock selected when it was made
+        self.job = job
+        self.job_length = self.stock
+        prune_jobs()
+
+    def set_label_length(self, path):
+        self.stock = path
+
+    def poll_spooler(self):
+        for kind, job, message in self.spooler.poll():
+            self.update_text(message)
+            if kind == "done":
+                self.outstanding -= 1
+                self.label_length = job.setup_name or self.label_length
+            elif kind == "error":
+                # The length command may not have reached the printer, send it again
+                self.outstanding -= 1
+                self.label_length = None
+                tkinter.messagebox.showerror("Printing failed", message)
+
+        self.after(200, self.poll_spooler)
 
     def repack_print(self):
         self.print_btn.destroy()
@@ -97,7 +203,7 @@ class PrintOut(tk.Frame):
 # Class to create and control all of the input for labels
 class InputWidgets(tk.Frame):
 
-    def __init__(self, parent, preview, printout, borders, *args, **kwargs):
+    def __init__(self, parent, preview, printout, borders, *args, debug=False, **kwargs):
 
         tk.Frame.__init__(self, parent, *args, **kwargs)
         self.grid_propagate(0)
@@ -107,6 +213,7 @@ class InputWidgets(tk.Frame):
         self.temp_widgets = []
 
         self.borders = borders
+        self.debug = debug
 
         self.pack(side = "left", padx=20, pady=20, fill=tk.BOTH, expand=True)
 
@@ -127,7 +234,7 @@ class InputWidgets(tk.Frame):
     def create_input_widgets(self):
         print("In LabelMaker.py: create_input_widgets")
 
-        os.system("lp -d Zebra -o raw setLabelLength_Nominal.zpl")
+        self.printout.set_label_length("setLabelLength_Nominal.zpl")
 
         self.input_frame = tk.Frame(self, highlightbackground="black", highlightthickness = 2)
         self.input_frame.pack(padx=20, pady=5, fill=tk.X)
@@ -163,7 +270,7 @@ class InputWidgets(tk.Frame):
 
     def create_module_inputs(self):
 
-        os.system("lp -d Zebra -o raw setLabelLength_Module.zpl")
+        self.printout.set_label_length("setLabelLength_Module.zpl")
 
         self.clear_temp_widgets()
 
@@ -204,7 +311,7 @@ class InputWidgets(tk.Frame):
         self.temp_widgets.append(self.MAC_lbl)
 
         self.mac = tk.StringVar()
-        self.mac_combo = ttk.Combobox(self.num_frame, textvariable=self.mac, values = list(get_macs().keys()))
+        self.mac_combo = ttk.Combobox(self.num_frame, textvariable=self.mac, values = list(catalogue.macs))
         self.mac_combo.pack(side="left", padx=20, pady=5)
 
         self.temp_widgets.append(self.mac_combo)
@@ -256,7 +363,7 @@ class InputWidgets(tk.Frame):
 
     def create_hexaboard_inputs(self):
 
-        os.system("lp -d Zebra -o raw setLabelLength_Nominal.zpl")
+        self.printout.set_label_length("setLabelLength_Nominal.zpl")
 
         self.clear_temp_widgets()
 
@@ -329,7 +436,7 @@ class InputWidgets(tk.Frame):
         self.temp_widgets.append(self.vendor_lbl)
 
         self.vendor = tk.StringVar()
-        self.vendor_combo = ttk.Combobox(self.prod_frame, textvariable=self.vendor, values = list(get_vendors().keys()))
+        self.vendor_combo = ttk.Combobox(self.prod_frame, textvariable=self.vendor, values = list(catalogue.vendors))
         self.vendor_combo.pack(side="left", padx=20, pady=5)
 
         self.temp_widgets.append(self.vendor_combo)
@@ -340,7 +447,7 @@ class InputWidgets(tk.Frame):
         self.temp_widgets.append(self.assembler_lbl)
 
         self.assembler = tk.StringVar()
-        self.assembler_combo = ttk.Combobox(self.prod_frame, textvariable=self.assembler, values = list(get_assemblers().keys()))
+        self.assembler_combo = ttk.Combobox(self.prod_frame, textvariable=self.assembler, values = list(catalogue.assemblers))
         self.assembler_combo.pack(side="left", padx=20, pady=5)
 
         self.temp_widgets.append(self.assembler_combo)
@@ -367,7 +474,7 @@ class InputWidgets(tk.Frame):
         self.temp_widgets.append(self.shape_lbl)
 
         self.shape = tk.StringVar()
-        self.shape_combo = ttk.Combobox(self.sn_frame, textvariable=self.shape, values = list(get_shapes().keys()))
+        self.shape_combo = ttk.Combobox(self.sn_frame, textvariable=self.shape, values = list(catalogue.shapes))
         self.shape_combo.pack(side="left", padx=20, pady=5)
 
         self.temp_widgets.append(self.shape_combo)
@@ -389,7 +496,7 @@ class InputWidgets(tk.Frame):
 
     def create_tile_inputs(self):
 
-        os.system("lp -d Zebra -o raw setLabelLength_Tile.zpl")
+        self.printout.set_label_length("setLabelLength_Tile.zpl")
 
         self.clear_temp_widgets()
 
@@ -414,7 +521,7 @@ class InputWidgets(tk.Frame):
         self.temp_widgets.append(self.magazine_lbl)
 
         self.magazine = tk.StringVar()
-        self.magazine_spin = ttk.Combobox(self.num_frame, textvariable=self.magazine, state="normal", values = list(get_magazines()))
+        self.magazine_spin = ttk.Combobox(self.num_frame, textvariable=self.magazine, state="normal", values = list(catalogue.magazines))
         self.magazine_spin.pack(side="left", padx=20, pady=5)
 
         self.temp_widgets.append(self.magazine_spin)
@@ -468,7 +575,7 @@ class InputWidgets(tk.Frame):
         self.sn = tk.StringVar()
         self.sn_spin = tk.Spinbox(self.sn_frame, from_=1, to=999999, textvariable=self.sn, state="normal")
         self.sn_spin.pack(side="left", padx=20, pady=5)
-        if self.majortype.get().find("Tile PCB") != -1:
+        if TILE_BOARD_INPUTS.get(self.major_code()) == "PCB":
             self.create_tile_pcb_mod_inputs("PCB")
 
         self.temp_widgets.append(self.sn_spin)
@@ -637,113 +744,39 @@ class InputWidgets(tk.Frame):
     def get_label(self):
         print("LabelMaker.py: get_label") 
 
-        lbl_info = self.get_label_info()
-
-        print(lbl_info)
-
-        print("Making Labels...")
-        if lbl_info[0]["major_sn"] in ["12", "13", "14", "15"]: #remove 29
-            zpl, barcodes = load_barcodes(lbl_info, wagon=True, borders = self.borders)
-        elif lbl_info[0]["major_sn"] in ["29"]:
-            if lbl_info[0]["sub_code"] in ["FFH3"] or lbl_info[0]["sub_code"] in ["FBH3"]:
-                os.system("lp -d Zebra -o raw setLabelLength_Flex.zpl")
-                zpl, barcodes = load_barcodes(lbl_info, flex=True, borders = self.borders)
-            else:
-                zpl, barcodes = load_barcodes(lbl_info, wagon=True, borders = self.borders)
-        elif lbl_info[0]["major_sn"] in ["8","9"]:
+        spec = self.get_job_spec(subtype=self.subtype.get(), production=self.prod.get() == "Production")
+        if spec.family() == "module":
             print(self.mac.get(), self.roc_num.get())
-            zpl, barcodes = load_barcodes(lbl_info, module=True, MAC=get_macs()[self.mac.get()]["mac_code"], ROC=self.roc_num.get(), borders = self.borders)
-        else:
-            zpl, barcodes = load_barcodes(lbl_info, borders = self.borders)
-
-        self.stasher = Stasher(barcodes)
-        overlap, serial = self.stasher.search()
-
-        if overlap:
-            message = "The following serial numbers have already been printed:\n"
-            for s in serial:
-                message += "{}\n".format(s)
-            message += "Continue anyway?"
-            override = tkinter.messagebox.askyesno('Warning!', message)
-            if not override: return
-            else:
-                override = tkinter.messagebox.askyesno('Final Warning!', 'You are risking printing the same label twice which could cause major confusion. Are you sure?')
-                if not override: return
-
-        with open("tmp/tmp.zpl", 'w') as f:
-            f.write(zpl)
-        f.close()
-
-        self.preview.update_img_widget()
-       
-        for i in barcodes:
-            self.printout.update_text("Making label with S/N: {}".format(i.full_serial))
-
-    def get_label_info(self):
-
-        print("Getting label info")
-
-        majortypes = self.get_majortypes()
-        subtypes = self.get_subtypes()
+            spec.mac = self.mac.get()
+            spec.roc = self.roc_num.get()
 
-        self.label_info = []
-
-        num_lbl = int(self.num.get())
-        start = int(self.sn.get())
-
-        for i in range(start, start+num_lbl):
-            temp_lbl_info = {}
-            temp_lbl_info["major_sn"] = str(majortypes[self.majortype.get()]["major_sn"])
-            temp_lbl_info["sub_sn"] = str(subtypes[self.subtype.get()]["sub_sn"])
-            temp_lbl_info["sn"] = i 
-            temp_lbl_info["prod"] = self.prod == "Production"
-            temp_lbl_info["major_name"] = self.majortype.get()
-            temp_lbl_info["major_code"] = majortypes[self.majortype.get()]["major_code"]
-            temp_lbl_info["sub_name"] = self.subtype.get()
-            temp_lbl_info["sub_code"] = subtypes[self.subtype.get()]["sub_code"]
-            self.label_info.append(temp_lbl_info)
-
-        return self.label_info
+        self.make_labels(spec)
 
     def get_label_tile(self):
-        
-        lbl_info = self.get_label_info_tile()
 
-        print(lbl_info)
+        self.make_labels(self.get_job_spec(size=self.size.get(), batch=self.batch.get(), magazine=self.magazine.get(), per_magazine=self.nummag.get()))
 
-        print("Making Labels...")
-        zpl, barcodes = load_barcodes(lbl_info, tile=True, borders = self.borders)
+    def get_label_hexaboard(self):
 
-        self.stasher = Stasher(barcodes)
-        overlap, serial = self.stasher.search()
+        self.make_labels(self.get_job_spec(shape=self.shape.get(), generation=self.gen_num.get(), roc=self.roc_num.get(),
+                                           vendor=self.vendor.get(), assembler=self.assembler.get()))
 
-        if overlap:
-            message = "The following serial numbers have already been printed:\n"
-            for s in serial:
-                message += "{}\n".format(s)
-            message += "Continue anyway?"
-            override = tkinter.messagebox.askyesno('Warning!', message)
-            if not override: return
-            else:
-                override = tkinter.messagebox.askyesno('Final Warning!', 'You are risking printing the same label twice which could cause major confusion. Are you sure?')
-                if not override: return
+    def get_job_spec(self, **kwargs):
 
-        with open("tmp/tmp.zpl", 'w') as f:
-            f.write(zpl)
-        f.close()
+        # Widget values as a label_engine job, the generation itself does not touch Tk
+        return JobSpec(self.majortype.get(), count=self.num.get(), start=self.sn.get(), **kwargs)
 
-        self.preview.update_img_widget()
-       
-        for i in barcodes:
-            self.printout.update_text("Making label with S/N: {}".format(i.full_serial))
+    def make_labels(self, spec):
 
-    def get_label_hexaboard(self):
-        
-        lbl_info = self.get_label_info_hexaboard()
+        lbl_info = label_info(spec)
         print(lbl_info)
 
         print("Making Labels...")
-        zpl, barcodes = load_barcodes(lbl_info, hexaboard=True, borders = self.borders)
+        if "flex" in strip_options(spec, lbl_info):
+            self.printout.set_label_length("setLabelLength_Flex.zpl")
+
+        # StripPages renders the strips from the job, no preview image while generating
+        job, barcodes = stream_job(spec, borders = self.borders, debug = self.debug, preview = False)
 
         self.stasher = Stasher(barcodes)
         overlap, serial = self.stasher.search()
@@ -759,94 +792,13 @@ class InputWidgets(tk.Frame):
                 override = tkinter.messagebox.askyesno('Final Warning!', 'You are risking printing the same label twice which could cause major confusion. Are you sure?')
                 if not override: return
 
-        with open("tmp/tmp.zpl", 'w') as f:
-            f.write(zpl)
-        f.close()
+        self.printout.set_job(job)
 
-        self.preview.update_img_widget()
+        self.preview.set_pages(StripPages(job, strip_size(**strip_options(spec, lbl_info))))
        
         for i in barcodes:
             self.printout.update_text("Making label with S/N: {}".format(i.full_serial))
 
-    def get_label_info_hexaboard(self):
-
-        majortypes = self.get_majortypes()
-        subtypes = self.get_subtypes()
-
-        roc_version = self.roc_num.get()
-        gen_version = self.gen_num.get()
-
-        shape = self.shape.get()
-        vendor = self.vendor.get()
-        assembler = self.assembler.get()
-
-        shape_code = get_shapes()[shape]["shape_code"]
-        vendor_code = get_vendors()[vendor]["vendor_code"]
-        assembler_code = get_assemblers()[assembler]["assembler_code"]
-
-        self.label_info = []
-
-        num_lbl = int(self.num.get())
-        start = int(self.sn.get())
-        adjust_serial = 0
-
-        for i in range(start, start+num_lbl):
-            temp_lbl_info = {}
-            temp_lbl_info["major_sn"] = str(majortypes[self.majortype.get()]["major_sn"])
-            #temp_lbl_info["sub_sn"] = str(subtypes[self.subtype.get()]["sub_sn"])
-            #temp_lbl_info["pcb_vendor"] = get_vendors()[vendor]["vendor_code"]
-            #temp_lbl_info["assembler"] = get_vendors()[assembler]["assembler_code"]
-            temp_lbl_info["sn"] = i - adjust_serial
-            temp_lbl_info["major_name"] = self.majortype.get()
-            temp_lbl_info["major_code"] = majortypes[self.majortype.get()]["major_code"]
-            temp_lbl_info["sub_name"] = "{}{} {} {}{}".format(shape_code, gen_version, roc_version, vendor_code, assembler_code)
-            temp_lbl_info["sub_code"] = "{}{}{}{}{}".format(shape_code, gen_version, roc_version, vendor_code, assembler_code)
-            self.label_info.append(temp_lbl_info)
-
-        print(self.label_info)       
-        return self.label_info
-
-    def get_label_info_tile(self):
-
-        majortypes = self.get_majortypes()
-        size = self.size.get()
-        batch = self.batch.get()
-        startmag = self.magazine.get()
-        mag_index = get_magazines().index(startmag) 
-#        print("!!!!", magindex)
-        self.label_info = []
-        magperlab = int(self.nummag.get())
-        num_lbl = int(self.num.get())
-        start = int(self.sn.get())
-        adjust_serial = 0
-        adjust_mag = 0
-        label_count = 0
-
-        for i in range(start, start+num_lbl):
-            print("i:", i)
-            if i % magperlab == start and i != start:
-                adjust_serial += magperlab
-            print("Adjust serial:", adjust_serial)
-            temp_lbl_info = {}
-            temp_lbl_info["major_sn"] = str(majortypes[self.majortype.get()]["major_sn"])
-            temp_lbl_info["size"] = str(size)
-            temp_lbl_info["batch"] = str(batch)
-            temp_lbl_info["sn"] = i - adjust_serial
-            print("i - adjust_serial (SN):", temp_lbl_info["sn"])
-            temp_lbl_info["major_name"] = self.majortype.get()
-            temp_lbl_info["major_code"] = majortypes[self.majortype.get()]["major_code"]
-            if temp_lbl_info["major_code"] == "TC":
-                temp_lbl_info["sub_name"] = "PL"
-            else:
-                temp_lbl_info["sub_name"] = "B"
-       
-            mag_index = (i-1) // (magperlab)
-            print("Mag index:", mag_index)
-            temp_lbl_info["mag_code"] = "{}".format(get_magazines()[mag_index])
-            print("Mag Code:", temp_lbl_info["mag_code"])
-            self.label_info.append(temp_lbl_info)
-        print(self.label_info)       
-        return self.label_info
     #Helper functions to make interface nicer
     def enable_subtype(self, *args):
         new_vals = list(self.get_subtypes().keys())
@@ -857,33 +809,20 @@ class InputWidgets(tk.Frame):
         self.sn_spin['state'] = "normal"
         self.num_spin['state'] = "normal"
 
-        if self.majortype.get().find("Wagon") != -1 or self.majortype.get().find("Concentrator") != -1 or self.majortype.get().find("TB Cable") != 1:
-            self.num_spin["increment"] = 2
-            self.num_spin["from_"] = 2
-            self.num.set("2")
-        elif "Tile" in self.majortype.get():
-            self.num_spin["increment"] = 8
-            self.num_spin["from_"] = 8
-            self.num_spin.set("8")
-        elif any(x in self.majortype.get() for x in ["LD Module", "HD Module"]):
-            self.num_spin["increment"] = 10
-            self.num_spin["from_"] = 10
-            self.num_spin.set("10")
-        else:
-            self.num_spin["increment"] = 14
-            self.num_spin["from_"] = 14
-            self.num.set("14")
+        step = COUNT_STEPS.get(self.major_code(), 14)
+        self.num_spin["increment"] = step
+        self.num_spin["from_"] = step
+        self.num.set(str(step))
 
     def enable_other_widgets(self, *args):
-        if self.majortype.get().find("Tile PCB") != -1:
-            self.create_tile_pcb_mod_inputs("PCB")
-        elif self.majortype.get().find("Tile Module") != -1:
-            self.create_tile_pcb_mod_inputs("Module")
-        elif self.majortype.get().find("Bare") != -1 or self.majortype.get().find("Wrapped") != -1:
+        family = catalogue.family(self.majortype.get())
+        if self.major_code() in TILE_BOARD_INPUTS:
+            self.create_tile_pcb_mod_inputs(TILE_BOARD_INPUTS[self.major_code()])
+        elif family == Family.TILE:
             self.create_tile_inputs()
-        elif "Module" in self.majortype.get():
+        elif family == Family.MODULE:
             self.create_module_inputs()
-        elif "Hexaboard" in self.majortype.get():
+        elif family == Family.HEXABOARD:
             self.create_hexaboard_inputs()
         else:
             self.create_general_inputs()
@@ -891,14 +830,18 @@ class InputWidgets(tk.Frame):
     def make_preview(self):
         return
                 
+    def major_code(self):
+        major = catalogue.majors.get(self.majortype.get())
+        return major.code if major else None
+
     def get_majortypes(self):
-        return get_majortypes()
+        return catalogue.majors
 
     def get_subtypes(self):
-        return get_subtypes(self.majortype.get())
+        return catalogue.subtypes(self.majortype.get())
 
     def get_mag(self):
-        return get_magazines()
+        return catalogue.magazines
 
 # Main application class
 class LabelMakerApp(tk.Frame):
@@ -906,9 +849,12 @@ class LabelMakerApp(tk.Frame):
     def __init__(self, parent, *args, **kwargs):
 
         self.borders = kwargs["borders"]
+        self.debug = kwargs.get("debug", False)
+        self.lp_command = kwargs.get("lp_command", LP_COMMAND)
+        self.raw_printers = kwargs.get("raw_printers", None)
         temp_kwargs = {}
         for key,item in kwargs.items():
-            if key != "borders":
+            if key not in ["borders", "debug", "lp_command", "raw_printers"]:
                 temp_kwargs[key] = item
 
         kwargs = temp_kwargs
@@ -917,8 +863,8 @@ class LabelMakerApp(tk.Frame):
         self.parent = parent
 
         self.lbl_preview = LabelPreview(self.parent, width=600, height=1100, highlightbackground="black", highlightthickness = 2) #change height from 1100 to 650
-        self.printout = PrintOut(self.parent)
-        self.lbl_inputs = InputWidgets(self.parent, self.lbl_preview, self.printout, borders = self.borders,width=1100, height = 1100, highlightbackground="black", highlightthickness = 2) #change height from 1100 to 500
+        self.printout = PrintOut(self.parent, lp_command = self.lp_command, raw_printers = self.raw_printers)
+        self.lbl_inputs = InputWidgets(self.parent, self.lbl_preview, self.printout, borders = self.borders, debug = self.debug, width=1100, height = 1100, highlightbackground="black", highlightthickness = 2) #change height from 1100 to 500
 
 
 
@@ -927,6 +873,10 @@ if __name__ == "__main__":
     parser = ArgumentParser()
 
     parser.add_argument("--borders", action="store_true", default=False, help="Show borders around labels in preview (will also print)")
+    parser.add_argument("--debug", action="store_true", default=False, help="Write per-strip label.zpl and label directories while generating")
+    parser.add_argument("--lp", default=LP_COMMAND, help="Print command, jobs are written to its stdin (default: {})".format(LP_COMMAND))
+
+    parser.add_argument("--raw", nargs="+", default=None, help="Print straight to Zebra printers at HOST[:PORT] (port 9100) instead of lp")
 
     args = parser.parse_args()
 
@@ -934,6 +884,6 @@ if __name__ == "__main__":
 
     root.geometry("1800x1200") #originally 1800x1200
 
-    LabelMakerApp(root, borders = args.borders)
+    LabelMakerApp(root, borders = args.borders, debug = args.debug, lp_command = args.lp, raw_printers = args.raw)
 
     root.mainloop()
@@ -0,0 +1,254 @@
+#!/usr/bin/python3
+
+# Timings for the label generation paths. Each benchmark also checks that the fast
+# path gives exactly the same output as the plain one before reporting a speedup.
+#
+#   python benchmarks.py parallel --labels 10000 --workers 4
+#   python benchmarks.py templates
+#   python benchmarks.py stored --labels 1000
+#   python benchmarks.py datamatrix --labels 10000
+#   python benchmarks.py export --strips 1000
+#   python benchmarks.py graphics
+
+import io
+import os
+import time
+import argparse
+import tempfile
+import contextlib
+
+from static.catalogue import catalogue
+from label_engine import JobSpec, run_job, label_info, strip_options
+import make_label_gui
+from make_label_gui import strip_maker, load_barcodes
+from printer_memory import PrinterMemory
+from zpl_render import expand_formats, split_labels, render_zpl
+from strip_export import spec_strips, render_strips, export_strips
+from PIL import Image
+from graphic_cache import GraphicCache
+from graphic_compression import METHODS
+from job_stream import StreamJob
+import print_pictures
+import datamatrix
+
+# DataMatrix symbols per second on one core the preview and image export need
+DATAMATRIX_TARGET = 10000
+
+def hexaboard_job(labels):
+
+    return JobSpec("LD Hexaboard", count=labels, start=1, shape="Full", generation="4", roc="4", vendor="HiQ", assembler="Hybrid SA")
+
+def timed(function, *args, **kwargs):
+
+    # Generation prints a line per barcode, keep that out of the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+    return result, elapsed
+
+def bench_parallel(args):
+
+    # The pool against one process on zpl.Label strips, whatever the job size, to check
+    # make_label_gui.PARALLEL_MIN_LABELS
+    spec = hexaboard_job(args.labels)
+    info = label_info(spec)
+    options = dict(preview=False, templates=False, **strip_options(spec, info))
+
+    threshold = make_label_gui.PARALLEL_MIN_LABELS
+    make_label_gui.PARALLEL_MIN_LABELS = 0
+    try:
+        (zpl, barcodes), serial = timed(load_barcodes, info, workers=1, **options)
+        print("1 worker:   {:.2f} s ({:.0f} labels/s)".format(serial, args.labels / serial))
+
+        (zpl_n, barcodes_n), parallel = timed(load_barcodes, info, workers=args.workers, **options)
+        print("{} workers: {:.2f} s ({:.0f} labels/s)".format(args.workers, parallel, args.labels / parallel))
+    finally:
+        make_label_gui.PARALLEL_MIN_LABELS = threshold
+
+    same = zpl_n == zpl and [b.full_serial for b in barcodes_n] == [b.full_serial for b in barcodes]
+    print("Output identical: {}, speedup {:.1f}x".format(same, serial / parallel))
+
+    return same
+
+def golden_jobs():
+
+    # One job of each label family, sized to leave a short last strip
+    return [JobSpec("LD Engine", subtype="EngV2", count=31, start=1),
+            JobSpec("LD Hexaboard", count=33, start=1, shape="Left", generation="4", roc="2", vendor="HiQ", assembler="Hybrid SA"),
+            JobSpec("HD Hexaboard", count=14, start=1, shape="Full", generation="3", roc="C", vendor="Plotech", assembler="Piotech"),
+            JobSpec("LD Module", subtype="Full, 300 um, CuW baseplate", count=23, start=1, mac="UCSB", roc="4"),
+            JobSpec("HD Module", subtype="Full, 200 um, CuW baseplate", count=10, start=1, mac="CMU", roc="X"),
+            JobSpec("Wrapped Injection-Molded Tile", count=19, start=1, size="2", batch="5", per_magazine=8),
+            JobSpec("Wrapped Cast Machined Tile", count=8, start=1, size="4", batch="1059", per_magazine=8),
+            JobSpec("LD Wagon West", subtype="West 1A", count=6, start=1),
+            JobSpec("Concentrator Mezzanine", subtype=next(iter(catalogue.subtypes("Concentrator Mezzanine"))), count=4, start=1),
+            JobSpec("TB Cable", subtype="Flex Cable FH", count=4, start=1)]
+
+def job_strips(spec, templates, borders=False):
+
+    # The strips of a job from already made barcodes, so only the layout work is timed
+    info = label_info(spec.validate())
+    per_strip, make_barcode, make_strip = strip_maker(borders=borders, templates=templates, **strip_options(spec, info))
+    with contextlib.redirect_stdout(io.StringIO()):
+        slices = [[make_barcode(x) for x in info[i:i+per_strip]] for i in range(0, len(info), per_strip)]
+
+    return lambda: [make_strip(barcodes, False)[1] for barcodes in slices]
+
+def bench_templates(args):
+
+    # Golden check: compiled layouts against the zpl.Label method calls for every family
+    mismatches = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for spec in golden_jobs():
+            for borders in (False, True):
+                if job_strips(spec, False, borders)() != job_strips(spec, True, borders)():
+                    mismatches.append("{} borders={}".format(spec, borders))
+
+    for mismatch in mismatches:
+        print("Mismatch: {}".format(mismatch))
+    same = not mismatches
+    print("Golden check over {} jobs: {}".format(len(golden_jobs()) * 2, "OK" if same else "FAILED"))
+
+    spec = hexaboard_job(args.labels)
+    plain, plain_time = timed(job_strips(spec, False))
+    compiled, compiled_time = timed(job_strips(spec, True))
+    print("zpl.Label calls:  {:.3f} s ({:.0f} labels/s)".format(plain_time, args.labels / plain_time))
+    print("Compiled layouts: {:.3f} s ({:.0f} labels/s)".format(compiled_time, args.labels / compiled_time))
+    print("Output identical: {}, speedup {:.1f}x".format(plain == compiled, plain_time / compiled_time))
+
+    return same and plain == compiled
+
+def bench_stored(args):
+
+    # Bytes sent for a hexaboard and a module job as full strips and as ^XF recalls of stored formats
+    same = True
+    specs = [hexaboard_job(args.labels), JobSpec("LD Module", subtype="Full, 300 um, CuW baseplate", count=args.labels, start=1, mac="UCSB", roc="4")]
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        for spec in specs:
+            memory = PrinterMemory("benchmark", os.path.join(state_dir, "memory.json"))
+            (plain, barcodes), plain_time = timed(run_job, spec)
+            (first, barcodes), first_time = timed(run_job, spec, memory=memory)
+            memory.confirm()
+            (resident, barcodes), resident_time = timed(run_job, spec, memory=memory)
+
+            # Recalls expanded with the downloaded formats have to be the plain strips
+            expected = split_labels(plain)
+            same = same and split_labels(expand_formats(first)) == expected and split_labels(expand_formats(first + resident)) == expected * 2
+
+            print("{}: {} labels".format(spec.major_type, args.labels))
+            print("  Full strips:      {:8d} bytes {:.3f} s".format(len(plain), plain_time))
+            print("  With downloads:   {:8d} bytes {:.3f} s".format(len(first), first_time))
+            print("  Formats resident: {:8d} bytes {:.3f} s ({:.1f}x fewer bytes)".format(len(resident), resident_time, len(plain) / len(resident)))
+
+    print("Output identical: {}".format(same))
+
+    return same
+
+def bench_datamatrix(args):
+
+    # Unique serials, so neither the symbol cache nor anything else is reused between them
+    serials = ["320MLF3W4UCSB{:06d}".format(n) for n in range(args.labels)]
+
+    datamatrix.encode_many(serials[:10])
+    start = time.perf_counter()
+    matrices = datamatrix.encode_many(serials)
+    elapsed = time.perf_counter() - start
+    rate = args.labels / elapsed
+    print("encode_many: {} symbols {:.3f} s ({:.0f} symbols/s, target {}: {})".format(args.labels, elapsed, rate, DATAMATRIX_TARGET, "met" if rate >= DATAMATRIX_TARGET else "MISSED"))
+
+    datamatrix.symbol_image.cache_clear()
+    images, uncached = timed(lambda: [datamatrix.symbol_image(s, 4) for s in serials[:1000]])
+    cached_images, cached = timed(lambda: [datamatrix.symbol_image(s, 4) for s in serials[:1000]])
+    print("symbol_image: 1000 symbols {:.3f} s, cached {:.4f} s".format(uncached, cached))
+
+    same = matrices == [datamatrix.encode(s) for s in serials]
+    same = same and all(a is b and a.tobytes() == datamatrix.to_image(m, 4).tobytes() for a, b, m in zip(images, cached_images, matrices))
+    print("Output identical: {}".format(same))
+
+    return same
+
+def bench_export(args):
+
+    # Render a hexaboard job of args.strips strips and write it as TIFF pages and as PNGs
+    spec = hexaboard_job(args.strips * 14)
+    size, strips = spec_strips(spec)
+    strips, make_time = timed(list, strips)
+    print("{} strips made in {:.2f} s".format(len(strips), make_time))
+
+    images, render_time = timed(lambda: list(render_strips(strips, size)))
+    print("Render:     {:.2f} s ({:.0f} strips/s)".format(render_time, len(strips) / render_time))
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        tiff_path = os.path.join(out_dir, "strips.tif")
+        png_dir = os.path.join(out_dir, "png")
+        count, tiff_time = timed(export_strips, iter(images), tiff_path)
+        print("TIFF write: {:.2f} s ({:.0f} strips/s, {} bytes)".format(tiff_time, count / tiff_time, os.path.getsize(tiff_path)))
+        count, png_time = timed(export_strips, iter(images), png_dir)
+        print("PNG write:  {:.2f} s ({:.0f} strips/s)".format(png_time, count / png_time))
+
+        total = render_time + tiff_time
+        print("Render and TIFF: {:.2f} s ({:.0f} strips/s)".format(total, len(strips) / total))
+
+        # The pages read back, and a few strips rendered on their own, have to be the same images
+        same = True
+        with Image.open(tiff_path) as tiff:
+            same = same and tiff.n_frames == len(images)
+            for n in range(0, len(images), max(len(images) // 20, 1)):
+                tiff.seek(n)
+                with Image.open(os.path.join(png_dir, "strip_{:04d}.png".format(n))) as png:
+                    same = same and tiff.tobytes() == images[n].tobytes() == png.convert("1").tobytes()
+                same = same and render_zpl(strips[n], size[1], size[0]).tobytes() == images[n].tobytes()
+
+    print("Output identical: {}".format(same))
+
+    return same
+
+def bench_graphics(args):
+
+    # Wagon image jobs (every picture, 10 copies each) with each form of ^GFA data
+    image_quantities = {name[:-len(".png")]: 10 for name in sorted(os.listdir("./WagonImages/Images"))}
+
+    same = True
+    rendered = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        print_pictures.graphic_cache = GraphicCache(os.path.join(out_dir, "cache"))
+        for method in ["none"] + [m for m in METHODS if m != "none"]:
+            job_dir = os.path.join(out_dir, method)
+            job, elapsed = timed(print_pictures.png_to_job, image_quantities, job_dir, False, compression=method)
+            print("{:5s} {:9d} bytes {:.2f} s".format(method, len(job.read()), elapsed))
+
+            # Every strip has to render the same as with plain hex data
+            images = [render_zpl(job.strip(i).decode(), 50.8, 25.4).tobytes() for i in range(0, job.strips, 10)]
+            same = same and images == rendered.setdefault("images", images)
+
+        sizes = {method: len(StreamJob(os.path.join(out_dir, method)).read()) for method in METHODS}
+        print("auto is {:.1f}x fewer bytes than plain hex".format(sizes["none"] / sizes["auto"]))
+
+    print("Output identical: {}".format(same))
+
+    return same
+
+BENCHMARKS = {"parallel": bench_parallel, "templates": bench_templates, "stored": bench_stored, "datamatrix": bench_datamatrix, "export": bench_export, "graphics": bench_graphics}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark label generation")
+    parser.add_argument("benchmarks", nargs="*", default=sorted(BENCHMARKS), help="Benchmarks to run: {} (default: all)".format(", ".join(sorted(BENCHMARKS))))
+    parser.add_argument("--labels", type=int, default=10000, help="Labels per job (default: 10000)")
+    parser.add_argument("--strips", type=int, default=1000, help="Strips for the image export (default: 1000)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for the parallel run (default: all CPUs)")
+    args = parser.parse_args()
+
+    failed = []
+    for name in args.benchmarks:
+        print("== {} ==".format(name))
+        if not BENCHMARKS[name](args):
+            failed.append(name)
+
+    if failed:
+        raise SystemExit("Output mismatch in: {}".format(", ".join(failed)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/python3
+
+# ECC200 DataMatrix encoder used for offline label previews (^BX fields). The
+# Reed-Solomon tables are built at import and the module placement of each symbol
+# size the first time that size is used, so encoding a symbol is table lookups only.
+# Rendered symbols are kept in an LRU cache.
+
+from functools import lru_cache
+
+from PIL import Image
+
+# Rendered symbols kept by symbol_image, a strip preview needs at most a few dozen
+SYMBOL_CACHE = 4096
+
+# (rows, cols, data codewords, ecc codewords, data region size, interleaved blocks)
+SYMBOL_SIZES = [
+    (10, 10, 3, 5, 8, 1),
+    (12, 12, 5, 7, 10, 1),
+    (14, 14, 8, 10, 12, 1),
+    (16, 16, 12, 12, 14, 1),
+    (18, 18, 18, 14, 16, 1),
+    (20, 20, 22, 18, 18, 1),
+    (22, 22, 30, 20, 20, 1),
+    (24, 24, 36, 24, 22, 1),
+    (26, 26, 44, 28, 24, 1),
+    (32, 32, 62, 36, 14, 1),
+    (36, 36, 86, 42, 16, 1),
+    (40, 40, 114, 48, 18, 1),
+    (44, 44, 144, 56, 20, 1),
+    (48, 48, 174, 68, 22, 1),
+    (52, 52, 204, 84, 24, 2),
+    (64, 64, 280, 112, 14, 2),
+    (72, 72, 368, 144, 16, 4),
+    (80, 80, 456, 192, 18, 4),
+    (88, 88, 576, 224, 20, 4),
+    (96, 96, 696, 272, 22, 4),
+    (104, 104, 816, 336, 24, 6),
+    (120, 120, 1050, 408, 18, 6),
+    (132, 132, 1304, 496, 20, 8),
+]
+
+# GF(256) arithmetic over the ECC200 polynomial x^8 + x^5 + x^3 + x^2 + 1
+GF_EXP = [0] * 512
+GF_LOG = [0] * 256
+
+_x = 1
+for _i in range(255):
+    GF_EXP[_i] = _x
+    GF_LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x12D
+for _i in range(255, 512):
+    GF_EXP[_i] = GF_EXP[_i - 255]
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return GF_EXP[GF_LOG[a] + GF_LOG[b]]
+
+def rs_generator(n):
+
+    poly = [1]
+    for i in range(1, n + 1):
+        nxt = [0] * (len(poly) + 1)
+        for j, c in enumerate(poly):
+            nxt[j] ^= c
+            nxt[j + 1] ^= gf_mul(c, GF_EXP[i])
+        poly = nxt
+
+    return poly
+
+def rs_table(n):
+
+    # The generator (without its leading 1) times every factor, packed into n byte integers
+    gen = rs_generator(n)[1:]
+    return [int.from_bytes(bytes(gf_mul(g, f) for g in gen), "big") for f in range(256)]
+
+# One table per block ECC length, so a division step is a shift and an xor
+RS_TABLES = {n: rs_table(n) for n in set(ecc // blocks for _, _, _, ecc, _, blocks in SYMBOL_SIZES)}
+
+def rs_encode(data, n):
+
+    table = RS_TABLES[n]
+    shift = 8 * (n - 1)
+    mask = (1 << (8 * n)) - 1
+    ecc = 0
+    for d in data:
+        ecc = ((ecc << 8) & mask) ^ table[d ^ (ecc >> shift)]
+
+    return list(ecc.to_bytes(n, "big"))
+
+def encode_ascii(text):
+
+    data = text.encode("latin-1")
+    codewords = []
+
+    i = 0
+    while i < len(data):
+        c = data[i]
+        if 48 <= c <= 57 and i + 1 < len(data) and 48 <= data[i + 1] <= 57:
+            codewords.append(130 + (c - 48) * 10 + (data[i + 1] - 48))
+            i += 2
+            continue
+        if c > 127:
+            codewords.append(235)
+            c -= 128
+        codewords.append(c + 1)
+        i += 1
+
+    return codewords
+
+def pick_symbol(n_data):
+
+    for size in SYMBOL_SIZES:
+        if size[2] >= n_data:
+            return size
+
+    raise ValueError("Payload too long for a square ECC200 symbol ({} codewords)".format(n_data))
+
+def pad_codewords(codewords, capacity):
+
+    codewords = list(codewords)
+    if len(codewords) < capacity:
+        codewords.append(129)
+    while len(codewords) < capacity:
+        pos = len(codewords) + 1
+        pad = 129 + ((149 * pos) % 253) + 1
+        if pad > 254:
+            pad -= 254
+        codewords.append(pad)
+
+    return codewords
+
+def add_ecc(data, size):
+
+    _, _, n_data, n_ecc, _, blocks = size
+    ecc_per_block = n_ecc // blocks
+    ecc = [0] * n_ecc
+
+    for b in range(blocks):
+        block = data[b::blocks]
+        block_ecc = rs_encode(block, ecc_per_block)
+        for j, c in enumerate(block_ecc):
+            ecc[b + j * blocks] = c
+
+    return data + ecc
+
+def place_modules(nrow, ncol):
+
+    # Annex F placement: each entry is (codeword index, bit mask) or a fixed 0/1
+    array = [[None] * ncol for _ in range(nrow)]
+
+    def module(row, col, chr, bit):
+        if row < 0:
+            row += nrow
+            col += 4 - ((nrow + 4) % 8)
+        if col < 0:
+            col += ncol
+            row += 4 - ((ncol + 4) % 8)
+        array[row][col] = (chr, 1 << (8 - bit))
+
+    def utah(row, col, chr):
+        module(row - 2, col - 2, chr, 1)
+        module(row - 2, col - 1, chr, 2)
+        module(row - 1, col - 2, chr, 3)
+        module(row - 1, col - 1, chr, 4)
+        module(row - 1, col, chr, 5)
+        module(row, col - 2, chr, 6)
+        module(row, col - 1, chr, 7)
+        module(row, col, chr, 8)
+
+    def corner(chr, cells):
+        for bit, (row, col) in enumerate(cells, 1):
+            module(row, col, chr, bit)
+
+    chr = 0
+    row = 4
+    col = 0
+
+    while True:
+        if row == nrow and col == 0:
+            corner(chr, [(nrow-1, 0), (nrow-1, 1), (nrow-1, 2), (0, ncol-2), (0, ncol-1), (1, ncol-1), (2, ncol-1), (3, ncol-1)])
+            chr += 1
+        if row == nrow - 2 and col == 0 and ncol % 4:
+            corner(chr, [(nrow-3, 0), (nrow-2, 0), (nrow-1, 0), (0, ncol-4), (0, ncol-3), (0, ncol-2), (0, ncol-1), (1, ncol-1)])
+            chr += 1
+        if row == nrow - 2 and col == 0 and ncol % 8 == 4:
+            corner(chr, [(nrow-3, 0), (nrow-2, 0), (nrow-1, 0), (0, ncol-2), (0, ncol-1), (1, ncol-1), (2, ncol-1), (3, ncol-1)])
+            chr += 1
+        if row == nrow + 4 and col == 2 and ncol % 8 == 0:
+            corner(chr, [(nrow-1, 0), (nrow-1, ncol-1), (0, ncol-3), (0, ncol-2), (0, ncol-1), (1, ncol-3), (1, ncol-2), (1, ncol-1)])
+            chr += 1
+
+        while True:
+            if row < nrow and col >= 0 and array[row][col] is None:
+                utah(row, col, chr)
+                chr += 1
+            row -= 2
+            col += 2
+            if not (row >= 0 and col < ncol):
+                break
+        row += 1
+        col += 3
+
+        while True:
+            if row >= 0 and col < ncol and array[row][col] is None:
+                utah(row, col, chr)
+                chr += 1
+            row += 2
+            col -= 2
+            if not (row < nrow and col >= 0):
+                break
+        row += 3
+        col += 1
+
+        if not (row < nrow or col < ncol):
+            break
+
+    if array[nrow-1][ncol-1] is None:
+        array[nrow-1][ncol-1] = 1
+        array[nrow-2][ncol-2] = 1
+        array[nrow-1][ncol-2] = 0
+        array[nrow-2][ncol-1] = 0
+
+    return array
+
+@lru_cache(maxsize=None)
+def symbol_layout(size):
+
+    # For one symbol size, (codeword, shift) for every module in reading order. Finder and
+    # timing patterns and fixed modules point at two extra codewords, 0 and 255
+    rows, cols, n_data, n_ecc, region, _ = size
+    zero, one = (n_data + n_ecc, 0), (n_data + n_ecc + 1, 0)
+
+    regions = rows // (region + 2)
+    nrow = ncol = regions * region
+    mapping = place_modules(nrow, ncol)
+
+    cells = []
+    for y in range(rows):
+        ry = y % (region + 2)
+        for x in range(cols):
+            rx = x % (region + 2)
+            if rx == 0 or ry == region + 1:
+                cells.append(one)
+            elif ry == 0:
+                cells.append(zero if x % 2 else one)
+            elif rx == region + 1:
+                cells.append(one if y % 2 else zero)
+            else:
+                cell = mapping[(y // (region + 2)) * region + ry - 1][(x // (region + 2)) * region + rx - 1]
+                if isinstance(cell, tuple):
+                    cells.append((cell[0], cell[1].bit_length() - 1))
+                else:
+                    cells.append(one if cell else zero)
+
+    return cells
+
+def encode(text):
+
+    # Returns the symbol as a list of rows of 0/1 (1 = dark module)
+    data = encode_ascii(text)
+    size = pick_symbol(len(data))
+    rows, cols, n_data, _, _, _ = size
+
+    codewords = add_ecc(pad_codewords(data, n_data), size) + [0, 255]
+    flat = [codewords[index] >> shift & 1 for index, shift in symbol_layout(size)]
+
+    return [flat[y:y + cols] for y in range(0, rows * cols, cols)]
+
+def encode_many(texts):
+
+    # Bit matrices for a batch of payloads (serials), in order
+    return [encode(text) for text in texts]
+
+def to_image(matrix, module_size=1):
+
+    # Ink mask ("L" mode, 255 = dark) scaled to module_size dots per module
+    rows = len(matrix)
+    cols = len(matrix[0])
+
+    im = Image.new("L", (cols, rows), 0)
+    im.putdata([255 if v else 0 for row in matrix for v in row])
+
+    if module_size != 1:
+        im = im.resize((cols * module_size, rows * module_size), Image.NEAREST)
+
+    return im
+
+@lru_cache(maxsize=SYMBOL_CACHE)
+def symbol_image(text, module_size=1):
+
+    # to_image(encode(text)), cached by payload and module size. Shared, do not draw on it
+    return to_image(encode(text), module_size)
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+
+# Content-addressed cache of ready-to-emit ^GFA graphics. Entries are keyed by a
+# hash of the source file bytes and the conversion settings (target size, dpmm),
+# kept in memory for the process and as one JSON file per entry on disk, so each
+# image is converted and hex encoded once ever instead of once per copy.
+
+import os
+import json
+import hashlib
+
+CACHE_DIR = "./tmp/graphic_cache"
+
+# Bump when the conversion changes so old entries are not reused
+CACHE_VERSION = 1
+
+def file_digest(path):
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+
+    return h.hexdigest()
+
+def graphic_key(path, *settings):
+
+    # Same file contents and settings give the same key, whatever the file is called
+    params = ",".join(str(s) for s in (CACHE_VERSION,) + settings)
+    return hashlib.sha256("{}|{}".format(file_digest(path), params).encode()).hexdigest()
+
+class GraphicCache:
+
+    def __init__(self, cache_dir=CACHE_DIR):
+
+        self.cache_dir = cache_dir
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, key):
+
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+
+        if key in self.memory:
+            return self.memory[key]
+
+        try:
+            with open(self.entry_path(key), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        self.memory[key] = entry
+        return entry
+
+    def put(self, key, entry):
+
+        self.memory[key] = entry
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp = self.entry_path(key) + ".tmp"
+            with open(temp, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp, self.entry_path(key))
+        except OSError as e:
+            print("Could not write graphic cache entry {}: {}".format(key, e))
+
+    def get_or_build(self, key, build):
+
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = build()
+            self.put(key, entry)
+        else:
+            self.hits += 1
+
+        return entry
+
+    def clear(self):
+
+        self.memory = {}
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+# Shared by every caller in the process
+graphic_cache = GraphicCache()
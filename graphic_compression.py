@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+
+# Compressed ^GFA graphic data. zpl writes bitmaps as plain ASCII hex, which for the
+# wagon pictures is mostly long runs of 0 and F. Two smaller forms the printer reads:
+#
+#   ACS   Zebra's run-length scheme: G-Y repeat the next hex digit 1-19 times, g-z
+#         20-400 times (counts add up), "," fills the row with 0, "!" with F, and ":"
+#         repeats the row above
+#   :Z64: zlib deflate of the bitmap, base64 encoded, followed by a CRC-16 of the base64
+#
+# compress_gfa tries both and keeps the smaller one, after decoding it again to check
+# it gives back exactly the original bitmap.
+
+import zlib
+import base64
+import binascii
+
+METHODS = ["auto", "acs", "z64", "none"]
+
+REPEAT_LOW = "GHIJKLMNOPQRSTUVWXY"
+REPEAT_HIGH = "ghijklmnopqrstuvwxyz"
+REPEAT_COUNTS = dict([(c, n + 1) for n, c in enumerate(REPEAT_LOW)] + [(c, 20 * (n + 1)) for n, c in enumerate(REPEAT_HIGH)])
+
+def repeat(char, count):
+
+    if count <= 2:
+        return char * count
+
+    return "z" * (count // 400) + (REPEAT_HIGH[count % 400 // 20 - 1] if count % 400 >= 20 else "") + (REPEAT_LOW[count % 20 - 1] if count % 20 else "") + char
+
+def acs_row(row):
+
+    # The hex digits of one row, runs counted and a trailing run of 0 or F left to the fill
+    out = []
+    end = len(row.rstrip("0"))
+    fill = ","
+    if end == len(row):
+        end = len(row.rstrip("F"))
+        fill = "!" if end < len(row) else ""
+
+    i = 0
+    while i < end:
+        j = i
+        while j < end and row[j] == row[i]:
+            j += 1
+        out.append(repeat(row[i], j - i))
+        i = j
+
+    return "".join(out) + fill
+
+def acs_encode(raw, row_bytes):
+
+    rows = raw.hex().upper()
+    width = row_bytes * 2
+    out = []
+    previous = None
+    for start in range(0, len(rows), width):
+        row = rows[start:start+width]
+        out.append(":" if row == previous else acs_row(row))
+        previous = row
+
+    return "".join(out)
+
+def z64_encode(raw):
+
+    data = base64.b64encode(zlib.compress(raw, 9)).decode()
+    return ":Z64:{}:{:04X}".format(data, binascii.crc_hqx(data.encode(), 0))
+
+def decode_acs(data, row_bytes):
+
+    # Plain hex is ACS without any counts or fills, so this reads both
+    width = row_bytes * 2
+    out = ""
+    row_start = 0
+    count = 0
+
+    for char in data:
+        if char in REPEAT_COUNTS:
+            count += REPEAT_COUNTS[char]
+            continue
+        elif char == "," or char == "!":
+            out += ("0" if char == "," else "F") * (row_start + width - len(out))
+        elif char == ":":
+            out = out[:row_start] + (out[row_start - width:row_start] if row_start else "0" * width)
+        elif char in "0123456789ABCDEFabcdef":
+            out += char * max(count, 1)
+        count = 0
+
+        while len(out) >= row_start + width:
+            row_start += width
+
+    return bytes.fromhex(out[:len(out) - len(out) % 2])
+
+def decode_graphic(data, total, row_bytes):
+
+    # The bitmap bytes of ^GFA/~DG data in any of the three forms, padded or cut to total
+    data = data.strip()
+    if data.startswith(":Z64:") or data.startswith(":B64:"):
+        body, crc = data[5:].rsplit(":", 1)
+        if crc and int(crc, 16) != binascii.crc_hqx(body.encode(), 0):
+            raise ValueError("Graphic data CRC mismatch")
+        raw = base64.b64decode(body)
+        if data.startswith(":Z64:"):
+            raw = zlib.decompress(raw)
+    else:
+        raw = decode_acs(data, row_bytes)
+
+    return raw[:total] + bytes(max(total - len(raw), 0))
+
+def compress_gfa(gfa, method="auto"):
+
+    # A ^GFA command with its data in the smallest form method allows. A form that does
+    # not decode back to the same bitmap is never used, the command is kept as it was
+    if method not in METHODS:
+        raise ValueError("Graphic compression must be one of {}".format(", ".join(METHODS)))
+
+    _, _, total, row_bytes, data = gfa.split(",", 4)
+    total, row_bytes = int(total), int(row_bytes)
+    if method == "none":
+        return gfa
+
+    raw = decode_graphic(data, total, row_bytes)
+    candidates = []
+    if method in ("auto", "acs"):
+        candidates.append(acs_encode(raw, row_bytes))
+    if method in ("auto", "z64"):
+        candidates.append(z64_encode(raw))
+
+    best = data
+    for candidate in candidates:
+        if len(candidate) < len(best) and decode_graphic(candidate, total, row_bytes) == raw:
+            best = candidate
+
+    if best is data:
+        return gfa
+
+    return "^GFA,{0},{0},{1},{2}".format(total, row_bytes, best)
@@ -0,0 +1,258 @@
+#!/usr/bin/python3
+
+# Orders a queue of mixed label jobs by label stock. Every change of stock means a
+# setLabelLength_* command and a calibration feed on the printer, so jobs on the same
+# stock are run back to back, but a job is only held back for batching if that does
+# not make any job miss a deadline that plain earliest-deadline-first would have met.
+#
+# Job files are label_engine job files, each spec may also have a "deadline"
+# ("YYYY-MM-DD" or "YYYY-MM-DD HH:MM").
+
+import os
+import json
+import argparse
+from datetime import datetime, timedelta
+
+from label_engine import JobSpec, run_job, job_barcodes, label_length_file
+from stash_printed import open_store, check_printed
+
+# Rough printer timings used to check deadlines
+LABEL_SECONDS = 0.5
+SWITCH_SECONDS = 20.0
+
+class ScheduledJob:
+
+    def __init__(self, item, stock, labels, deadline=None, seq=0):
+
+        self.item = item
+        self.stock = stock
+        self.labels = labels
+        self.deadline = deadline
+        self.seq = seq
+
+    def __repr__(self):
+        return "ScheduledJob({}, {}, {} labels, due {})".format(self.item, self.stock, self.labels, self.deadline)
+
+    def duration(self):
+
+        return timedelta(seconds=self.labels * LABEL_SECONDS)
+
+    def edf_key(self):
+
+        # Earliest deadline first, jobs without a deadline last, ties in submission order
+        return (self.deadline is None, self.deadline or datetime.max, self.seq)
+
+def count_switches(jobs, current_stock=None):
+
+    switches = 0
+    for job in jobs:
+        if job.stock != current_stock:
+            switches += 1
+            current_stock = job.stock
+
+    return switches
+
+def late_jobs(jobs, start, current_stock=None):
+
+    # Jobs that finish after their deadline when run in this order from start
+    late = set()
+    t = start
+    for job in jobs:
+        if job.stock != current_stock:
+            t += timedelta(seconds=SWITCH_SECONDS)
+            current_stock = job.stock
+        t += job.duration()
+        if job.deadline is not None and t > job.deadline:
+            late.add(job.seq)
+
+    return late
+
+def schedule(jobs, start=None, current_stock=None):
+
+    t = start or datetime.now()
+    remaining = sorted(jobs, key=ScheduledJob.edf_key)
+    order = []
+
+    while remaining:
+        late = late_jobs(remaining, t, current_stock)
+        job = remaining[0]
+
+        # Stay on the loaded stock if that makes nothing late that EDF would get out on time
+        for candidate in remaining:
+            if candidate.stock != current_stock:
+                continue
+            rest = [j for j in remaining if j is not candidate]
+            after = t + candidate.duration()
+            if late_jobs(rest, after, current_stock) <= late:
+                job = candidate
+            break
+
+        remaining.remove(job)
+        if job.stock != current_stock:
+            t += timedelta(seconds=SWITCH_SECONDS)
+            current_stock = job.stock
+        t += job.duration()
+        order.append(job)
+
+    return order
+
+def runs(jobs):
+
+    # [(stock, [jobs])] for each stretch of jobs on the same stock
+    grouped = []
+    for job in jobs:
+        if grouped and grouped[-1][0] == job.stock:
+            grouped[-1][1].append(job)
+        else:
+            grouped.append((job.stock, [job]))
+
+    return grouped
+
+def switch_report(queued, scheduled, current_stock=None):
+
+    before = count_switches(sorted(queued, key=lambda j: j.seq), current_stock)
+    after = count_switches(scheduled, current_stock)
+    late = late_jobs(scheduled, datetime.now(), current_stock)
+
+    report = "{} media switches instead of {} ({} saved)".format(after, before, before - after)
+    if late:
+        report += ", {} jobs will miss their deadline".format(len(late))
+
+    return report
+
+def parse_deadline(text):
+
+    for fmt in ["%Y-%m-%d %H:%M", "%Y-%m-%d"]:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+
+    raise ValueError("Bad deadline {!r}, expected YYYY-MM-DD or YYYY-MM-DD HH:MM".format(text))
+
+def load_jobs(paths):
+
+    jobs = []
+    for path in paths:
+        with open(path, "r") as f:
+            specs = json.load(f)
+        if isinstance(specs, dict):
+            specs = [specs]
+
+        for n, d in enumerate(specs):
+            d = dict(d)
+            deadline = d.pop("deadline", None)
+            spec = JobSpec.from_dict(d)
+            spec.name = spec.name or "{}_{}".format(os.path.splitext(os.path.basename(path))[0], n)
+            jobs.append(ScheduledJob(spec, label_length_file(spec), spec.count, parse_deadline(deadline) if deadline else None, len(jobs)))
+
+    return jobs
+
+def check_jobs(jobs, store, force=False):
+
+    # Jobs whose serials are neither printed already nor in another job of the queue,
+    # the others are reported and left out unless force
+    clashes = check_printed([(job, (b.full_serial for b in job_barcodes(job.item))) for job in jobs], store)
+    kept = []
+
+    for job in jobs:
+        clash = clashes.get(job)
+        if clash and not force:
+            print("Skipping {}: {} serials already printed or in another job (first {}), use --force to run anyway".format(job.item.name, len(clash), clash[0].serial))
+            continue
+        kept.append(job)
+
+    return kept
+
+def write_runs(stock_runs, outdir, spec=lambda job: job.item, with_setup=False, borders=False):
+
+    # One file per stock run, yields (stock, path, jobs, serials) as each is written;
+    # with_setup puts the setLabelLength_* commands at the top so the file prints on its own
+    os.makedirs(outdir, exist_ok=True)
+
+    for n, (stock, jobs) in enumerate(stock_runs):
+        outpath = os.path.join(outdir, "{:02d}_{}.zpl".format(n, os.path.splitext(stock)[0].replace("setLabelLength_", "")))
+        serials = []
+        with open(outpath, "w") as f:
+            if with_setup:
+                with open(stock, "r") as s:
+                    setup = s.read()
+                f.write(setup if setup.endswith("\n") else setup + "\n")
+            for job in jobs:
+                zpl, barcodes = run_job(spec(job), borders=borders)
+                f.write(zpl)
+                serials += [b.full_serial for b in barcodes]
+
+        yield stock, outpath, jobs, serials
+
+def output_runs(stock_runs, outdir, store=None, spooler=None, loaded=None, spec=lambda job: job.item, with_setup=False, borders=False):
+
+    # Writes the runs and stashes each one's serials as it is written, like label_engine's
+    # files, or with a spooler once the printer has taken the run
+    serials = {}
+
+    for stock, outpath, jobs, run_serials in write_runs(stock_runs, outdir, spec, with_setup, borders):
+        print("Wrote {} jobs, {} labels to {}".format(len(jobs), len(run_serials), outpath))
+        if spooler is None:
+            if store is not None:
+                added = store.add_many(run_serials)
+                print("Stashed {} printed labels in {}".format(added, store.db_path))
+            continue
+
+        # Each run carries its length command when the stock changes
+        serials[outpath] = run_serials
+        spooler.submit(outpath, stock if stock != loaded and not with_setup else None)
+        loaded = stock
+
+    if spooler is None:
+        return
+
+    spooler.stop()
+    for kind, job, message in spooler.poll():
+        if kind != "queued":
+            print(message)
+        if kind == "done" and store is not None:
+            added = store.add_many(serials[job.name])
+            print("Stashed {} printed labels in {}".format(added, store.db_path))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run label jobs grouped by label stock, keeping to their deadlines")
+    parser.add_argument("jobs", nargs="+", help="label_engine JSON job files, specs may have a \"deadline\"")
+    parser.add_argument("--outdir", default="./output/scheduled", help="Directory for the ZPL of each stock run (default: ./output/scheduled)")
+    parser.add_argument("--loaded", default=None, help="setLabelLength_* file the printer is already set to")
+    parser.add_argument("--print", dest="print_jobs", action="store_true", default=False, help="Send the runs to the printer through the spooler")
+    parser.add_argument("--raw", nargs="+", default=None, help="Print straight to these printers (HOST[:PORT]) instead of lp")
+    parser.add_argument("--dry-run", action="store_true", default=False, help="Only show the schedule")
+    parser.add_argument("--db", default="./static/printed_barcodes.db", help="Printed barcode store")
+    parser.add_argument("--no-stash", dest="stash", action="store_false", default=True, help="Do not check or record serials in the printed barcode store")
+    parser.add_argument("--force", action="store_true", default=False, help="Run jobs even if some serials were already printed")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.jobs)
+    for job in jobs:
+        job.item.validate()
+
+    store = None
+    if args.stash:
+        store = open_store(args.db)
+        jobs = check_jobs(jobs, store, args.force)
+
+    order = schedule(jobs, current_stock=args.loaded)
+
+    for stock, group in runs(order):
+        print("{}: {}".format(stock, ", ".join("{} ({})".format(j.item.name, j.deadline or "no deadline") for j in group)))
+    print(switch_report(jobs, order, args.loaded))
+
+    if args.dry_run:
+        return
+
+    spooler = None
+    if args.print_jobs:
+        from print_spooler import PrintSpooler
+        from raw_printer import PrinterPool
+        spooler = PrintSpooler(printers=PrinterPool(args.raw) if args.raw else None)
+
+    output_runs(runs(order), args.outdir, store, spooler, args.loaded)
+
+if __name__ == "__main__":
+    main()
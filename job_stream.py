@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+
+# On-disk streaming format for large print jobs. Strips (one ^XA...^XZ format each)
+# are appended to ~64 KB chunk files as they are generated, and the spooler records
+# the last strip the printer accepted in progress.json, so an interrupted job picks
+# up from there instead of being regenerated and resent from the start.
+#
+#   <job>/manifest.json   chunk list, strip counts, whether generation finished
+#   <job>/chunk_0000.zpl  strips, each followed by a newline
+#   <job>/progress.json   {"confirmed": <strips sent and accepted>}
+
+import os
+import json
+import time
+import shutil
+import argparse
+
+CHUNK_SIZE = 64 * 1024
+JOB_ROOT = "./tmp/jobs"
+
+# Jobs that were never sent are pruned only after this many seconds
+UNSENT_AGE = 7 * 24 * 3600
+
+def write_json(path, obj):
+
+    # Write then rename so a crash never leaves a half written manifest
+    temp = path + ".tmp"
+    with open(temp, "w") as f:
+        json.dump(obj, f)
+    os.replace(temp, path)
+
+def new_job_dir(root=JOB_ROOT, name="job"):
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    for n in range(1000):
+        path = os.path.join(root, "{}-{}-{:03d}".format(stamp, name, n))
+        if not os.path.exists(path):
+            os.makedirs(path)
+            return path
+
+    raise OSError("Could not create a job directory in {}".format(root))
+
+class JobWriter:
+
+    def __init__(self, job_dir, name=None, chunk_size=CHUNK_SIZE):
+
+        self.job_dir = job_dir
+        self.chunk_size = chunk_size
+        self.manifest = {"name": name or os.path.basename(job_dir), "chunks": [], "strips": 0, "complete": False}
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.buffer_first = 0
+
+        os.makedirs(job_dir, exist_ok=True)
+        write_json(os.path.join(job_dir, "progress.json"), {"confirmed": 0})
+        write_json(os.path.join(job_dir, "manifest.json"), self.manifest)
+
+    def add_strip(self, zpl):
+
+        data = (zpl + "\n").encode()
+        self.buffer.append(data)
+        self.buffer_bytes += len(data)
+        self.manifest["strips"] += 1
+
+        if self.buffer_bytes >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+
+        if not self.buffer:
+            return
+
+        name = "chunk_{:04d}.zpl".format(len(self.manifest["chunks"]))
+        with open(os.path.join(self.job_dir, name), "wb") as f:
+            f.write(b"".join(self.buffer))
+
+        self.manifest["chunks"].append({"file": name, "first": self.buffer_first, "strips": len(self.buffer), "lengths": [len(b) for b in self.buffer]})
+        write_json(os.path.join(self.job_dir, "manifest.json"), self.manifest)
+
+        self.buffer_first += len(self.buffer)
+        self.buffer = []
+        self.buffer_bytes = 0
+
+    def close(self):
+
+        self.flush()
+        self.manifest["complete"] = True
+        write_json(os.path.join(self.job_dir, "manifest.json"), self.manifest)
+
+        return StreamJob(self.job_dir)
+
+class StreamJob:
+
+    def __init__(self, job_dir):
+
+        self.job_dir = job_dir
+        self.reload()
+
+    def __repr__(self):
+        return "StreamJob({}, {}/{} strips confirmed)".format(self.name, self.confirmed, self.strips)
+
+    def reload(self):
+
+        with open(os.path.join(self.job_dir, "manifest.json"), "r") as f:
+            self.manifest = json.load(f)
+
+        with open(os.path.join(self.job_dir, "progress.json"), "r") as f:
+            self.confirmed = json.load(f)["confirmed"]
+
+        self.name = self.manifest["name"]
+        self.strips = self.manifest["strips"]
+
+    def finished(self):
+
+        return self.manifest["complete"] and self.confirmed >= self.strips
+
+    def confirm(self, strips):
+
+        self.confirmed = strips
+        write_json(os.path.join(self.job_dir, "progress.json"), {"confirmed": strips})
+
+    def reset(self):
+
+        self.confirm(0)
+
+    def chunks(self, start=None):
+
+        # Yields (first strip index, strips) for everything after the confirmed strip
+        start = self.confirmed if start is None else start
+
+        for chunk in self.manifest["chunks"]:
+            if chunk["first"] + chunk["strips"] <= start:
+                continue
+
+            with open(os.path.join(self.job_dir, chunk["file"]), "rb") as f:
+                data = f.read()
+
+            strips = []
+            offset = 0
+            for length in chunk["lengths"]:
+                strips.append(data[offset:offset+length])
+                offset += length
+
+            skip = max(start - chunk["first"], 0)
+            yield chunk["first"] + skip, strips[skip:]
+
+    def strip(self, index):
+
+        # One strip by index, read straight from its place in the chunk file
+        for chunk in self.manifest["chunks"]:
+            if chunk["first"] <= index < chunk["first"] + chunk["strips"]:
+                n = index - chunk["first"]
+                with open(os.path.join(self.job_dir, chunk["file"]), "rb") as f:
+                    f.seek(sum(chunk["lengths"][:n]))
+                    return f.read(chunk["lengths"][n])
+
+        raise IndexError("Job {} has no strip {}".format(self.name, index))
+
+    def read(self):
+
+        return b"".join(b"".join(strips) for first, strips in self.chunks(0))
+
+def prune_jobs(root=JOB_ROOT, keep=20, unsent_age=UNSENT_AGE):
+
+    # Past the newest keep jobs, remove the ones printed in full and the ones never sent
+    # that are older than unsent_age. Partly printed jobs are kept for resuming
+    if not os.path.isdir(root):
+        return
+
+    jobs = sorted(os.listdir(root))
+    for name in jobs[:max(len(jobs) - keep, 0)]:
+        path = os.path.join(root, name)
+        try:
+            job = StreamJob(path)
+            age = time.time() - os.path.getmtime(os.path.join(path, "manifest.json"))
+            if job.finished() or (job.confirmed == 0 and age > unsent_age):
+                shutil.rmtree(path)
+        except (OSError, ValueError, KeyError):
+            continue
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or rewind streamed print jobs")
+    parser.add_argument("jobs", nargs="*", help="Job directories (default: every job in {})".format(JOB_ROOT))
+    parser.add_argument("--reset", action="store_true", default=False, help="Mark the jobs as not printed so they are sent from the start")
+    parser.add_argument("--export", default=None, help="Write the full ZPL of a single job to this file")
+    args = parser.parse_args()
+
+    paths = args.jobs
+    if not paths and os.path.isdir(JOB_ROOT):
+        paths = [os.path.join(JOB_ROOT, j) for j in sorted(os.listdir(JOB_ROOT))]
+
+    for path in paths:
+        job = StreamJob(path)
+        if args.reset:
+            job.reset()
+        print(job)
+
+    if args.export and len(paths) == 1:
+        with open(args.export, "wb") as f:
+            f.write(StreamJob(paths[0]).read())
+
+if __name__ == "__main__":
+    main()
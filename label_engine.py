@@ -0,0 +1,333 @@
+#!/usr/bin/python3
+
+# Headless label pipeline. Does what InputWidgets.get_label / get_label_tile /
+# get_label_hexaboard do, but from a JobSpec instead of Tk variables, so jobs can
+# be scripted and batched without a display. LabelMaker builds a JobSpec from its
+# widgets and calls into here.
+#
+# Job files are JSON, either one spec or a list of specs, e.g.
+#   {"major_type": "LD Engine", "subtype": "EngV3", "count": 28, "start": 1}
+#   {"major_type": "HD Module", "subtype": "Full, 120 um, CuW baseplate", "count": 10, "start": 1, "mac": "UCSB", "roc": "X"}
+#   {"major_type": "LD Hexaboard", "count": 14, "start": 1, "shape": "Full", "generation": "4", "roc": "4", "vendor": "HiQ", "assembler": "Hybrid SA"}
+#   {"major_type": "Wrapped Cast Machined Tile", "count": 8, "start": 1, "size": "4", "batch": "1059", "per_magazine": 8}
+
+import os
+import copy
+import json
+import argparse
+from collections import namedtuple
+
+from static.catalogue import catalogue, Family
+from make_label_gui import load_barcodes, stream_barcodes, strip_maker
+
+SPEC_FIELDS = ["major_type", "subtype", "count", "start", "mac", "roc", "shape", "generation",
+               "vendor", "assembler", "size", "batch", "magazine", "per_magazine", "production", "name"]
+
+class JobSpec:
+
+    def __init__(self, major_type, subtype=None, count=14, start=1, mac=None, roc=None, shape=None,
+                 generation=None, vendor=None, assembler=None, size=None, batch=None, magazine="A",
+                 per_magazine=None, production=False, name=None):
+
+        self.major_type = major_type
+        self.subtype = subtype
+        self.count = int(count)
+        self.start = int(start)
+        self.mac = mac
+        self.roc = None if roc is None else str(roc)
+        self.shape = shape
+        self.generation = None if generation is None else str(generation)
+        self.vendor = vendor
+        self.assembler = assembler
+        self.size = None if size is None else str(size)
+        self.batch = None if batch is None else str(batch)
+        self.magazine = magazine
+        self.per_magazine = None if per_magazine is None else int(per_magazine)
+        self.production = bool(production)
+        self.name = name
+
+    def __repr__(self):
+        return "JobSpec({})".format(", ".join("{}={!r}".format(f, getattr(self, f)) for f in SPEC_FIELDS if getattr(self, f) is not None))
+
+    @classmethod
+    def from_dict(cls, d):
+
+        unknown = set(d) - set(SPEC_FIELDS)
+        if unknown:
+            raise ValueError("Unknown job spec fields: {}".format(", ".join(sorted(unknown))))
+
+        return cls(**d)
+
+    def to_dict(self):
+
+        return {f: getattr(self, f) for f in SPEC_FIELDS if getattr(self, f) is not None}
+
+    def family(self):
+
+        return catalogue.family(self.major_type)
+
+    def validate(self):
+
+        if self.major_type not in catalogue.majors:
+            raise ValueError("Unknown major type {!r}".format(self.major_type))
+        if self.count < 1:
+            raise ValueError("count must be at least 1")
+
+        family = self.family()
+        required = {Family.GENERAL: ["subtype"], Family.MODULE: ["subtype", "mac", "roc"], Family.TILE: ["size", "batch", "per_magazine"],
+                    Family.HEXABOARD: ["shape", "generation", "roc", "vendor", "assembler"]}[family]
+
+        missing = [f for f in required if getattr(self, f) is None]
+        if missing:
+            raise ValueError("{} jobs need {}".format(self.major_type, ", ".join(missing)))
+
+        if family in [Family.GENERAL, Family.MODULE] and self.subtype not in catalogue.subtypes(self.major_type):
+            raise ValueError("Unknown subtype {!r} for {}".format(self.subtype, self.major_type))
+        if family == Family.MODULE and self.mac not in catalogue.macs:
+            raise ValueError("Unknown MAC {!r}".format(self.mac))
+        if family == Family.HEXABOARD:
+            for field, table in [("shape", catalogue.shapes), ("vendor", catalogue.vendors), ("assembler", catalogue.assemblers)]:
+                if getattr(self, field) not in table:
+                    raise ValueError("Unknown {} {!r}".format(field, getattr(self, field)))
+        if family == Family.TILE and self.magazine not in catalogue.magazine_index:
+            raise ValueError("Unknown magazine {!r}".format(self.magazine))
+
+        return self
+
+class LabelBatch:
+
+    # Label data of one job. Fields every label shares are stored once and the serial
+    # numbers are a range, LabelRecords are made on access. A slice is a LabelBatch over
+    # part of the range, so sending strips to worker processes sends no per-label data.
+
+    __slots__ = ["numbers", "start", "major_sn", "major_name", "major_code", "sub_sn", "sub_name", "sub_code",
+                 "prod", "size", "batch", "per_magazine"]
+
+    def __init__(self, numbers, major_sn, major_name, major_code, sub_name, sub_sn=None, sub_code=None,
+                 prod=False, size=None, batch=None, per_magazine=None):
+
+        self.numbers = numbers
+        self.start = numbers.start
+        self.major_sn = major_sn
+        self.major_name = major_name
+        self.major_code = major_code
+        self.sub_sn = sub_sn
+        self.sub_name = sub_name
+        self.sub_code = sub_code
+        self.prod = prod
+        self.size = size
+        self.batch = batch
+        self.per_magazine = per_magazine
+
+    def __repr__(self):
+        return "LabelBatch({} {}, numbers {}-{})".format(self.major_name, self.sub_name, self.numbers.start, self.numbers.stop - 1)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        return (LabelRecord(self, n) for n in self.numbers)
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            part = copy.copy(self)
+            part.numbers = self.numbers[index]
+            return part
+
+        return LabelRecord(self, self.numbers[index])
+
+    def serial(self, number):
+
+        # Tile serials restart with every magazine, as long as the job starts inside the first one
+        if self.per_magazine is None or self.start >= self.per_magazine:
+            return number
+
+        return number - self.per_magazine * ((number - self.start) // self.per_magazine)
+
+    def mag_code(self, number):
+
+        # Magazine follows the serial, as in the GUI the starting magazine only picks the first one shown
+        return catalogue.magazine(number, self.per_magazine)
+
+class LabelRecord(namedtuple("LabelRecord", ["job", "number"])):
+
+    # One label of a LabelBatch (job), shared fields are read from the batch
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return getattr(self.job, name)
+
+    @property
+    def sn(self):
+        return self.job.serial(self.number)
+
+    @property
+    def mag_code(self):
+        return self.job.mag_code(self.number)
+
+def label_info(spec):
+
+    family = spec.family()
+    if family == Family.TILE:
+        return label_info_tile(spec)
+    elif family == Family.HEXABOARD:
+        return label_info_hexaboard(spec)
+
+    major = catalogue.major(spec.major_type)
+    subtype = major.subtypes[spec.subtype]
+
+    return LabelBatch(range(spec.start, spec.start + spec.count), str(major.sn), spec.major_type, major.code, spec.subtype,
+                      sub_sn=str(subtype["sub_sn"]), sub_code=subtype["sub_code"], prod=spec.production)
+
+def label_info_hexaboard(spec):
+
+    major = catalogue.major(spec.major_type)
+
+    shape_code = catalogue.shapes[spec.shape]["shape_code"]
+    vendor_code = catalogue.vendors[spec.vendor]["vendor_code"]
+    assembler_code = catalogue.assemblers[spec.assembler]["assembler_code"]
+
+    return LabelBatch(range(spec.start, spec.start + spec.count), str(major.sn), spec.major_type,
+                      major.code, "{}{} {} {}{}".format(shape_code, spec.generation, spec.roc, vendor_code, assembler_code),
+                      sub_code="{}{}{}{}{}".format(shape_code, spec.generation, spec.roc, vendor_code, assembler_code))
+
+def label_info_tile(spec):
+
+    major = catalogue.major(spec.major_type)
+
+    info = LabelBatch(range(spec.start, spec.start + spec.count), str(major.sn), spec.major_type,
+                      major.code, "PL" if major.code == "TC" else "B", size=spec.size, batch=spec.batch, per_magazine=spec.per_magazine)
+
+    # Running out of magazines is an error for the whole job, not for its last labels
+    info.mag_code(info.numbers[-1])
+
+    return info
+
+def strip_options(spec, info):
+
+    # load_barcodes keyword arguments, same dispatch as InputWidgets.get_label
+    family = spec.family()
+    if family == Family.TILE:
+        return {"tile": True}
+    elif family == Family.HEXABOARD:
+        return {"hexaboard": True}
+
+    major_sn = info.major_sn
+    if major_sn in ["12", "13", "14", "15"]:
+        return {"wagon": True}
+    elif major_sn in ["29"]:
+        if info.sub_code in ["FFH3", "FBH3"]:
+            return {"flex": True}
+        return {"wagon": True}
+    elif major_sn in ["8", "9"]:
+        return {"module": True, "MAC": catalogue.macs[spec.mac]["mac_code"], "ROC": spec.roc}
+
+    return {}
+
+def label_length_file(spec, info=None):
+
+    # setLabelLength_*.zpl the printer needs before this job
+    options = strip_options(spec, info or label_info(spec))
+    if "flex" in options:
+        return "setLabelLength_Flex.zpl"
+    elif "module" in options:
+        return "setLabelLength_Module.zpl"
+    elif "tile" in options:
+        return "setLabelLength_Tile.zpl"
+
+    return "setLabelLength_Nominal.zpl"
+
+def job_barcodes(spec):
+
+    # Barcodes (and so full serials) of a job without rendering any strips
+    info = label_info(spec.validate())
+    per_strip, make_barcode, make_strip = strip_maker(**strip_options(spec, info))
+
+    return [make_barcode(x) for x in info]
+
+def run_job(spec, borders=False, debug=False, preview=False, workers=1, memory=None):
+
+    info = label_info(spec.validate())
+    return load_barcodes(info, borders=borders, debug=debug, preview=preview, workers=workers, memory=memory, **strip_options(spec, info))
+
+def stream_job(spec, job_dir=None, borders=False, debug=False, preview=True, workers=1, memory=None):
+
+    info = label_info(spec.validate())
+    return stream_barcodes(info, job_dir, borders=borders, debug=debug, preview=preview, workers=workers, memory=memory, **strip_options(spec, info))
+
+def load_specs(path):
+
+    with open(path, "r") as f:
+        specs = json.load(f)
+
+    if isinstance(specs, dict):
+        specs = [specs]
+
+    return [JobSpec.from_dict(s) for s in specs]
+
+def main():
+    parser = argparse.ArgumentParser(description="Make label ZPL from job files without the GUI")
+    parser.add_argument("jobs", nargs="+", help="JSON job files, each holding one job spec or a list of them")
+    parser.add_argument("--outdir", default="./output", help="Directory for the generated .zpl files (default: ./output)")
+    parser.add_argument("--borders", action="store_true", default=False, help="Draw label borders")
+    parser.add_argument("--preview", action="store_true", default=False, help="Render tmp/tmp_label.png for each job")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to make the strips of big jobs drawn without templates (default: 1)")
+    parser.add_argument("--stored", metavar="PRINTER", default=None, help="Send strips as ^XF recalls of formats stored on this printer, downloading the ones it does not have yet")
+    parser.add_argument("--db", default="./static/printed_barcodes.db", help="Printed barcode store")
+    parser.add_argument("--no-stash", dest="stash", action="store_false", default=True, help="Do not check or record serials in the printed barcode store")
+    parser.add_argument("--force", action="store_true", default=False, help="Write jobs even if some serials were already printed")
+    args = parser.parse_args()
+
+    store = None
+    if args.stash:
+        from stash_printed import open_store
+        store = open_store(args.db)
+
+    # The files are printed later and maybe not all of them, so every file carries the
+    # downloads it needs; nothing is marked resident until the printer's record is updated
+    memory = None
+    if args.stored:
+        from printer_memory import PrinterMemory
+        memory = PrinterMemory(args.stored)
+
+    os.makedirs(args.outdir, exist_ok=True)
+    failed = 0
+
+    for path in args.jobs:
+        for n, spec in enumerate(load_specs(path)):
+            name = spec.name or "{}_{}".format(os.path.splitext(os.path.basename(path))[0], n)
+            if memory is not None:
+                memory.pending = []
+            try:
+                zpl, barcodes = run_job(spec, borders=args.borders, preview=args.preview, workers=args.workers, memory=memory)
+            except (ValueError, KeyError, IndexError) as e:
+                print("Skipping {}: {}".format(name, e))
+                failed += 1
+                continue
+
+            if store is not None and not args.force:
+                printed = store.contains_many(b.full_serial for b in barcodes)
+                if printed:
+                    serials = [b.full_serial for b in barcodes if b.full_serial in printed]
+                    print("Skipping {}: {} serials already printed (first {}), use --force to write anyway".format(name, len(serials), serials[0]))
+                    failed += 1
+                    continue
+
+            outpath = os.path.join(args.outdir, name + ".zpl")
+            with open(outpath, "w") as f:
+                f.write(zpl)
+
+            print("Wrote {} labels to {} (send {} first)".format(len(barcodes), outpath, label_length_file(spec)))
+
+            # Only a written file counts as printed, a skipped or failed job leaves no serials behind
+            if store is not None:
+                added = store.add_many(b.full_serial for b in barcodes)
+                print("Stashed {} printed labels in {}".format(added, store.db_path))
+
+    if failed:
+        print("{} jobs skipped".format(failed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+
+# Streaming label pipeline for jobs of any size. Every stage is a generator handling one
+# strip at a time, so memory use does not grow with the job and the first strip is at
+# the printer while the later ones are still being made:
+#
+#   strip_slices -> skip_printed -> render_strips -> spool_strips
+#
+# Labels come lazily from the job's LabelBatch in sending order (last strip first, as
+# load_barcodes sends them). Serials are stashed as each chunk is accepted by the
+# printer, so an interrupted job can be picked up again with --on-printed skip.
+#
+#   python label_pipeline.py big_job.json --raw 192.168.1.50
+#   python label_pipeline.py big_job.json --output big_job.zpl --no-stash
+
+import shlex
+import argparse
+
+from label_engine import label_info, strip_options, label_length_file, load_specs
+from make_label_gui import strip_maker
+from job_stream import CHUNK_SIZE
+from print_spooler import LP_COMMAND, send_lp
+from stash_printed import open_store, check_printed
+
+ON_PRINTED = ["stop", "skip", "print"]
+
+def strip_slices(info, per_strip):
+
+    # LabelBatch slices of one strip each, last strip first
+    for i in reversed(range(0, len(info), per_strip)):
+        yield info[i:i+per_strip]
+
+def check_job(info, make_barcode, store):
+
+    # stop: the whole job is looked up once before anything is sent, so a job that runs
+    # into printed serials is not left half printed. Serials are made lazily, not kept
+    clashes = check_printed([(None, (make_barcode(x).full_serial for x in info))], store)
+    if clashes:
+        printed = clashes[None]
+        raise ValueError("{} serials already printed (first {})".format(len(printed), printed[0].serial))
+
+def skip_printed(slices, make_barcode, store=None, on_printed="stop"):
+
+    # Barcodes of each strip. With skip, printed labels are left out strip by strip
+    for labels in slices:
+        barcodes = [make_barcode(x) for x in labels]
+
+        if store is not None and on_printed == "skip":
+            printed = store.contains_many(b.full_serial for b in barcodes)
+            if printed:
+                barcodes = [b for b in barcodes if b.full_serial not in printed]
+                if not barcodes:
+                    continue
+
+        yield barcodes
+
+def render_strips(chunks, make_strip):
+
+    for barcodes in chunks:
+        l, zpl = make_strip(barcodes, False)
+        yield barcodes, zpl
+
+def spool_strips(strips, send, chunk_size=CHUNK_SIZE):
+
+    # Sends the strips in chunk_size pieces and yields the barcodes of each piece once
+    # send returns. The first strip goes on its own so the printer starts right away
+    chunk = []
+    barcodes = []
+    size = 0
+    first = True
+
+    for strip_barcodes, zpl in strips:
+        data = (zpl + "\n").encode()
+        chunk.append(data)
+        barcodes += strip_barcodes
+        size += len(data)
+
+        if first or size >= chunk_size:
+            send(b"".join(chunk))
+            yield barcodes
+            chunk = []
+            barcodes = []
+            size = 0
+            first = False
+
+    if chunk:
+        send(b"".join(chunk))
+        yield barcodes
+
+def pipeline(spec, send, store=None, on_printed="stop", borders=False, memory=None, chunk_size=CHUNK_SIZE):
+
+    if on_printed not in ON_PRINTED:
+        raise ValueError("on_printed must be one of {}".format(", ".join(ON_PRINTED)))
+
+    info = label_info(spec.validate())
+    per_strip, make_barcode, make_strip = strip_maker(borders=borders, memory=memory, **strip_options(spec, info))
+
+    if store is not None and on_printed == "stop":
+        check_job(info, make_barcode, store)
+
+    chunks = skip_printed(strip_slices(info, per_strip), make_barcode, store, on_printed)
+    return spool_strips(render_strips(chunks, make_strip), send, chunk_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and print label jobs strip by strip, for jobs of any size")
+    parser.add_argument("jobs", nargs="+", help="label_engine JSON job files")
+    parser.add_argument("--raw", default=None, help="Print straight to this printer (HOST[:PORT]) instead of lp")
+    parser.add_argument("--lp", default=LP_COMMAND, help="Print command, each chunk is written to its stdin (default: {})".format(LP_COMMAND))
+    parser.add_argument("--output", default=None, help="Append the ZPL to this file instead of printing")
+    parser.add_argument("--loaded", default=None, help="setLabelLength_* file the printer is already set to")
+    parser.add_argument("--on-printed", choices=ON_PRINTED, default="stop", help="Already printed serials: stop the job, skip those labels, or print them anyway (default: stop)")
+    parser.add_argument("--stored", action="store_true", default=False, help="Send strips as recalls of formats stored on the printer (^DF/^XF)")
+    parser.add_argument("--borders", action="store_true", default=False, help="Draw label borders")
+    parser.add_argument("--db", default="./static/printed_barcodes.db", help="Printed barcode store")
+    parser.add_argument("--no-stash", dest="stash", action="store_false", default=True, help="Do not check or record serials in the printed barcode store")
+    args = parser.parse_args()
+
+    printer = None
+    if args.output:
+        out = open(args.output, "ab")
+        send = out.write
+    elif args.raw:
+        from raw_printer import PrinterPool
+        printer = PrinterPool([args.raw]).get()
+        send = printer.print_zpl
+    else:
+        command = shlex.split(args.lp)
+        send = lambda data: send_lp(command, data)
+
+    store = None
+    if args.stash:
+        store = open_store(args.db)
+
+    memory = None
+    if args.stored:
+        from printer_memory import PrinterMemory
+        memory = PrinterMemory(printer.address if printer is not None else "Zebra")
+
+    loaded = args.loaded
+    for path in args.jobs:
+        for spec in load_specs(path):
+            stock = label_length_file(spec)
+            if stock != loaded:
+                with open(stock, "rb") as f:
+                    send(f.read())
+                loaded = stock
+
+            labels = 0
+            try:
+                for barcodes in pipeline(spec, send, store, args.on_printed, args.borders, memory):
+                    # Only what the printer has taken counts as printed
+                    labels += len(barcodes)
+                    if store is not None:
+                        store.add_many(b.full_serial for b in barcodes)
+                    if memory is not None and not args.output:
+                        memory.confirm()
+                    print("{}: {} labels sent".format(spec.name or spec.major_type, labels))
+            except ValueError as e:
+                print("Stopped {} after {} labels: {}".format(spec.name or spec.major_type, labels, e))
+
+    if args.output:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+
+# Compiled strip layouts. A strip function (produce_strips, produce_strips_module, ...)
+# is run once with stand-in barcodes whose per-label fields (serial, full serial,
+# tile magazine) are marker strings, which leaves a template of the finished ZPL with
+# typed slots at every place a label field was printed. Every further strip with the
+# same kind of barcodes is made by filling the slots, no zpl.Label calls at all.
+# Integer fields (Barcode.number) get an int stand-in, so "{:06d}" formatting of
+# them is captured too.
+#
+# Templates are keyed by the strip function, its options and every other barcode
+# attribute (types, codes, nicknames...), so anything that changes the layout gets
+# its own template. Each template is checked against a normal render when it is
+# compiled, anything the markers cannot follow falls back to normal rendering.
+#
+# With a printer_memory.PrinterMemory the strips go out as stored formats instead:
+# the static part of each template is downloaded once with ^DF under a name hashed
+# from its contents (a changed layout is a new format, never a stale one), and every
+# strip is just ^XF plus its variable fields as ^FN data.
+
+import re
+import copy
+import hashlib
+
+from printer_memory import object_name
+from zpl_render import expand_formats
+
+# Attributes that change from label to label
+SLOT_FIELDS = ["serial", "full_serial", "mag", "number"]
+
+MARK = "\x1f"
+
+def refuse(self, *args):
+
+    # Anything but formatting would make the layout depend on the value, so no template
+    raise TypeError("label field used for more than formatting")
+
+class SlotStr(str):
+
+    # Stand-in for a string field, remembers how it was formatted
+
+    __eq__ = __ne__ = __lt__ = __le__ = __gt__ = __ge__ = refuse
+    __contains__ = __getitem__ = __len__ = __add__ = __mul__ = __mod__ = refuse
+    split = strip = replace = upper = lower = startswith = endswith = refuse
+    __hash__ = str.__hash__
+
+    def __new__(cls, name):
+        obj = str.__new__(cls, "{0}{1}|s|{0}".format(MARK, name))
+        obj.name = name
+        return obj
+
+    def __format__(self, spec):
+        return "{0}{1}|s|{2}{0}".format(MARK, self.name, spec)
+
+class SlotInt(int):
+
+    # Stand-in for an integer field, only formatting it is supported
+
+    __eq__ = __ne__ = __lt__ = __le__ = __gt__ = __ge__ = __bool__ = refuse
+    __add__ = __radd__ = __sub__ = __rsub__ = __mul__ = __floordiv__ = __mod__ = __index__ = refuse
+    __hash__ = int.__hash__
+
+    def __new__(cls, name):
+        obj = int.__new__(cls, 0)
+        obj.name = name
+        return obj
+
+    def __format__(self, spec):
+        return "{0}{1}|i|{2}{0}".format(MARK, self.name, spec)
+
+def stand_in(barcode, position):
+
+    # The slot type follows the field's own type
+    proxy = copy.copy(barcode)
+    for field in SLOT_FIELDS:
+        value = getattr(proxy, field, None)
+        if value is not None:
+            slot = SlotInt if isinstance(value, int) else SlotStr
+            setattr(proxy, field, slot("{}.{}".format(position, field)))
+
+    return proxy
+
+def compile_template(zpl):
+
+    # A str.format string with one numbered field per slot, and where each slot's value comes from
+    fmt = []
+    slots = []
+    for n, part in enumerate(zpl.split(MARK)):
+        if n % 2 == 0:
+            fmt.append(part.replace("{", "{{").replace("}", "}}"))
+        else:
+            name, conversion, spec = part.split("|", 2)
+            position, field = name.split(".")
+            fmt.append("{%d:%s}" % (len(slots), spec) if spec else "{%d}" % len(slots))
+            slots.append((int(position), field, conversion == "i"))
+
+    return "".join(fmt), slots
+
+def fill_template(template, barcodes):
+
+    fmt, slots = template
+    return fmt.format(*[int(getattr(barcodes[p], f)) if as_int else getattr(barcodes[p], f) for p, f, as_int in slots])
+
+FIELD_DATA_RE = re.compile(r"\^FD([^\^]*)")
+
+def stored_format(marked):
+
+    # Every ^FD holding a slot becomes a numbered ^FN field of the stored format
+    fields = []
+    def variable(match):
+        if MARK not in match.group(1):
+            return match.group(0)
+        fields.append(match.group(1))
+        return "^FN{}".format(len(fields))
+
+    body = FIELD_DATA_RE.sub(variable, marked)
+    name = object_name("F", hashlib.sha256(body.encode()).hexdigest())
+
+    download = "^XA^DFR:{}.ZPL^FS{}".format(name, body[len("^XA"):])
+    recall = "^XA^XFR:{}.ZPL^FS{}^XZ".format(name, "".join("^FN{}^FD{}^FS".format(n + 1, data) for n, data in enumerate(fields)))
+
+    return name, download, compile_template(recall)
+
+def barcode_key(barcode):
+
+    # Everything but the slot fields. A Barcode holds only those itself, the rest is its
+    # BarcodeType, which compares by value
+    return barcode.kind
+
+class StripTemplates:
+
+    # Drop-in for a strip function: strips(barcodes, preview) -> (label, zpl)
+
+    def __init__(self, produce, memory=None, **options):
+
+        self.produce = produce
+        self.memory = memory
+        self.options = options
+        self.templates = {}
+        self.compiled = 0
+        self.fallbacks = 0
+
+    def __call__(self, barcodes, preview=False):
+
+        # Debug runs write files per strip and the preview needs a real label, render those normally
+        l = None
+        if self.options.get("debug"):
+            return self.produce(barcodes, preview=preview, **self.options)
+        elif preview:
+            l, zpl = self.produce(barcodes, preview=True, **self.options)
+            if self.memory is None:
+                return l, zpl
+
+        key = tuple(barcode_key(b) for b in barcodes)
+        template = self.templates.get(key, False)
+        if template is False:
+            template = self.compile(barcodes)
+            self.templates[key] = template
+
+        if template is None:
+            self.fallbacks += 1
+            return self.produce(barcodes, preview=False, **self.options)
+
+        if self.memory is None:
+            return l, fill_template(template, barcodes)
+
+        # Download the format with the first strip that uses it, unless the printer has it already
+        name, download, recall = template
+        zpl = fill_template(recall, barcodes)
+        if not self.memory.is_resident(name) and name not in self.memory.pending:
+            self.memory.add_pending(name)
+            zpl = download + "\n" + zpl
+
+        return l, zpl
+
+    def compile(self, barcodes):
+
+        self.compiled += 1
+        try:
+            l, marked = self.produce([stand_in(b, i) for i, b in enumerate(barcodes)], preview=False, **self.options)
+            template = compile_template(marked)
+        except (ValueError, TypeError, AttributeError, IndexError, KeyError):
+            return None
+
+        # Only use the template if it gives exactly what the layout code gives
+        l, zpl = self.produce(barcodes, preview=False, **self.options)
+        if fill_template(template, barcodes) != zpl:
+            return None
+
+        if self.memory is not None:
+            name, download, recall = stored_format(marked)
+            if expand_formats(download + fill_template(recall, barcodes)) != zpl:
+                return None
+            return name, download, recall
+
+        return template
@@ -11,6 +11,30 @@ except ImportError:
     from urllib2 import urlopen
 import io
 
+from concurrent.futures import ProcessPoolExecutor
+
+from zpl_render import render_zpl
+from job_stream import JobWriter, new_job_dir
+from layout_templates import StripTemplates
+from static.catalogue import Family
+
+# Pool shards per worker for parallel generation, more shards even out the load
+SHARDS_PER_WORKER = 4
+
+# Sending the barcodes and ZPL back from the pool costs more per label than filling in
+# a compiled layout, benchmarks.py parallel gave 0.1-0.3x at 1k-50k labels. Only the
+# zpl.Label strips (templates=False) are slow enough to gain, on jobs this big
+PARALLEL_MIN_LABELS = 20000
+
+# Where strip previews go. None writes tmp/tmp_label.png, the GUI sets a function that
+# takes the PIL image so nothing goes through the disk
+preview_sink = None
+
+def set_preview_sink(sink):
+
+    global preview_sink
+    preview_sink = sink
+
 class myLabel(Label):
     
     def __init__(self, height=25.4, width=88.9, dpmm=8.0):
@@ -21,6 +45,17 @@ class myLabel(Label):
         self.code += ("^BX{},{},{},,,,,{}").format(orientation, height, sq, aspect)
 
     def preview(self, index=0, outfile="tmp/tmp_label.png"):
+        try:
+            im = render_zpl(self.dumpZPL(), self.width, self.height, self.dpmm, index)
+            if preview_sink is not None:
+                preview_sink(im)
+            else:
+                im.save(outfile)
+        except ValueError as e:
+            print(e)
+            raise Exception("Invalid preview rendered, mostlikely bad ZPL2 code generated.")
+
+    def preview_labelary(self, index=0, outfile="tmp/tmp_label.png"):
         try:
             url = 'http://api.labelary.com/v1/printers/%idpmm/labels/%fx%f/%i/' % (
                 self.dpmm, self.width/25.4, self.height/25.4, index)
@@ -32,54 +67,117 @@ class myLabel(Label):
             print(e)
             raise Exception("Invalid preview received, mostlikely bad ZPL2 code uploaded.")
 
-class Barcode:
-    
-    def __init__(self, label_dict, tile=False, module=False, hexaboard=False, MAC="", ROC="", vendor="", production=False):
-        print("In __init__ in class Barcode")
-        self.serial = str(label_dict['sn'])
+class BarcodeType:
+
+    # Everything the barcodes of one job share, made once per LabelBatch instead of per label.
+    # Which attributes are set depends on the label family. Compares by value, so it also
+    # tells layout_templates which strips can share a template
+    __slots__ = ["job", "options", "family", "first", "majorname", "nickname", "subtype", "batch", "size", "subcode", "code",
+                 "mac_code", "major_code", "sub_code", "roc_version", "thickness", "shape_gen", "roc", "va", "vendor",
+                 "serial_format", "key", "hash"]
+
+    # The BarcodeType of the last job, consecutive labels nearly always come from the same one
+    last = None
 
-        self.first = '320' #if not label_dict['prod'] else '320'
-        self.majorname = label_dict["major_name"]
-        self.nickname = label_dict["sub_name"]
+    def __init__(self, job, tile=False, module=False, hexaboard=False, MAC="", ROC="", vendor=""):
 
+        self.job = job
+        self.options = (tile, module, hexaboard, MAC, ROC, vendor)
+
+        self.first = '320' #if not job.prod else '320'
+        self.majorname = job.major_name
+        self.nickname = job.sub_name
+
+        # full_serial is serial_format filled with the serial number and magazine
         if tile:
-            self.subtype = "{:02d}".format(int(label_dict['major_sn'])) + "{:02d}".format(int(label_dict['size'])) + "{:04d}".format(int(label_dict['batch']))
-            self.batch = int(label_dict['batch'])
-            self.size = "{:02d}".format(int(label_dict['size']))
-            self.subcode = "{:02d}".format(int(label_dict['size'])) + "{:04d}".format(int(label_dict['batch']))
-            self.mag = label_dict['mag_code']
-            self.code = label_dict["major_code"] + self.subcode
-            self.full_serial = self.first + self.code + self.mag + "{:03d}".format(int(self.serial))
-            print("FULL SERIAL: ", self.full_serial)
+            self.family = Family.TILE
+            self.subtype = "{:02d}".format(int(job.major_sn)) + "{:02d}".format(int(job.size)) + "{:04d}".format(int(job.batch))
+            self.batch = int(job.batch)
+            self.size = "{:02d}".format(int(job.size))
+            self.subcode = "{:02d}".format(int(job.size)) + "{:04d}".format(int(job.batch))
+            self.code = job.major_code + self.subcode
+            serial_format = "{1}{0:03d}"
         elif module:
-            self.subtype = "{:02d}".format(int(label_dict['major_sn'])) + "{:03d}".format(int(label_dict['sub_sn']))
-            self.subcode = label_dict["major_code"] + label_dict['sub_code']+ ROC 
+            self.family = Family.MODULE
+            self.subtype = "{:02d}".format(int(job.major_sn)) + "{:03d}".format(int(job.sub_sn))
+            self.subcode = job.major_code + job.sub_code+ ROC 
             self.mac_code = MAC
-            self.code = label_dict["major_code"] + label_dict["sub_code"] + ROC + self.mac_code 
-            self.major_code = label_dict["major_code"]
-            self.sub_code = label_dict["sub_code"]
-            self.full_serial = self.first + self.code + "{:04d}".format(int(self.serial))
-            print(self.full_serial)
+            self.code = job.major_code + job.sub_code + ROC + self.mac_code 
+            self.major_code = job.major_code
+            self.sub_code = job.sub_code
             self.roc_version = ROC
-            self.thickness = "300um" if label_dict['sub_sn'][1] is "3" else "200um"
+            self.thickness = "300um" if job.sub_sn[1] == "3" else "200um"
+            serial_format = "{0:04d}"
         elif hexaboard:
-            self.subcode = label_dict["sub_code"]
-            self.code = label_dict["major_code"] + label_dict["sub_code"]
-            self.full_serial = self.first + self.code + "{:05d}".format(int(self.serial))
+            self.family = Family.HEXABOARD
+            self.subcode = job.sub_code
+            self.code = job.major_code + job.sub_code
             self.nickname = self.nickname.split(" ")
             self.shape_gen = str(self.nickname[0])
             self.roc = self.nickname[1]
             self.va = " ".join(self.nickname[2:])
+            serial_format = "{0:05d}"
         else:
-            self.subtype = "{:02d}".format(int(label_dict['major_sn'])) + label_dict['sub_sn']
-            self.subcode = label_dict["sub_code"]
-            self.code = label_dict["major_code"] + label_dict["sub_code"]
+            self.family = Family.GENERAL
+            self.subtype = "{:02d}".format(int(job.major_sn)) + job.sub_sn
+            self.subcode = job.sub_code
+            self.code = job.major_code + job.sub_code
             if vendor != "":
-                self.full_serial = self.first + self.code + "{}{:05d}".format(vendor, int(self.serial))
                 self.vendor = vendor
+                serial_format = vendor.replace("{", "{{").replace("}", "}}") + "{0:05d}"
             else:
-                self.full_serial = self.first + self.code + "{:06d}".format(int(self.serial))
-        
+                serial_format = "{0:06d}"
+
+        self.serial_format = (self.first + self.code).replace("{", "{{").replace("}", "}}") + serial_format
+
+        fields = [(f, getattr(self, f)) for f in BarcodeType.__slots__[2:-2] if hasattr(self, f)]
+        self.key = tuple((f, tuple(v) if v.__class__ is list else v) for f, v in fields)
+        self.hash = hash(self.key)
+
+    def __eq__(self, other):
+        return self is other or (other.__class__ is BarcodeType and self.key == other.key)
+
+    def __hash__(self):
+        return self.hash
+
+    @classmethod
+    def of(cls, job, *options):
+
+        kind = cls.last
+        if kind is None or kind.job is not job or kind.options != options:
+            kind = cls.last = cls(job, *options)
+
+        return kind
+
+class Barcode:
+
+    # One label: its own serials and magazine, everything else is read from its BarcodeType.
+    # number is the serial as an int, for the layouts that format it with padding
+    __slots__ = ["kind", "serial", "number", "full_serial", "mag"]
+
+    def __init__(self, label, tile=False, module=False, hexaboard=False, MAC="", ROC="", vendor="", production=False):
+        job = label.job
+        kind = BarcodeType.of(job, tile, module, hexaboard, MAC, ROC, vendor)
+        sn = job.serial(label.number)
+
+        self.kind = kind
+        self.serial = str(sn)
+        self.number = int(sn)
+        self.mag = job.mag_code(label.number) if tile else None
+        self.full_serial = kind.serial_format.format(sn, self.mag)
+
+        if tile:
+            print("FULL SERIAL: ", self.full_serial)
+        elif module:
+            print(self.full_serial)
+
+    def __getattr__(self, name):
+
+        # Only called for what is not a slot, "kind" itself is unset only while unpickling
+        if name == "kind":
+            raise AttributeError(name)
+        return getattr(self.kind, name)
+
     def get_nickname(self):
 
         labels = {  
@@ -104,8 +202,7 @@ class Barcode:
                     "990001":  "Test"
                  }
     
-        self.nickname = labels[str(self.subtype)]
-        return self.nickname
+        return labels[str(self.subtype)]
 
     def get_label_name(self):
         return self.nickname
@@ -125,7 +222,7 @@ def produce_barcode(barcode, x_offset=0, y_offset=0):
     l.endorigin()
 
     l.origin(1.70, 6.25)
-    l.write_text("{:06d}".format(int(barcode.serial)), char_height=2, char_width=2, line_width=6.3, orientation='N', justification='R')
+    l.write_text("{:06d}".format(barcode.number), char_height=2, char_width=2, line_width=6.3, orientation='N', justification='R')
     l.endorigin()
     
     print(l.dumpZPL())
@@ -251,7 +348,7 @@ def add_to_megalabel(megalabel, barcode, x_offset=1.5875, y_offset=1.5875, tile=
         megalabel.endorigin()
 
         megalabel.origin(4+x_offset, 14.0+y_offset)
-        megalabel.write_text("{}.{:03d}".format(str(barcode.mag), int(barcode.serial)), char_height=3, char_width=3, line_width=12.5, orientation='N', justification='R')
+        megalabel.write_text("{}.{:03d}".format(str(barcode.mag), barcode.number), char_height=3, char_width=3, line_width=12.5, orientation='N', justification='R')
         megalabel.endorigin()
 
         megalabel.origin(3+x_offset, 14.0+y_offset)
@@ -272,10 +369,10 @@ def add_to_megalabel(megalabel, barcode, x_offset=1.5875, y_offset=1.5875, tile=
     elif hexaboard:
         megalabel.reverse_print(active='N')
         megalabel.origin(0.25+x_offset, 7.00+y_offset)
-        megalabel.write_text("{:05d}".format(int(barcode.serial)), char_height=2, char_width=2, line_width=8.50, orientation='N', justification='R')
+        megalabel.write_text("{:05d}".format(barcode.number), char_height=2, char_width=2, line_width=8.50, orientation='N', justification='R')
     else:
         megalabel.origin(2.75+x_offset, 7.00+y_offset)
-        megalabel.write_text("{:06d}".format(int(barcode.serial)), char_height=2, char_width=2, line_width=6.00, orientation='N', justification='R')
+        megalabel.write_text("{:06d}".format(barcode.number), char_height=2, char_width=2, line_width=6.00, orientation='N', justification='R')
     megalabel.endorigin()
     
 def add_to_megalabel_module(megalabel, barcode, x_offset=1.5875, y_offset=1.5875, borders=False):
@@ -290,7 +387,7 @@ def add_to_megalabel_module(megalabel, barcode, x_offset=1.5875, y_offset=1.5875
     megalabel.endorigin()
 
     megalabel.origin(0.50+x_offset,2.50+y_offset)
-    megalabel.write_text("{} {:04d}".format(barcode.mac_code, int(barcode.serial)), char_height=2, char_width=2, line_width=12, orientation='N', justification='C')
+    megalabel.write_text("{} {:04d}".format(barcode.mac_code, barcode.number), char_height=2, char_width=2, line_width=12, orientation='N', justification='C')
     megalabel.endorigin()
 
     megalabel.origin(0.75+x_offset, 4.5+y_offset)
@@ -347,9 +444,9 @@ def add_to_megalabel_tile(megalabel, barcode, x_offset=1.5875, y_offset=1.5875,
 
     megalabel.origin(2.75+x_offset, 8.00+y_offset)
     if tile:
-        megalabel.write_text("{:04d}:{:01d}".format(int(barcode.batch),int(barcode.serial)), char_height=2, char_width=2, line_width=6.00, orientation='N', justification='R')
+        megalabel.write_text("{:04d}:{:01d}".format(int(barcode.batch),barcode.number), char_height=2, char_width=2, line_width=6.00, orientation='N', justification='R')
     else:
-        megalabel.write_text("{:06d}".format(int(barcode.serial)), char_height=2, char_width=2, line_width=6.00, orientation='N', justification='R')
+        megalabel.write_text("{:06d}".format(barcode.number), char_height=2, char_width=2, line_width=6.00, orientation='N', justification='R')
     megalabel.endorigin()
     
 def add_to_megalabel_wagon(megalabel, barcode, x_offset=2.0875, y_offset=1.5875, borders=False):
@@ -408,7 +505,7 @@ def add_to_megalabel_wagon(megalabel, barcode, x_offset=2.0875, y_offset=1.5875,
     megalabel.endorigin()
 
     megalabel.origin(28+x_offset, 5.6+y_offset)
-    megalabel.write_text("S/N: {:06d}".format(int(barcode.serial)), char_height=3, char_width=3, line_width=40, orientation='N', justification='L')
+    megalabel.write_text("S/N: {:06d}".format(barcode.number), char_height=3, char_width=3, line_width=40, orientation='N', justification='L')
     megalabel.endorigin()
 
     #print(megalabel.dumpZPL())
@@ -448,7 +545,7 @@ def add_to_megalabel_flex(megalabel, barcode, x_offset=2.0875, y_offset=1.5875,
 #    megalabel.endorigin()
 
     megalabel.origin(7.5+x_offset, 3.7+y_offset)
-    megalabel.write_text("S/N: {:06d}".format(int(barcode.serial)), char_height=2, char_width=2, line_width=40, orientation='N', justification='L')
+    megalabel.write_text("S/N: {:06d}".format(barcode.number), char_height=2, char_width=2, line_width=40, orientation='N', justification='L')
     megalabel.endorigin()
 
     megalabel.origin(19.5+x_offset, 1+y_offset)
@@ -456,14 +553,13 @@ def add_to_megalabel_flex(megalabel, barcode, x_offset=2.0875, y_offset=1.5875,
     megalabel.write_text('{}'.format(barcode.full_serial))
     megalabel.endorigin()
 
-def produce_strips(barcodes, tile=False, hexaboard=False, preview=False, borders=False):
+def produce_strips(barcodes, tile=False, hexaboard=False, preview=False, borders=False, debug=False):
 
-    if hexaboard:
-        if not os.path.isdir(barcodes[0].get_label_name()[0]+barcodes[0].get_label_name()[1]+barcodes[0].get_label_name()[2]):
-            os.makedirs(barcodes[0].get_label_name()[0]+barcodes[0].get_label_name()[1]+barcodes[0].get_label_name()[2])
-    else:
-        if not os.path.isdir(barcodes[0].get_label_name()):
-            os.makedirs(barcodes[0].get_label_name())
+    if debug:
+        if hexaboard:
+            os.makedirs("".join(barcodes[0].get_label_name()[:3]), exist_ok=True)
+        else:
+            os.makedirs(barcodes[0].get_label_name(), exist_ok=True)
 
 
     if tile:
@@ -494,16 +590,16 @@ def produce_strips(barcodes, tile=False, hexaboard=False, preview=False, borders
     if preview: 
         l.preview()
 
-    with open("label.zpl", 'w') as f:
-        f.write(l.dumpZPL())
-    f.close()
+    if debug:
+        with open("label.zpl", 'w') as f:
+            f.write(zpl)
 
     return l, zpl
    
-def produce_strips_module(barcodes, MAC="", preview=False, borders=False):
+def produce_strips_module(barcodes, MAC="", preview=False, borders=False, debug=False):
 
-    if not os.path.isdir(barcodes[0].get_label_name()):
-        os.makedirs(barcodes[0].get_label_name())
+    if debug:
+        os.makedirs(barcodes[0].get_label_name(), exist_ok=True)
 
     l = myLabel(28.575, 79.375, dpmm=8.0)
 
@@ -525,16 +621,16 @@ def produce_strips_module(barcodes, MAC="", preview=False, borders=False):
     if preview: 
         l.preview()
 
-    with open("label.zpl", 'w') as f:
-        f.write(l.dumpZPL())
-    f.close()
+    if debug:
+        with open("label.zpl", 'w') as f:
+            f.write(zpl)
 
     return l, zpl
 
-def produce_strips_wagon(barcodes, preview=False, borders=False):
+def produce_strips_wagon(barcodes, preview=False, borders=False, debug=False):
 
-    if not os.path.isdir(barcodes[0].get_label_name()):
-        os.makedirs(barcodes[0].get_label_name())
+    if debug:
+        os.makedirs(barcodes[0].get_label_name(), exist_ok=True)
 
     l = myLabel(25.375, 53.975, dpmm=8.0)
 
@@ -551,18 +647,18 @@ def produce_strips_wagon(barcodes, preview=False, borders=False):
     if preview: 
         l.preview()
 
-    with open("label.zpl", 'w') as f:
-        f.write(l.dumpZPL())
-    f.close()
+    if debug:
+        with open("label.zpl", 'w') as f:
+            f.write(zpl)
 
     return l, zpl
 
-def produce_strips_flex(barcodes, preview=False, borders=False):
+def produce_strips_flex(barcodes, preview=False, borders=False, debug=False):
 
     print("Inside produce_strips_flex")
 
-    if not os.path.isdir(barcodes[0].get_label_name()):
-        os.makedirs(barcodes[0].get_label_name())
+    if debug:
+        os.makedirs(barcodes[0].get_label_name(), exist_ok=True)
 
     l = myLabel(19.375, 28.375, dpmm=8.0)
 
@@ -580,74 +676,162 @@ def produce_strips_flex(barcodes, preview=False, borders=False):
     if preview:
         l.preview()
 
-    with open("label.zpl", 'w') as f:
-        f.write(l.dumpZPL())
-    f.close()
+    if debug:
+        with open("label.zpl", 'w') as f:
+            f.write(zpl)
 
     return l, zpl
 
-def load_barcodes(barcode_list, wagon=False, flex=False, tile=False, module=False, hexaboard=False, MAC="", ROC="", borders=False):
+def strip_maker(wagon=False, flex=False, tile=False, module=False, hexaboard=False, MAC="", ROC="", borders=False, debug=False, templates=True, memory=None):
 
-    print("Inside load_barcodes")
+    # Labels per strip and the Barcode / strip builders for each label family
+    if wagon:
+        per_strip = 2
+        make_barcode = lambda x: Barcode(x)
+        produce, options = produce_strips_wagon, dict(borders=borders, debug=debug)
+    elif flex:
+        per_strip = 2
+        make_barcode = lambda x: Barcode(x)
+        produce, options = produce_strips_flex, dict(borders=borders, debug=debug)
+    elif tile:
+        per_strip = 8 #Changed from 14 to 8
+        make_barcode = lambda x: Barcode(x, tile=True)
+        produce, options = produce_strips, dict(tile=True, borders=borders, debug=debug)
+    elif module:
+        per_strip = 10
+        make_barcode = lambda x: Barcode(x, module=True, MAC=MAC, ROC=ROC)
+        produce, options = produce_strips_module, dict(borders=borders, debug=debug)
+    elif hexaboard:
+        per_strip = 14
+        make_barcode = lambda x: Barcode(x, hexaboard=True)
+        produce, options = produce_strips, dict(hexaboard=True, borders=borders, debug=debug)
+    else:
+        per_strip = 14
+        make_barcode = lambda x: Barcode(x)
+        produce, options = produce_strips, dict(borders=borders, debug=debug)
+
+    # Compiled layouts fill in a template per kind of strip instead of going through zpl.Label,
+    # with a PrinterMemory the templates are stored on the printer and recalled with ^XF
+    if templates or memory is not None:
+        make_strip = StripTemplates(produce, memory=memory, **options)
+    else:
+        make_strip = lambda b, p: produce(b, preview=p, **options)
 
-    zpl = ""
+    return per_strip, make_barcode, make_strip
 
-    all_barcodes = []
+def strip_size(wagon=False, flex=False, tile=False, module=False, **options):
 
+    # (height, width) in mm of the myLabel each strip function draws on, for rendering strips from their ZPL
     if wagon:
-        for i in range(0,len(barcode_list),2):
-            barcodes = [Barcode(x) for x in barcode_list[i:i+2]]
-            should_preview = i + 2 == len(barcode_list)
-            l, temp_zpl = produce_strips_wagon(barcodes, preview=should_preview, borders=borders)
-
-            all_barcodes += barcodes
-            zpl = temp_zpl + "\n" + zpl
+        return 25.375, 53.975
     elif flex:
-        for i in range(0,len(barcode_list),2):
-            barcodes = [Barcode(x) for x in barcode_list[i:i+2]]
-            should_preview = i + 2 == len(barcode_list)
-            l, temp_zpl = produce_strips_flex(barcodes, preview=should_preview, borders=borders)
-
-            all_barcodes += barcodes
-            zpl = temp_zpl + "\n" + zpl
+        return 19.375, 28.375
     elif tile:
-        for i in range(0,len(barcode_list),8): #Changed from 14 to 8
-            barcodes = [Barcode(x, tile=tile) for x in barcode_list[i:i+8]] #Changed from 14 to 8
-            print("i:", i)
-            print("len:", len(barcode_list))
-            should_preview = i + 8 == len(barcode_list)
-            l, temp_zpl = produce_strips(barcodes, tile=True, preview=should_preview, borders=borders)
-
-            all_barcodes += barcodes
-            zpl = temp_zpl + "\n" + zpl
+        return 44.75, 88.9
     elif module:
-        for i in range(0,len(barcode_list),10):
-            barcodes = [Barcode(x, module=True, MAC=MAC, ROC=ROC) for x in barcode_list[i:i+10]] 
-            should_preview = i + 10 == len(barcode_list)
-            l, temp_zpl = produce_strips_module(barcodes, preview=should_preview, borders=borders)
+        return 28.575, 79.375
 
-            all_barcodes += barcodes
-            zpl = temp_zpl + "\n" + zpl
-    elif hexaboard:
-        for i in range(0,len(barcode_list),14):
-            barcodes = [Barcode(x, hexaboard=True) for x in barcode_list[i:i+14]]
-            should_preview = i + 14 == len(barcode_list)
-            l, temp_zpl = produce_strips(barcodes, hexaboard=True, preview=should_preview, borders=borders)
+    return 25.375, 88.9
 
-            zpl = temp_zpl + "\n" + zpl
-            all_barcodes += barcodes
-    else:
-        for i in range(0,len(barcode_list),14):
-            barcodes = [Barcode(x) for x in barcode_list[i:i+14]]
-            should_preview = i + 14 == len(barcode_list)
-            l, temp_zpl = produce_strips(barcodes, preview=should_preview, borders=borders)
+def make_strips(options, slices):
+
+    # Process pool worker, strip_maker's lambdas cannot be pickled so the options are sent instead
+    per_strip, make_barcode, make_strip = strip_maker(**options)
+
+    strips = []
+    for label_dicts in slices:
+        barcodes = [make_barcode(x) for x in label_dicts]
+        l, temp_zpl = make_strip(barcodes, False)
+        strips.append((barcodes, temp_zpl))
+
+    return strips
+
+def use_pool(labels, workers, options):
 
-            zpl = temp_zpl + "\n" + zpl
-            all_barcodes += barcodes
+    # debug writes label.zpl for every strip, keep that in one process. Format downloads
+    # have to go out with the first strip that recalls them, so stored formats do too
+    if workers <= 1 or options.get("debug") or options.get("memory") is not None:
+        return False
 
+    return not options.get("templates", True) and labels >= PARALLEL_MIN_LABELS
+
+def generate_strips(barcode_list, options, preview=True, workers=1, reverse=False):
+
+    # Yields (barcodes, zpl) for each strip, first to last or last to first. With more
+    # than one worker, on jobs where use_pool says it pays, the strips are made in a
+    # process pool in shards of consecutive strips and yielded in the same order, so
+    # the output is the same as one worker.
+    per_strip, make_barcode, make_strip = strip_maker(**options)
+
+    # A range either way, nothing per strip is held before the strips are made
+    starts = range(0, len(barcode_list), per_strip)
+    if reverse:
+        starts = starts[::-1]
+
+    if len(starts) < 2 or not use_pool(len(barcode_list), workers, options):
+        for i in starts:
+            barcodes = [make_barcode(x) for x in barcode_list[i:i+per_strip]]
+            should_preview = preview and i + per_strip == len(barcode_list)
+            l, temp_zpl = make_strip(barcodes, should_preview)
+            yield barcodes, temp_zpl
+        return
+
+    shard = max(1, len(starts) // (workers * SHARDS_PER_WORKER))
+    shards = [starts[k:k+shard] for k in range(0, len(starts), shard)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(make_strips, [options] * len(shards), [[barcode_list[i:i+per_strip] for i in s] for s in shards])
+        for shard_starts, strips in zip(shards, results):
+            for i, (barcodes, temp_zpl) in zip(shard_starts, strips):
+                if preview and i + per_strip == len(barcode_list):
+                    # The preview image is drawn here, workers do not write tmp/tmp_label.png
+                    make_strip(barcodes, True)
+                yield barcodes, temp_zpl
+
+def load_barcodes(barcode_list, wagon=False, flex=False, tile=False, module=False, hexaboard=False, MAC="", ROC="", borders=False, debug=False, preview=True, workers=1, templates=True, memory=None):
+
+    print("Inside load_barcodes")
+
+    options = dict(wagon=wagon, flex=flex, tile=tile, module=module, hexaboard=hexaboard, MAC=MAC, ROC=ROC, borders=borders, debug=debug, templates=templates, memory=memory)
+
+    # Strips are collected and joined once at the end; the job is sent last strip first.
+    # Stored formats are made in sending order so each download comes before its recalls
+    strips = []
+    slices = []
+    sending_order = memory is not None
+
+    for barcodes, temp_zpl in generate_strips(barcode_list, options, preview, workers, reverse=sending_order):
+        strips.append(temp_zpl)
+        slices.append(barcodes)
+
+    if not sending_order:
+        strips.reverse()
+        slices.reverse()
+
+    zpl = "".join(strip + "\n" for strip in strips)
+    all_barcodes = [b for barcodes in reversed(slices) for b in barcodes]
 
     return zpl, all_barcodes
 
+def stream_barcodes(barcode_list, job_dir=None, wagon=False, flex=False, tile=False, module=False, hexaboard=False, MAC="", ROC="", borders=False, debug=False, preview=True, workers=1, templates=True, memory=None):
+
+    # Same strips and order as load_barcodes, but written to a job_stream job as they
+    # are made. Slices are walked last to first so nothing has to be held for reversing.
+    print("Inside stream_barcodes")
+
+    options = dict(wagon=wagon, flex=flex, tile=tile, module=module, hexaboard=hexaboard, MAC=MAC, ROC=ROC, borders=borders, debug=debug, templates=templates, memory=memory)
+
+    writer = JobWriter(job_dir or new_job_dir())
+    slices = []
+
+    for barcodes, temp_zpl in generate_strips(barcode_list, options, preview, workers, reverse=True):
+        writer.add_strip(temp_zpl)
+        slices.append(barcodes)
+
+    all_barcodes = [b for barcodes in reversed(slices) for b in barcodes]
+
+    return writer.close(), all_barcodes
+
 ### DEPRECIATED BELOW UNTIL MAIN ##########
 
     '''im = Image.open(name)
@@ -817,7 +1001,7 @@ def main():
         barcodes.append(barcode)
 
     if len(barcodes) > 1:
-        produce_strips(barcodes)
+        produce_strips(barcodes, debug=True)
 
         '''
         width, height = images[0].size
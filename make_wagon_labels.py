@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 
 from zpl import Label
+from static.decoder import decode
 import os
 import argparse
 
@@ -17,12 +18,20 @@ class myLabel(Label):
 class Barcode:
     
     def __init__(self, payload):
-        self.serial = payload[-5:]
+        self.decoded = decode(payload)
+        self.serial = self.decoded.sn or payload[-5:]
         self.majortype = payload[4:6]
         self.subtype = payload[6:-5]
         self.first = payload[:4]
         self.type = payload[4:-5]
 
+        # Keep the fields as written in the serial (numeric or code), split where the decoder found them
+        if self.decoded.valid:
+            self.first = "3205" if self.decoded.layout == "legacy" else "320"
+            self.majortype = payload[len(self.first):len(self.first)+2]
+            self.subtype = payload[len(self.first)+2:self.decoded.sub_end]
+            self.type = self.majortype + self.subtype
+
         self.full_serial = payload
 
         #self.get_nickname()
@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+
+# Batch order queue for the HGCAL labeling request form. Reads the CSV saved by
+# utils/downloadHGCALform.py, turns each row into a label_engine JobSpec, checks
+# every serial of every order against the printed store in one query, and writes
+# the ZPL for all good orders grouped by label stock (job_scheduler), so the printer
+# only needs one setLabelLength_* per stock run instead of one per order.
+#
+# Serial ranges on the form are end exclusive, "101-213" is 112 labels starting at 101.
+# Anything the form has no column for (MAC, ROC, tile batch...) can be given in the
+# Special Requests column as key=value pairs, e.g. "mac=UCSB roc=X".
+
+import re
+import csv
+import argparse
+from datetime import datetime
+
+from static.catalogue import catalogue, Family
+from label_engine import JobSpec, SPEC_FIELDS, job_barcodes, label_length_file
+from job_scheduler import ScheduledJob, schedule, runs, switch_report, output_runs
+from stash_printed import open_store, check_printed
+
+FORM_CSV = "./utils/HGCAL_Labeling_Request_Form.csv"
+
+# Form column headers
+COLUMNS = {"order_date": "Timestamp", "name": "Orderer Name", "email": "Orderer Email Address",
+           "location": "Institution Name", "major_type": "Component Major Type", "subtype": "Subtype",
+           "count": "Number of Labels", "notes": "Special Requests/Constraints",
+           "fulfillment_date": "Desired Receive Date", "serials": "Serial number generation"}
+
+RANGE_RE = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d+))?\s*$")
+CODE_RE = re.compile(r"\((\w+)\)")
+OPTION_RE = re.compile(r"(\w+)\s*=\s*([^\s,;]+)")
+
+# Hexaboard subtypes on the form: shape, generation, ROC, '-', vendor, assembler (e.g. F44-MH)
+HEXABOARD_RE = re.compile(r"^(\w)(\w)(\w)-?(\w)(\w)$")
+
+def parse_date(text):
+
+    for fmt in ["%m/%d/%Y %H:%M:%S", "%m/%d/%Y"]:
+        try:
+            return datetime.strptime(text.strip(), fmt)
+        except ValueError:
+            continue
+
+    return None
+
+def parse_range(text, count):
+
+    # (first, end) with end exclusive, a bare number is just the first serial
+    match = RANGE_RE.match(text or "")
+    if not match:
+        raise ValueError("Bad serial range {!r}".format(text))
+
+    first = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else first + count
+
+    if end - first != count:
+        raise ValueError("Serial range {} holds {} labels but {} were ordered".format(text, end - first, count))
+
+    return first, end
+
+def find_major_type(text):
+
+    text = text.strip()
+    if text in catalogue.majors:
+        return text
+
+    # Form names are plural with the code in brackets, "LD Hexaboards (XL)"
+    match = CODE_RE.search(text)
+    if match and match.group(1) in catalogue.by_code:
+        return catalogue.by_code[match.group(1)]
+
+    singular = CODE_RE.sub("", text).strip().rstrip("s")
+    if singular in catalogue.majors:
+        return singular
+
+    raise ValueError("Unknown major type {!r}".format(text))
+
+def code_lookup(index, field, code):
+
+    # index is one of the catalogue's code -> name tables
+    name = index.get(code)
+    if name is None:
+        raise ValueError("Unknown {} {!r}".format(field, code))
+
+    return name
+
+class Order:
+
+    # One form row, field names follow the Order_Info table
+
+    def __init__(self, row_number, row):
+
+        self.order_id = row_number
+        self.name = row.get(COLUMNS["name"], "").strip()
+        self.email = row.get(COLUMNS["email"], "").strip()
+        self.location = row.get(COLUMNS["location"], "").strip()
+        self.order_date = parse_date(row.get(COLUMNS["order_date"], ""))
+        self.fulfillment_date = parse_date(row.get(COLUMNS["fulfillment_date"], ""))
+        self.notes = row.get(COLUMNS["notes"], "").strip()
+        self.row = row
+
+        self.spec = None
+        self.errors = []
+
+        try:
+            self.spec = self.make_spec()
+            self.spec.validate()
+        except (ValueError, KeyError) as e:
+            self.errors.append(str(e))
+
+    def __repr__(self):
+        return "Order({}, {}, {})".format(self.order_id, self.location, self.spec)
+
+    def ok(self):
+
+        return not self.errors
+
+    def make_spec(self):
+
+        major_type = find_major_type(self.row.get(COLUMNS["major_type"], ""))
+        subtype = self.row.get(COLUMNS["subtype"], "").strip()
+
+        try:
+            count = int(self.row.get(COLUMNS["count"], ""))
+        except ValueError:
+            raise ValueError("Bad label count {!r}".format(self.row.get(COLUMNS["count"])))
+
+        first, end = parse_range(self.row.get(COLUMNS["serials"], ""), count)
+
+        spec = JobSpec(major_type, count=count, start=first, name="order{:03d}".format(self.order_id))
+        family = spec.family()
+
+        if family == Family.HEXABOARD:
+            match = HEXABOARD_RE.match(subtype)
+            if not match:
+                raise ValueError("Bad hexaboard subtype {!r}, expected e.g. F44-MH".format(subtype))
+            spec.shape = code_lookup(catalogue.shape_by_code, "shape_code", match.group(1))
+            spec.generation = match.group(2)
+            spec.roc = match.group(3)
+            spec.vendor = code_lookup(catalogue.vendor_by_code, "vendor_code", match.group(4))
+            spec.assembler = code_lookup(catalogue.assembler_by_code, "assembler_code", match.group(5))
+        elif family != Family.TILE:
+            major = catalogue.major(major_type)
+            if subtype not in major.subtypes:
+                subtype = code_lookup(major.sub_by_code, "sub_code", subtype)
+            spec.subtype = subtype
+
+        if family == Family.MODULE and self.location in catalogue.macs:
+            spec.mac = self.location
+
+        for key, value in OPTION_RE.findall(self.notes):
+            if key in SPEC_FIELDS and key not in ["major_type", "count", "start", "name"]:
+                setattr(spec, key, value)
+
+        # Fields set from text go back through the constructor for the type conversions
+        return JobSpec.from_dict(spec.to_dict())
+
+def load_orders(csv_path=FORM_CSV):
+
+    with open(csv_path, "r", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    # Order numbers are the spreadsheet row numbers, the header is row 1
+    return [Order(i + 2, row) for i, row in enumerate(rows) if any(v.strip() for v in row.values() if v)]
+
+def check_orders(orders, store):
+
+    # Serials of every order in one store query, duplicates inside the batch count too
+    good = [o for o in orders if o.ok()]
+    clashes = check_printed([(o, (b.full_serial for b in job_barcodes(o.spec))) for o in good], store)
+
+    for order, found in clashes.items():
+        for clash in found:
+            if clash.printed:
+                order.errors.append("{} already printed".format(clash.serial))
+            if clash.others:
+                order.errors.append("{} also in order {}".format(clash.serial, ", ".join(str(o.order_id) for o in clash.others)))
+
+    return clashes
+
+def schedule_orders(orders, current_stock=None):
+
+    # Stock runs in print order, orders are due on their desired receive date
+    jobs = [ScheduledJob(o, label_length_file(o.spec), o.spec.count, o.fulfillment_date, i) for i, o in enumerate(orders)]
+
+    return jobs, schedule(jobs, current_stock=current_stock)
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn the labeling request form into ZPL, grouped by label stock")
+    parser.add_argument("--csv", default=FORM_CSV, help="Request form CSV from utils/downloadHGCALform.py (default: {})".format(FORM_CSV))
+    parser.add_argument("--outdir", default="./output/orders", help="Directory for one .zpl per label stock (default: ./output/orders)")
+    parser.add_argument("--db", default="./static/printed_barcodes.db", help="Printed barcode store")
+    parser.add_argument("--orders", nargs="+", type=int, default=None, help="Only these order numbers (spreadsheet rows)")
+    parser.add_argument("--loaded", default=None, help="setLabelLength_* file the printer is already set to")
+    parser.add_argument("--borders", action="store_true", default=False, help="Draw label borders")
+    parser.add_argument("--check", action="store_true", default=False, help="Validate and check serials only, write nothing")
+    parser.add_argument("--print", dest="print_jobs", action="store_true", default=False, help="Send the runs to the printer through the spooler")
+    parser.add_argument("--raw", nargs="+", default=None, help="Print straight to these printers (HOST[:PORT]) instead of lp")
+    parser.add_argument("--no-stash", dest="stash", action="store_false", default=True, help="Do not record the serials as printed")
+    args = parser.parse_args()
+
+    orders = load_orders(args.csv)
+    if args.orders:
+        orders = [o for o in orders if o.order_id in args.orders]
+
+    store = open_store(args.db)
+    check_orders(orders, store)
+
+    good = [o for o in orders if o.ok()]
+    for order in orders:
+        if not order.ok():
+            print("Order {} ({} {}): {}".format(order.order_id, order.location, order.row.get(COLUMNS["subtype"], ""), "; ".join(order.errors[:5])))
+            if len(order.errors) > 5:
+                print("    ... and {} more".format(len(order.errors) - 5))
+
+    print("{} of {} orders ready, {} labels".format(len(good), len(orders), sum(o.spec.count for o in good)))
+
+    if args.check or not good:
+        return
+
+    jobs, order = schedule_orders(good, args.loaded)
+    print(switch_report(jobs, order, args.loaded))
+
+    spooler = None
+    if args.print_jobs:
+        from print_spooler import PrintSpooler
+        from raw_printer import PrinterPool
+        spooler = PrintSpooler(printers=PrinterPool(args.raw) if args.raw else None)
+
+    # Each run is stashed once written, or with --print once the printer took it
+    output_runs(runs(order), args.outdir, store if args.stash else None, spooler, args.loaded,
+                spec=lambda job: job.item.spec, with_setup=True, borders=args.borders)
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,65 @@ import argparse
 import subprocess
 from PIL import Image
 from zpl import Label
+from raw_printer import PrinterPool, PrinterError
+from job_stream import JobWriter
+from graphic_cache import graphic_cache, graphic_key
+from printer_memory import PrinterMemory, object_name
+from graphic_compression import METHODS, compress_gfa, acs_encode, decode_graphic
+from zpl_render import render_zpl
 
-def png_to_zpl(image_quantities, zpl_output_path, borders):
+def convert_wagon_image(png_path, dpmm=8, compression="auto"):
+    img = Image.open(png_path)
+
+    # Convert the image to monochrome (1-bit pixels)
+    if img.size[1] > img.size[0]:
+        img = img.rotate(270, expand=True)
+
+    scale = min([(25.4-2)*8 / img.size[1], (50.4-2) * 8 / img.size[0]])
+
+    re_w = min(round(img.size[0] * scale), 250)
+    re_h = round(img.size[1] * scale)
+
+    img = img.resize((re_w, re_h))
+    img = img.convert("1")
+
+    # Let zpl encode it exactly as write_graphic would, then keep only the ^GFA command
+    label = Label(width=50.8, height=25.4, dpmm=dpmm)
+    start = len(label.code)
+    label.write_graphic(img, img.size[0]/8.)
+
+    # The hex data is mostly runs of 0 and F, send it as ACS or :Z64: when that is smaller
+    gfa = compress_gfa(label.code[start:], compression)
+
+    return {"gfa": gfa, "width": img.size[0], "height": img.size[1]}
+
+def wagon_graphic(wagon_type, dpmm=8, compression="auto"):
+    png_path = f"./WagonImages/Images/{wagon_type}.png"
+    key = graphic_key(png_path, "wagon", 50.8, 25.4, dpmm, compression)
+
+    entry = graphic_cache.get_or_build(key, lambda: convert_wagon_image(png_path, dpmm, compression))
+
+    # Name for printer memory, changes whenever the image does
+    return dict(entry, name=object_name("W", key))
+
+def stored_graphic(graphic, memory):
+    # Download the bitmap to printer RAM once (~DG) and recall it per label (^XG)
+    # instead of sending the whole ^GFA every time
+    _, _, total, row_bytes, data = graphic["gfa"].split(",", 4)
+    name = graphic["name"]
+
+    # ~DG takes ACS run-length data but not :Z64:
+    if data.startswith(":Z64:"):
+        data = acs_encode(decode_graphic(data, int(total), int(row_bytes)), int(row_bytes))
+
+    download = ""
+    if not memory.is_resident(name) and name not in memory.pending:
+        download = f"~DGR:{name}.GRF,{total},{row_bytes},{data}\n"
+        memory.add_pending(name)
+
+    return download, f"^XGR:{name}.GRF,1,1"
+
+def png_to_zpl(image_quantities, zpl_output_path, borders, memory=None, compression="auto", preview_path="tmp/tmp_label.png"):
     # Create a new ZPL label with the specified size (203 x 406 dots)
     total = 0
     for x in image_quantities.values():
@@ -14,37 +71,24 @@ def png_to_zpl(image_quantities, zpl_output_path, borders):
 
     label = Label(width=lab_width, height=lab_height, dpmm=8)  # Full label size
     current_y = 1  # Start position with top margin (20 dots for 0.1 inch)
+    downloads = ""
 
     for wagon_type, quantity in image_quantities.items():
-        # Open the PNG file
-        png_path = f"./WagonImages/Images/{wagon_type}.png"
-
-        img = Image.open(png_path)
-
-        # Convert the image to monochrome (1-bit pixels)
-        if img.size[1] > img.size[0]:
-            img = img.rotate(270, expand=True)
-
-        scale = min([(25.4-2)*8 / img.size[1], (50.4-2) * 8 / img.size[0]])
+        # Converted once per image contents, not once per copy
+        graphic = wagon_graphic(wagon_type, compression=compression)
 
-        re_w = min(round(img.size[0] * scale), 250)
-        re_h = round(img.size[1] * scale)
+        if memory is not None:
+            download, image_code = stored_graphic(graphic, memory)
+            downloads += download
+        else:
+            image_code = graphic["gfa"]
 
-        img = img.resize((re_w, re_h))
-
-        width, height = img.size
-
-        width /= 8
-        height /= 8
+        width = graphic["width"] / 8
+        height = graphic["height"] / 8
 
         left_edge = (50.8 - width)/2
         top_edge = (25.4 - height)/2
 
-        img = img.convert("1")
-        # Get the width and height of the image
-        img.show()
-        
-
         # Add each image the specified number of times
         for _ in range(quantity):
 
@@ -62,12 +106,12 @@ def png_to_zpl(image_quantities, zpl_output_path, borders):
 
             # Create the ZPL image command
             label.origin(left_edge, current_y+1)
-            label.write_graphic(img, img.size[0]/8.)
+            label.code += image_code
             label.endorigin()
             current_y += 25.4  # Move down for the next image, with a margin
 
-    # Generate ZPL code
-    zpl_code = label.dumpZPL()
+    # Generate ZPL code, graphic downloads go ahead of the format
+    zpl_code = downloads + label.dumpZPL()
 
     # Write the ZPL code to an output file
     with open(zpl_output_path, 'w') as f:
@@ -75,16 +119,79 @@ def png_to_zpl(image_quantities, zpl_output_path, borders):
 
     print(f"ZPL code saved to {zpl_output_path}")
 
-    label.preview()
+    # Local preview, a bad render is reported but does not stop printing
+    try:
+        render_zpl(zpl_code, lab_width, lab_height).save(preview_path)
+        print(f"Preview saved to {preview_path}")
+    except (ValueError, OSError) as e:
+        print(f"Could not render preview: {e}")
 
     return zpl_output_path  # Return the output path for printing
 
-def print_zpl(zpl_output_path, printer_name):
+def png_to_job(image_quantities, job_dir, borders, memory=None, compression="auto"):
+    # Same drawing as png_to_zpl, but one 25.4 mm label per image written to a
+    # streamed job, so a jam only costs the strips after the last confirmed one
+    writer = JobWriter(job_dir, name="wagon_images")
+
+    for wagon_type, quantity in image_quantities.items():
+        graphic = wagon_graphic(wagon_type, compression=compression)
+
+        if memory is not None:
+            download, image_code = stored_graphic(graphic, memory)
+        else:
+            download, image_code = "", graphic["gfa"]
+
+        left_edge = (50.8 - graphic["width"] / 8) / 2
+
+        if "-" not in wagon_type:
+            wagon_type = wagon_type[:2] + "-" + wagon_type[2:]
+
+        # Every copy of a wagon type is the same strip, build it once
+        label = Label(width=50.8, height=25.4, dpmm=8)
+
+        label.origin(50.4-10, 1 + 1.25)
+        label.write_text(wagon_type, char_height=5, char_width=5, orientation='R')
+        label.endorigin()
+
+        if borders:
+            label.origin(0.0, 1)
+            label.draw_box(50.8*8, 25.4*8, thickness=2, rounding=4)
+            label.endorigin()
+
+        label.origin(left_edge, 1 + 1)
+        label.code += image_code
+        label.endorigin()
+
+        strip = label.dumpZPL()
+        for i in range(quantity):
+            writer.add_strip(download + strip if i == 0 else strip)
+
+    job = writer.close()
+    print(f"Streamed {job.strips} labels to {job_dir}")
+
+    return job
+
+def print_zpl(zpl_output_path, printer_name, raw=None):
+    # raw is the RawPrinter the job was made for, its stored graphics are on that one
+    if raw is not None:
+        try:
+            with open(zpl_output_path, 'rb') as f:
+                n = raw.print_zpl(f.read())
+            print(f"Sent {n} formats to {raw}.")
+            return True
+        except (OSError, PrinterError) as e:
+            print(f"Error printing: {e}")
+            return False
+        finally:
+            raw.close()
+
     try:
         subprocess.run(['lp', '-d', printer_name, zpl_output_path], check=True)
         print(f"Printed to {printer_name}.")
-    except subprocess.CalledProcessError as e:
+        return True
+    except (OSError, subprocess.CalledProcessError) as e:
         print(f"Error printing: {e}")
+        return False
 
 def main():
     parser = argparse.ArgumentParser(description='Generate ZPL labels from PNG images.')
@@ -93,7 +200,11 @@ def main():
     parser.add_argument('--output', default="wagon_images.zpl", help='Output file path for ZPL code.')
     parser.add_argument('--print', action='store_true', default=False, help='Print the generated ZPL using the lp command.')
     parser.add_argument('--printer', default='Zebra', help='Printer name (default: Zebra).')
+    parser.add_argument('--raw', nargs='+', default=None, help='Print straight to printers at HOST[:PORT] (port 9100) instead of lp.')
     parser.add_argument('--borders', action='store_true', default=False, help='Add label outlines (default: False)')
+    parser.add_argument('--stored', action='store_true', default=False, help='Download each image to printer memory once (~DG) and recall it per label (^XG).')
+    parser.add_argument('--compression', choices=METHODS, default='auto', help='Image data as ACS run-length, :Z64: deflate, plain hex (none), or whichever is smallest (default: auto).')
+    parser.add_argument('--stream', default=None, help='Write one label per image to this streamed job directory instead (print or resume it with print_spooler.py --jobs).')
 
     args = parser.parse_args()
 
@@ -105,12 +216,23 @@ def main():
 
     print(image_quantities)
 
+    # One printer for the whole job, graphics already downloaded to it are recalled
+    # without sending them again
+    printer = PrinterPool(args.raw).get() if args.raw else None
+    memory = PrinterMemory(printer.address if printer is not None else args.printer) if args.stored else None
+
+    if args.stream:
+        # The spooler prints the job later, so downloads are not recorded as resident
+        png_to_job(image_quantities, args.stream, args.borders, memory, args.compression)
+        return
+
     # Generate ZPL
-    zpl_file = png_to_zpl(image_quantities, args.output, args.borders)
+    zpl_file = png_to_zpl(image_quantities, args.output, args.borders, memory, args.compression)
 
     # Print if the flag is set
     if args.print:
-        print_zpl(zpl_file, args.printer)
+        if print_zpl(zpl_file, args.printer, printer) and memory is not None:
+            memory.confirm()
 
 if __name__ == '__main__':
     main()
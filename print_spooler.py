@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+
+# Background print queue. A single worker thread owns the lp subprocess so the Tk
+# main loop never waits on CUPS. Jobs run in the order they were submitted, a label
+# length setup file goes with the job it belongs to and is sent right before it, and
+# status messages are handed back through a queue that the GUI drains with after().
+# With a raw_printer.PrinterPool the jobs go straight to the printers on port 9100
+# instead of through lp. Streamed jobs (job_stream) are sent chunk by chunk and
+# record the last confirmed strip so they can be resumed.
+
+import queue
+import shlex
+import bisect
+import itertools
+import threading
+import subprocess
+import argparse
+
+from raw_printer import PrinterPool, PrinterError, split_formats
+from job_stream import StreamJob
+
+LP_COMMAND = "lp -d Zebra -o raw"
+
+def send_lp(command, data):
+
+    # command is an argument list, the job goes to its stdin
+    result = subprocess.run(command, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error = result.stderr.decode(errors="replace").strip()
+        raise PrinterError("{} exited with {}: {}".format(command[0], result.returncode, error))
+
+    return result.stdout.decode(errors="replace").strip()
+
+def read_setup(path):
+
+    # (name, data) of a setLabelLength_* file, or None without one
+    if path is None:
+        return None
+
+    with open(path, "rb") as f:
+        return path, f.read()
+
+class PrintJob:
+
+    def __init__(self, seq, data, name, stream=None, setup=None):
+        self.seq = seq
+        self.data = data
+        self.name = name
+        self.stream = stream
+        self.setup_name, self.setup = setup or (None, None)
+        self.printer = None
+
+class PrintSpooler:
+
+    def __init__(self, command=LP_COMMAND, printers=None):
+
+        self.command = shlex.split(command)
+        self.printers = printers
+        self.jobs = queue.Queue()
+        self.events = queue.Queue()
+        self.counter = itertools.count()
+
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, path, setup=None):
+
+        # Read the file now, tmp/tmp.zpl may be rewritten before the job runs
+        with open(path, "rb") as f:
+            data = f.read()
+
+        return self.submit_data(data, path, setup)
+
+    def submit_data(self, data, name, setup=None):
+
+        # setup is the setLabelLength_* file this job needs, sent just before it
+        job = PrintJob(next(self.counter), data, name, setup=read_setup(setup))
+        self.jobs.put(job)
+        self.events.put(("queued", job, "Queued {} ({} jobs waiting)".format(name, self.jobs.qsize())))
+
+        return job
+
+    def submit_job(self, stream, setup=None):
+
+        # job_stream.StreamJob, sent from its last confirmed strip
+        if stream.finished():
+            stream.reset()
+
+        job = PrintJob(next(self.counter), None, stream.name, stream, read_setup(setup))
+        self.jobs.put(job)
+        if stream.confirmed:
+            self.events.put(("queued", job, "Queued {}, resuming at strip {} of {}".format(stream.name, stream.confirmed + 1, stream.strips)))
+        else:
+            self.events.put(("queued", job, "Queued {} ({} strips)".format(stream.name, stream.strips)))
+
+        return job
+
+    def pending(self):
+
+        return self.jobs.qsize()
+
+    def poll(self):
+
+        # Drain status events, call from the GUI thread
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def stop(self, wait=True):
+
+        self.jobs.put(PrintJob(next(self.counter), None, None))
+        if wait:
+            self.worker.join()
+
+    def run(self):
+
+        while True:
+            job = self.jobs.get()
+            if job.data is None and job.stream is None:
+                return
+
+            # One printer for the whole job, the length command must reach the same one
+            job.printer = self.printers.get() if self.printers is not None else None
+
+            self.events.put(("started", job, "Sending {} to printer...".format(job.name)))
+            try:
+                if job.setup is not None:
+                    self.send(job.setup, job.printer)
+                if job.stream is not None:
+                    message = self.send_stream(job)
+                else:
+                    message = self.send(job.data, job.printer)
+            except (OSError, PrinterError) as e:
+                self.events.put(("error", job, "Printing {} failed: {}".format(job.name, e)))
+                continue
+
+            self.events.put(("done", job, "Printed {} {}".format(job.name, message).strip()))
+
+    def send(self, data, printer=None):
+
+        if self.printers is not None:
+            printer = printer or self.printers.get()
+            return "({} formats)".format(printer.print_zpl(data))
+
+        return send_lp(self.command, data)
+
+    def send_stream(self, job):
+
+        # Chunk by chunk from the last confirmed strip, a failure leaves the job resumable
+        stream = job.stream
+        printer = job.printer
+
+        for first, strips in stream.chunks():
+            if printer is not None:
+                # A strip can be several formats (a stored format download and its
+                # recall), it is confirmed once the last of them has gone out
+                ends = list(itertools.accumulate(len(split_formats(s)) for s in strips))
+
+                def sent(i, n):
+                    done = first + bisect.bisect_right(ends, i)
+                    if done > stream.confirmed:
+                        stream.confirm(done)
+
+                printer.print_zpl(b"".join(strips), progress=sent)
+            else:
+                self.send(b"".join(strips))
+                stream.confirm(first + len(strips))
+
+            self.events.put(("progress", job, "{}: {}/{} strips sent".format(job.name, stream.confirmed, stream.strips)))
+
+        return "({} strips)".format(stream.strips)
+
+def main():
+    parser = argparse.ArgumentParser(description="Send ZPL files to the printer through the print spooler")
+    parser.add_argument("files", nargs="*", default=[], help="ZPL files to print, in order")
+    parser.add_argument("--jobs", nargs="*", default=[], help="Streamed job directories to print or resume")
+    parser.add_argument("--setup", default=None, help="Label length setup file, sent before the first file or job")
+    parser.add_argument("--lp", default=LP_COMMAND, help="Print command, the job is written to its stdin (default: {})".format(LP_COMMAND))
+    parser.add_argument("--raw", nargs="+", default=None, help="Print straight to these printers (HOST[:PORT]) instead of lp")
+    args = parser.parse_args()
+
+    spooler = PrintSpooler(args.lp, PrinterPool(args.raw) if args.raw else None)
+    setup = args.setup
+    for path in args.files:
+        spooler.submit(path, setup)
+        setup = None
+    for path in args.jobs:
+        spooler.submit_job(StreamJob(path), setup)
+        setup = None
+    spooler.stop()
+
+    for kind, job, message in spooler.poll():
+        if kind != "queued":
+            print(message)
+
+if __name__ == "__main__":
+    main()
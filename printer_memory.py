@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+
+# Record of what we have stored in each printer's memory (graphics downloaded with
+# ~DG, formats with ^DF). Objects are named from a hash of their contents, so a
+# changed image or layout gets a new name instead of silently reusing a stale one.
+# Printer RAM (R:) is cleared on power cycle, use --forget after restarting a printer.
+
+import os
+import json
+import argparse
+
+STATE_PATH = "./tmp/printer_memory.json"
+
+def object_name(prefix, digest, length=8):
+
+    # Zebra object names are at most 8 characters
+    return (prefix + digest.upper())[:length]
+
+class PrinterMemory:
+
+    def __init__(self, printer, state_path=STATE_PATH):
+
+        self.printer = printer
+        self.state_path = state_path
+
+        try:
+            with open(state_path, "r") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+
+        self.resident = self.state.setdefault(printer, {})
+
+        # Objects put into a job but not yet known to have reached the printer
+        self.pending = []
+
+    def is_resident(self, name):
+
+        return name in self.resident
+
+    def mark_resident(self, names):
+
+        for name in names:
+            self.resident[name] = True
+        self.save()
+
+    def add_pending(self, name):
+
+        if name not in self.pending:
+            self.pending.append(name)
+
+    def confirm(self):
+
+        # Call once the job carrying the pending downloads has been printed
+        self.mark_resident(self.pending)
+        self.pending = []
+
+    def forget(self):
+
+        self.resident.clear()
+        self.save()
+
+    def save(self):
+
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        temp = self.state_path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(temp, self.state_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clear the record of objects stored in printer memory")
+    parser.add_argument("--printer", default="Zebra", help="lp printer name or raw printer HOST:PORT (default: Zebra)")
+    parser.add_argument("--forget", action="store_true", default=False, help="Forget everything stored on this printer (after a power cycle)")
+    args = parser.parse_args()
+
+    memory = PrinterMemory(args.printer)
+
+    if args.forget:
+        memory.forget()
+        print("Cleared stored objects for {}".format(args.printer))
+        return
+
+    for name in sorted(memory.resident):
+        print(name)
+
+if __name__ == "__main__":
+    main()
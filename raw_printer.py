@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+
+# Direct printing to Zebra printers over the raw TCP port, bypassing lp/CUPS.
+# Connections are kept open and shared through PrinterPool, ZPL is streamed in
+# chunks, and the ~HS host status is read between label formats so we never
+# queue more formats than the printer buffer can hold.
+
+import re
+import time
+import socket
+import argparse
+
+RAW_PORT = 9100
+CHUNK_SIZE = 16384
+
+# Formats allowed in the printer receive buffer before we wait for it to drain
+MAX_FORMATS = 4
+POLL_INTERVAL = 0.25
+
+STX = b"\x02"
+ETX = b"\x03"
+
+# Split after every ^XZ so each piece is one complete format
+FORMAT_END_RE = re.compile(rb"(?<=\^XZ)")
+
+def split_formats(zpl):
+
+    # The formats print_zpl sends one by one, whitespace between them dropped
+    return [f for f in FORMAT_END_RE.split(zpl) if f.strip()]
+
+class PrinterError(Exception):
+    pass
+
+class HostStatus:
+
+    # Parsed ~HS reply, three <STX>...<ETX> strings of comma separated flags
+
+    def __init__(self, raw):
+
+        strings = [s.split(ETX)[0].decode(errors="replace") for s in raw.split(STX)[1:]]
+        if len(strings) < 2:
+            raise PrinterError("Incomplete host status reply: {!r}".format(raw))
+
+        first = strings[0].split(",")
+        second = strings[1].split(",")
+
+        self.paper_out = first[1] == "1"
+        self.paused = first[2] == "1"
+        self.formats_in_buffer = int(first[4])
+        self.buffer_full = first[5] == "1"
+        self.head_up = second[2] == "1"
+        self.ribbon_out = second[3] == "1"
+        self.labels_remaining = int(second[8])
+
+    def errors(self):
+
+        errors = []
+        if self.paper_out:
+            errors.append("paper out")
+        if self.head_up:
+            errors.append("head open")
+        if self.ribbon_out:
+            errors.append("ribbon out")
+
+        return errors
+
+class RawPrinter:
+
+    def __init__(self, host, port=RAW_PORT, timeout=10.0, max_formats=MAX_FORMATS):
+
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_formats = max_formats
+        self.sock = None
+
+    def __repr__(self):
+        return "RawPrinter({})".format(self.address)
+
+    @property
+    def address(self):
+        return "{}:{}".format(self.host, self.port)
+
+    def connect(self):
+
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        return self.sock
+
+    def close(self):
+
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def send(self, data):
+
+        # A connection the printer dropped while idle fails before any of data is sent,
+        # that is the only case resent on a new connection. Once part of a format has
+        # gone out, sending it again could print its labels twice
+        for attempt in range(2):
+            reused = self.sock is not None
+            sock = self.connect()
+            sent = 0
+            try:
+                while sent < len(data):
+                    sent += sock.send(data[sent:sent+CHUNK_SIZE])
+                return
+            except OSError:
+                self.close()
+                if sent or not reused or attempt:
+                    raise
+
+    def host_status(self):
+
+        # ~HS prints nothing, so it is asked again on a new connection if the old one
+        # turns out to be closed
+        for attempt in range(2):
+            reused = self.sock is not None
+            self.send(b"~HS")
+
+            raw = b""
+            try:
+                while raw.count(ETX) < 3:
+                    chunk = self.sock.recv(1024)
+                    if not chunk:
+                        raise PrinterError("{} closed the connection during ~HS".format(self))
+                    raw += chunk
+            except (OSError, PrinterError):
+                self.close()
+                if raw or not reused or attempt:
+                    raise
+                continue
+
+            return HostStatus(raw)
+
+    def wait_ready(self):
+
+        # Back-pressure: hold the next format until the receive buffer has room
+        while True:
+            status = self.host_status()
+            if status.errors():
+                raise PrinterError("{}: {}".format(self, ", ".join(status.errors())))
+            if not status.buffer_full and status.formats_in_buffer < self.max_formats:
+                return status
+            time.sleep(POLL_INTERVAL)
+
+    def print_zpl(self, zpl, progress=None):
+
+        if isinstance(zpl, str):
+            zpl = zpl.encode()
+
+        formats = split_formats(zpl)
+        for i, fmt in enumerate(formats):
+            if b"^XA" in fmt:
+                self.wait_ready()
+            self.send(fmt)
+            if progress is not None:
+                progress(i + 1, len(formats))
+
+        return len(formats)
+
+def parse_address(address):
+
+    host, _, port = address.partition(":")
+    return host, int(port) if port else RAW_PORT
+
+class PrinterPool:
+
+    # Persistent connections to the printers on the line, handed out round robin. Take
+    # one printer per job and send everything the job needs (length command, stored
+    # graphics and formats, labels) to that printer
+
+    def __init__(self, addresses, timeout=10.0, max_formats=MAX_FORMATS):
+
+        self.printers = [RawPrinter(*parse_address(a), timeout=timeout, max_formats=max_formats) for a in addresses]
+        if not self.printers:
+            raise ValueError("PrinterPool needs at least one printer address")
+        self.next_index = 0
+
+    def get(self, address=None):
+
+        if address is not None:
+            host, port = parse_address(address)
+            for printer in self.printers:
+                if (printer.host, printer.port) == (host, port):
+                    return printer
+            raise KeyError(address)
+
+        printer = self.printers[self.next_index % len(self.printers)]
+        self.next_index += 1
+        return printer
+
+    def print_zpl(self, zpl, address=None, progress=None):
+
+        return self.get(address).print_zpl(zpl, progress)
+
+    def close(self):
+
+        for printer in self.printers:
+            printer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Send ZPL files straight to Zebra printers on the raw port")
+    parser.add_argument("files", nargs="+", help="ZPL files to print")
+    parser.add_argument("--printer", nargs="+", required=True, help="Printer addresses as HOST[:PORT] (default port {})".format(RAW_PORT))
+    parser.add_argument("--status", action="store_true", default=False, help="Print ~HS status of each printer afterwards")
+    args = parser.parse_args()
+
+    pool = PrinterPool(args.printer)
+
+    for path in args.files:
+        with open(path, "rb") as f:
+            printer = pool.get()
+            n = printer.print_zpl(f.read())
+        print("Sent {} formats from {} to {}".format(n, path, printer))
+
+    if args.status:
+        for printer in pool.printers:
+            status = printer.host_status()
+            print("{}: {} formats buffered, {} labels remaining {}".format(printer, status.formats_in_buffer, status.labels_remaining, ", ".join(status.errors())))
+
+    pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+-- SQLite stand-in for labeling_schema.sql, used to test uploads without the MySQL server
+
+create table if not exists Label
+(
+	label_id integer primary key autoincrement,
+	full_label varchar(15) not null,
+	type_sn int(6) not null,
+	type_code varchar(6) not null,
+	sn int(6) not null,
+	major_type_id int,
+	sub_type_id int,
+	creation_date datetime,
+	order_id int,
+	unique(full_label)
+);
+
+create table if not exists Order_Info
+(
+	order_id integer primary key autoincrement,
+	name varchar(50),
+	email varchar(50),
+	location varchar(50),
+	order_date datetime,
+	fulfillment_date datetime
+);
+
+create table if not exists Major_Type
+(
+	major_type_id integer primary key autoincrement,
+	name varchar(50) not null,
+	major_sn int(2) not null,
+	major_code varchar(2) not null
+);
+
+create table if not exists Sub_Type
+(
+	sub_type_id integer primary key autoincrement,
+	digits int(2) not null,
+	sub_sn int(4) not null,
+	sub_code varchar(4) not null,
+	name varchar(50) not null,
+	identifier_name varchar(10) not null,
+	min_sn int(7)
+);
+
+create table if not exists Major_Sub_Stitch
+(
+	major_type_id int,
+	sub_type_id int
+);
+
+-- MySQL stores a string written to an int column as its leading digits ('3W' -> 3,
+-- 'W' -> 0), SQLite would keep the text. CAST(... AS INTEGER) follows the same rule
+
+create trigger if not exists Major_Type_int after insert on Major_Type
+begin
+	update Major_Type set major_sn = cast(new.major_sn as integer) where major_type_id = new.major_type_id;
+end;
+
+create trigger if not exists Sub_Type_int after insert on Sub_Type
+begin
+	update Sub_Type set sub_sn = cast(new.sub_sn as integer), digits = cast(new.digits as integer) where sub_type_id = new.sub_type_id;
+end;
+
+create trigger if not exists Label_int after insert on Label
+begin
+	update Label set type_sn = cast(new.type_sn as integer), sn = cast(new.sn as integer) where label_id = new.label_id;
+end;
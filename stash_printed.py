@@ -1,85 +1,197 @@
 import json
 import os
+import sqlite3
+import argparse
+import itertools
+from collections import namedtuple
 
-class Stasher:
+# The store is local to each labeling machine and not tracked in git. The tracked
+# printed_barcodes.json is the shared copy: a new store starts from it, and
+# "python stash_printed.py --export static/printed_barcodes.json" brings it up to date
+# before it is committed
+DB_PATH = "./static/printed_barcodes.db"
+CACHE_PATH = "./static/printed_barcodes.json"
 
-    def __init__(self, barcode_info, cache_path="./static/printed_barcodes.json"):
+# SQLite parameter limit is 999 on older builds, keep IN (...) lists below it
+QUERY_CHUNK = 500
 
-        self.cache_path = cache_path
-        self.barcode_info = barcode_info        
+# A serial of a job that is already printed and/or also in the other jobs listed
+Clash = namedtuple("Clash", ["serial", "printed", "others"])
 
-        self.reader = self.open_read(cache_path)
+class SerialStore:
 
-    def stash(self, serial):
+    # Indexed, append-only record of every printed full serial (SQLite in WAL mode)
 
-        reader = self.open_read(self.cache_path)
-        temp_dict = json.load(reader)
-        reader.close()
+    def __init__(self, db_path=DB_PATH):
 
-        write = self.open(self.cache_path)
+        self.db_path = db_path
+        self.cnx = sqlite3.connect(db_path)
+        self.cnx.execute("PRAGMA journal_mode=WAL")
+        self.cnx.execute("PRAGMA synchronous=NORMAL")
+        self.cnx.execute("CREATE TABLE IF NOT EXISTS printed (serial TEXT PRIMARY KEY, stashed TEXT DEFAULT CURRENT_TIMESTAMP) WITHOUT ROWID")
+        self.cnx.commit()
 
-        sn_dict = {}
-        sn_dict[serial] = serial
+    def __len__(self):
 
-        temp_dict.update(sn_dict)
+        return self.cnx.execute("SELECT COUNT(*) FROM printed").fetchone()[0]
 
-        json.dump(temp_dict, write)
-        write.close()
-       
-        print("Stashed printed labels in {}".format(self.cache_path))
+    def contains_many(self, serials):
 
-    def load(self):
-        
-        cache = json.load(self.reader)
+        # serials may be any iterable, it is read QUERY_CHUNK at a time
+        serials = iter(serials)
+        found = set()
+
+        while True:
+            chunk = list(itertools.islice(serials, QUERY_CHUNK))
+            if not chunk:
+                return found
+            sql = "SELECT serial FROM printed WHERE serial IN ({})".format(",".join("?" * len(chunk)))
+            found.update(row[0] for row in self.cnx.execute(sql, chunk))
+
+    def add_many(self, serials):
+
+        # One transaction for the whole batch, returns the number of new serials
+        before = self.cnx.total_changes
+        with self.cnx:
+            self.cnx.executemany("INSERT OR IGNORE INTO printed (serial) VALUES (?)", ((s,) for s in serials))
+
+        return self.cnx.total_changes - before
+
+    def serials(self):
+
+        return [row[0] for row in self.cnx.execute("SELECT serial FROM printed ORDER BY serial")]
+
+    def import_json(self, json_path):
+
+        with open(json_path, "r") as f:
+            cache = json.load(f)
+
+        return self.add_many(cache.keys())
 
-        return cache
+    def export_json(self, json_path):
 
-    def open_read(self, cache_path="./static/printed_barcodes.json"):
-        
-        return open(cache_path, 'r')
+        # Same {serial: serial} layout as the old printed_barcodes.json
+        with open(json_path, "w") as f:
+            json.dump({s: s for s in self.serials()}, f)
 
-    def open(self, cache_path="./static/printed_barcodes.json"):
-        
-        if os.path.isfile(cache_path):
+    def backup(self, backup_path=None):
 
-            os.system("cp {}.backup {}".format(cache_path, cache_path))
-            
-            return open(cache_path, 'w')
+        backup_path = backup_path or self.db_path + ".backup"
+        dest = sqlite3.connect(backup_path)
+        with dest:
+            self.cnx.backup(dest)
+        dest.close()
 
-        elif os.path.isfile(cache_path + ".backup"):
+    def close(self):
 
-            os.system("cp {}.backup {}".format(cache_path, cache_path))
+        self.cnx.close()
 
-            return open(cache_path, 'a')
+def import_legacy(store, cache_path=CACHE_PATH):
 
-        else:
-            return open(cache_path, 'w')
+    # One-time import of the old whole-file JSON cache and its backup
+    added = 0
+    for path in [cache_path, cache_path + ".backup"]:
+        if os.path.isfile(path):
+            added += store.import_json(path)
+            print("Imported printed labels from {}".format(path))
 
-    def backup(self, cache_path="./static/printed_barcodes.json"):
+    return added
+
+def open_store(db_path=DB_PATH, cache_path=CACHE_PATH):
+
+    # The store at db_path, a new one starts with the serials of the JSON cache
+    new_store = not os.path.isfile(db_path)
+    store = SerialStore(db_path)
+
+    if new_store:
+        import_legacy(store, cache_path)
+
+    return store
+
+def check_printed(jobs, store):
+
+    # jobs is a list of (job, serials), the result {job: [Clash]} for the jobs that have
+    # printed serials or share serials with another job, from one store query for all of
+    # them. A single job is only looked up, its serials are streamed and not kept
+    jobs = list(jobs)
+
+    if len(jobs) == 1:
+        job, serials = jobs[0]
+        printed = store.contains_many(serials)
+        return {job: [Clash(s, True, []) for s in sorted(printed)]} if printed else {}
+
+    owners = {}
+    for job, serials in jobs:
+        for serial in serials:
+            jobs_of = owners.setdefault(serial, [])
+            if not jobs_of or jobs_of[-1] is not job:
+                jobs_of.append(job)
+
+    printed = store.contains_many(owners)
+    clashes = {}
+
+    for serial, jobs_of in owners.items():
+        if serial in printed or len(jobs_of) > 1:
+            for job in jobs_of:
+                clashes.setdefault(job, []).append(Clash(serial, serial in printed, [j for j in jobs_of if j is not job]))
+
+    return clashes
+
+class Stasher:
+
+    def __init__(self, barcode_info, cache_path=CACHE_PATH, db_path=DB_PATH):
+
+        self.cache_path = cache_path
+        self.barcode_info = barcode_info
+        self.store = open_store(db_path, cache_path)
+
+    def import_legacy(self, cache_path=CACHE_PATH):
+
+        return import_legacy(self.store, cache_path)
+
+    def stash(self, serials):
+
+        added = self.store.add_many(serials)
+
+        print("Stashed {} printed labels in {}".format(added, self.store.db_path))
+
+    def load(self):
+
+        return set(self.store.serials())
+
+    def backup(self):
 
         print("Backing up list of printed barcodes...")
 
-        os.system("cp {} {}.backup".format(cache_path, cache_path))
-        
+        self.store.backup()
+
     def search(self):
-        cache = self.load()
-
-        overlap = False
-        serials = []       
- 
-        for b in self.barcode_info:
-            if b.full_serial not in cache:
-                self.stash(b.full_serial)
-                serial = ""
-            else:
-                overlap = True 
-                serials.append(b.full_serial)
-
-        return overlap, serials
-                
+
+        serials = [b.full_serial for b in self.barcode_info]
+        printed = self.store.contains_many(serials)
+
+        overlap = len(printed) > 0
+        serials_printed = [s for s in serials if s in printed]
+
+        self.stash([s for s in serials if s not in printed])
+
+        return overlap, serials_printed
+
 if __name__ == "__main__":
-    s = Stasher(cache_path="./static/printed_barcodes.json")
 
-    s.backup()
+    parser = argparse.ArgumentParser(description="Manage the store of printed barcodes")
+    parser.add_argument("--db", default=DB_PATH, help="Path of the printed barcode store")
+    parser.add_argument("--import", dest="imports", nargs="+", default=[], help="Legacy printed_barcodes.json files to import")
+    parser.add_argument("--export", default=None, help="Write the store out as a printed_barcodes.json style file")
+    args = parser.parse_args()
+
+    s = Stasher([], db_path=args.db)
 
+    for path in args.imports:
+        print("Imported {} new serials from {}".format(s.store.import_json(path), path))
 
+    if args.export:
+        s.store.export_json(args.export)
+        print("Exported {} serials to {}".format(len(s.store), args.export))
+
+    s.backup()
@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+
+# Read-only catalogue of MajorTypes, built once at import. Everything the GUI and the
+# label engine look up per label is a dict lookup here instead of a scan over
+# majortypes: major code -> type, sub_sn / sub_code -> subtype, type -> label family,
+# magazine -> index, and the code -> name tables of the hexaboard and module fields.
+# The tables are MappingProxyType views and tuples, so nothing can change them at run
+# time. MajorTypes itself stays the place to add types.
+#
+# The tables come from static/catalogue.json, which catalogue_compiler.py makes from
+# MajorTypes.py after checking it for duplicate keys and code collisions. If the
+# artifact is missing or older than MajorTypes.py, the source is compiled in memory.
+
+import json
+
+from enum import Enum
+from types import MappingProxyType
+from collections import namedtuple
+
+try:
+    from static.catalogue_compiler import SOURCE, ARTIFACT, ARTIFACT_VERSION, source_digest, compile_catalogue, load_artifact
+except ImportError:
+    from catalogue_compiler import SOURCE, ARTIFACT, ARTIFACT_VERSION, source_digest, compile_catalogue, load_artifact
+
+class Family(str, Enum):
+
+    # Label family of a major type, which inputs it takes and how its labels are made.
+    # Compares and hashes as its value, so it stands in for the old family strings
+    GENERAL = "general"
+    TILE = "tile"
+    HEXABOARD = "hexaboard"
+    MODULE = "module"
+
+    __hash__ = str.__hash__
+
+    def __str__(self):
+        return self.value
+
+def classify(name):
+
+    # Tile PCBs and tile modules are general labels despite their names
+    if "Tile PCB" in name or "Tile Module" in name:
+        return Family.GENERAL
+    elif "Bare" in name or "Wrapped" in name:
+        return Family.TILE
+    elif "Hexaboard" in name:
+        return Family.HEXABOARD
+    elif "Module" in name:
+        return Family.MODULE
+
+    return Family.GENERAL
+
+class MajorType(namedtuple("MajorType", ["name", "sn", "code", "family", "subtypes", "sub_by_sn", "sub_by_code"])):
+
+    __slots__ = ()
+
+def reverse_index(table, field):
+
+    # field value -> key, the first key wins where MajorTypes repeats a value
+    index = {}
+    for key, entry in table.items():
+        if isinstance(entry, dict) and field in entry:
+            index.setdefault(entry[field], key)
+
+    return MappingProxyType(index)
+
+def major_type(name, entry):
+
+    # '' has a placeholder dict for subtypes and the sensors have None
+    subtypes = entry["subtypes"] if isinstance(entry["subtypes"], dict) else {}
+    subtypes = {k: v for k, v in subtypes.items() if isinstance(v, dict)}
+
+    return MajorType(name, entry["major_sn"], entry["major_code"], classify(name), MappingProxyType(subtypes),
+                     reverse_index(subtypes, "sub_sn"), reverse_index(subtypes, "sub_code"))
+
+def load_tables(source=SOURCE, artifact=ARTIFACT):
+
+    # Without the source (a deployed copy) the artifact is used as it is
+    try:
+        with open(source, "rb") as f:
+            digest = source_digest(f.read())
+    except OSError:
+        digest = None
+
+    try:
+        with open(artifact, "r") as f:
+            compiled = json.load(f)
+        if compiled["version"] == ARTIFACT_VERSION and digest in (None, compiled["source"]):
+            return load_artifact(compiled)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    print("{} is out of date, run static/catalogue_compiler.py".format(artifact))
+    return load_artifact(compile_catalogue(source)[0])
+
+class Catalogue:
+
+    def __init__(self, tables):
+
+        majortypes = tables["majortypes"]
+        majors = {name: major_type(name, entry) for name, entry in majortypes.items()}
+
+        self.majors = MappingProxyType(majors)
+        self.by_code = reverse_index(majortypes, "major_code")
+        self.by_sn = reverse_index(majortypes, "major_sn")
+        self.families = MappingProxyType({name: major.family for name, major in majors.items()})
+
+        self.macs = MappingProxyType(tables["MACs"])
+        self.shapes = MappingProxyType(tables["hexaboard_shapes"])
+        self.vendors = MappingProxyType(tables["hexaboard_vendors"])
+        self.assemblers = MappingProxyType(tables["hexaboard_assemblers"])
+        self.mac_by_code = reverse_index(self.macs, "mac_code")
+        self.shape_by_code = reverse_index(self.shapes, "shape_code")
+        self.vendor_by_code = reverse_index(self.vendors, "vendor_code")
+        self.assembler_by_code = reverse_index(self.assemblers, "assembler_code")
+
+        self.magazines = tuple(tables["magazine_list"])
+        self.magazine_index = MappingProxyType({mag: i for i, mag in enumerate(self.magazines)})
+
+        # What the compiler found in MajorTypes, see catalogue_compiler.py
+        self.collisions = tuple(tables["collisions"])
+
+        self.frozen = True
+
+    def __setattr__(self, name, value):
+
+        if getattr(self, "frozen", False):
+            raise AttributeError("The catalogue is read-only, change static/MajorTypes.py instead")
+        object.__setattr__(self, name, value)
+
+    def major(self, name):
+
+        major = self.majors.get(name)
+        if major is None:
+            raise ValueError("Unknown major type {!r}".format(name))
+
+        return major
+
+    def family(self, name):
+
+        # Unknown names get the same classification as the known ones
+        family = self.families.get(name)
+        return classify(name) if family is None else family
+
+    def subtypes(self, name):
+
+        return self.major(name).subtypes
+
+    def magazine(self, number, per_magazine):
+
+        # Magazine of the number-th label (1-based) when each holds per_magazine labels
+        return self.magazines[(number - 1) // per_magazine]
+
+catalogue = Catalogue(load_tables())
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+
+# Compiles static/MajorTypes.py into static/catalogue.json, the frozen tables the
+# catalogue loads at startup instead of running MajorTypes' dict-building loops.
+# While compiling, the source is checked for what Python lets through silently:
+#
+#   - a key written twice in one dict literal, the later entry replaces the earlier
+#   - a major code or major serial number used by two major types (error)
+#   - a MAC, shape, vendor or assembler code used twice (error)
+#   - a sub_code or sub_sn used twice within one major type, which makes the serials
+#     or the DB lookup of those subtypes ambiguous
+#
+# Every check is one pass with a dict index. Errors stop the compile, the rest are
+# recorded in the artifact and printed; --strict stops on those too.
+#
+#   python static/catalogue_compiler.py
+#   python static/catalogue_compiler.py --strict --output /tmp/catalogue.json
+
+import os
+import ast
+import json
+import hashlib
+import argparse
+from collections import namedtuple
+
+STATIC_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(STATIC_DIR, "MajorTypes.py")
+ARTIFACT = os.path.join(STATIC_DIR, "catalogue.json")
+
+# Bump when the artifact layout changes
+ARTIFACT_VERSION = 1
+
+CODE_TABLES = [("MACs", "mac_code"), ("hexaboard_shapes", "shape_code"),
+               ("hexaboard_vendors", "vendor_code"), ("hexaboard_assemblers", "assembler_code")]
+
+Collision = namedtuple("Collision", ["level", "message"])
+
+def source_digest(source):
+
+    return hashlib.sha256(source).hexdigest()
+
+def duplicate_keys(tree):
+
+    # Literal keys repeated within one dict display, with the variable it is assigned to
+    collisions = []
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        name = ", ".join(t.id for t in node.targets if isinstance(t, ast.Name))
+
+        for d in ast.walk(node.value):
+            if not isinstance(d, ast.Dict):
+                continue
+            seen = {}
+            for key in d.keys:
+                if not isinstance(key, ast.Constant):
+                    continue
+                if key.value in seen:
+                    collisions.append(Collision("warning", "{}: key {!r} on line {} replaces the one on line {}".format(name, key.value, key.lineno, seen[key.value])))
+                else:
+                    seen[key.value] = key.lineno
+
+    return collisions
+
+def repeated(entries, field):
+
+    # {value: [names]} for every value of field shared by more than one name
+    index = {}
+    for name, entry in entries.items():
+        if isinstance(entry, dict) and field in entry:
+            index.setdefault(entry[field], []).append(name)
+
+    return {value: names for value, names in index.items() if len(names) > 1}
+
+def table_collisions(namespace):
+
+    collisions = []
+    majortypes = namespace["majortypes"]
+
+    for field in ["major_code", "major_sn"]:
+        for value, names in repeated(majortypes, field).items():
+            collisions.append(Collision("error", "{} {!r} is used by {}".format(field, value, ", ".join(names))))
+
+    for table, field in CODE_TABLES:
+        for value, names in repeated(namespace[table], field).items():
+            collisions.append(Collision("error", "{}: {} {!r} is used by {}".format(table, field, value, ", ".join(names))))
+
+    for major_name, major in majortypes.items():
+        if not isinstance(major["subtypes"], dict):
+            continue
+        for field in ["sub_code", "sub_sn"]:
+            for value, names in repeated(major["subtypes"], field).items():
+                collisions.append(Collision("warning", "{}: {} {!r} is used by {}".format(major_name, field, value, ", ".join(names))))
+
+    return collisions
+
+def compile_catalogue(path=SOURCE):
+
+    # The artifact for the MajorTypes source at path, and its collisions
+    with open(path, "rb") as f:
+        source = f.read()
+
+    tree = ast.parse(source, path)
+    namespace = {}
+    exec(compile(tree, path, "exec"), namespace)
+
+    collisions = duplicate_keys(tree) + table_collisions(namespace)
+
+    # Subtype tables shared by several major types (the tiles) are stored once, by name
+    table_names = {id(value): name for name, value in namespace.items() if name.startswith("sub_") and isinstance(value, dict)}
+    majortypes = {}
+    for name, major in namespace["majortypes"].items():
+        subtypes = major["subtypes"]
+        majortypes[name] = dict(major, subtypes=table_names.get(id(subtypes), subtypes))
+
+    artifact = {"version": ARTIFACT_VERSION, "source": source_digest(source),
+                "subtype_tables": {name: namespace[name] for name in sorted(set(table_names.values()))},
+                "majortypes": majortypes, "magazine_list": namespace["magazine_list"],
+                "collisions": [list(c) for c in collisions]}
+    for table, field in CODE_TABLES:
+        artifact[table] = namespace[table]
+
+    return artifact, collisions
+
+def load_artifact(artifact):
+
+    # The MajorTypes tables back from an artifact, shared subtype tables shared again
+    tables = artifact["subtype_tables"]
+    majortypes = {}
+    for name, major in artifact["majortypes"].items():
+        subtypes = major["subtypes"]
+        majortypes[name] = dict(major, subtypes=tables[subtypes] if isinstance(subtypes, str) else subtypes)
+
+    loaded = {table: artifact[table] for table, field in CODE_TABLES}
+    loaded.update(majortypes=majortypes, magazine_list=artifact["magazine_list"],
+                  collisions=[Collision(*c) for c in artifact["collisions"]])
+
+    return loaded
+
+def write_artifact(artifact, path=ARTIFACT):
+
+    # Write then rename, the app never reads a half written catalogue
+    temp = path + ".tmp"
+    with open(temp, "w") as f:
+        json.dump(artifact, f, indent=1)
+    os.replace(temp, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check static/MajorTypes.py for collisions and compile it into the catalogue artifact")
+    parser.add_argument("--source", default=SOURCE, help="MajorTypes source (default: static/MajorTypes.py)")
+    parser.add_argument("--output", default=ARTIFACT, help="Artifact to write (default: static/catalogue.json)")
+    parser.add_argument("--strict", action="store_true", default=False, help="Treat warnings as errors")
+    args = parser.parse_args()
+
+    artifact, collisions = compile_catalogue(args.source)
+    for c in collisions:
+        print("{}: {}".format(c.level, c.message))
+
+    errors = [c for c in collisions if c.level == "error" or args.strict]
+    if errors:
+        raise SystemExit("{} collisions, {} not written".format(len(errors), args.output))
+
+    write_artifact(artifact, args.output)
+    print("{} major types, {} warnings, written to {}".format(len(artifact["majortypes"]), len(collisions), args.output))
+
+if __name__ == "__main__":
+    main()
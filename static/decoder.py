@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+
+# Serial number decoder. The major types of the catalogue (static/catalogue.json) are
+# compiled once at import into a prefix trie over major_code + sub_code (and
+# major_sn + sub_sn for the older numeric serials), so a full serial is split into
+# its fields in one walk without any DB queries.
+
+import re
+import json
+import argparse
+from functools import lru_cache
+
+try:
+    from static.catalogue import catalogue
+except ImportError:
+    from catalogue import catalogue
+
+PREFIX = "320"
+LEGACY_PREFIX = "3205"
+
+TILE_CODES = ["BC", "BI", "TC", "TI"]
+MODULE_CODES = ["ML", "MH"]
+HEXABOARD_CODES = ["XL", "XH"]
+
+FAMILIES = {}
+FAMILIES.update((code, "tile") for code in TILE_CODES)
+FAMILIES.update((code, "module") for code in MODULE_CODES)
+FAMILIES.update((code, "hexaboard") for code in HEXABOARD_CODES)
+
+MAC_CODES = set(catalogue.mac_by_code)
+SHAPE_CODES = set(catalogue.shape_by_code)
+VENDOR_CODES = set(catalogue.vendor_by_code)
+ASSEMBLER_CODES = set(catalogue.assembler_by_code)
+
+# Serial part of a generic label, optionally led by a vendor letter
+SN_RE = re.compile(r"([A-Z]?)(\d+)$")
+
+TERMINAL = None
+
+class TypeEntry:
+
+    def __init__(self, major_name, major, sub_key=None, info=None):
+        self.major_name = major_name
+        self.major_code = major.code
+        self.major_sn = "{:02d}".format(int(major.sn))
+        self.sub_key = sub_key
+        self.sub_code = info["sub_code"] if info else None
+        self.sub_sn = info["sub_sn"] if info else None
+        self.sub_name = info.get("name", sub_key) if info else None
+
+def compile_trie(majors):
+
+    root = {}
+
+    def insert(key, entry):
+        node = root
+        for c in key:
+            node = node.setdefault(c, {})
+        node.setdefault(TERMINAL, []).append(entry)
+
+    for major_name, major in majors.items():
+        if major.code == "":
+            continue
+
+        insert(major.code, TypeEntry(major_name, major))
+
+        for sub_key, info in major.subtypes.items():
+            entry = TypeEntry(major_name, major, sub_key, info)
+            insert(entry.major_code + entry.sub_code, entry)
+            insert(entry.major_sn + entry.sub_sn, entry)
+            if entry.sub_code != entry.sub_sn:
+                insert(entry.major_sn + entry.sub_code, entry)
+
+    return root
+
+def trie_depth(node):
+
+    children = [trie_depth(child) for key, child in node.items() if key is not TERMINAL]
+    return 1 + max(children) if children else 0
+
+TRIE = compile_trie(catalogue.majors)
+MAX_KEY = trie_depth(TRIE)
+
+@lru_cache(maxsize=4096)
+def match(body):
+
+    # All (length, entries) pairs whose key is a prefix of body, shortest first
+    matches = []
+    node = TRIE
+    for depth, c in enumerate(body):
+        node = node.get(c)
+        if node is None:
+            break
+        if TERMINAL in node:
+            matches.append((depth + 1, node[TERMINAL]))
+
+    return tuple(matches)
+
+class DecodedSerial:
+
+    FIELDS = ["serial", "valid", "layout", "family", "major_name", "major_code", "major_sn",
+              "sub_name", "sub_code", "sub_sn", "roc", "mac", "vendor", "assembler",
+              "shape", "generation", "size", "batch", "magazine", "sn"]
+
+    def __init__(self, serial):
+        for field in self.FIELDS:
+            setattr(self, field, None)
+        self.serial = serial
+        self.valid = False
+        # Offset of the first character after the subtype, as sliced by DBUpload
+        self.sub_end = None
+
+    def set_type(self, entry, sub_code=None):
+        self.major_name = entry.major_name
+        self.major_code = entry.major_code
+        self.family = FAMILIES.get(entry.major_code)
+        self.major_sn = entry.major_sn
+        self.sub_name = entry.sub_name
+        self.sub_code = entry.sub_code if sub_code is None else sub_code
+        self.sub_sn = entry.sub_sn
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return "DecodedSerial({})".format(", ".join("{}={!r}".format(f, getattr(self, f)) for f in self.FIELDS if getattr(self, f) is not None))
+
+def major_entry(matches):
+
+    for length, entries in matches:
+        if length == 2:
+            return entries[0]
+
+    return None
+
+def sub_entries(matches, length):
+
+    for l, entries in matches:
+        if l == length:
+            return [e for e in entries if e.sub_code is not None]
+
+    return []
+
+def decode_tile(d, body, matches):
+
+    # <major><size:2><batch:4>[<magazine>]<sn>
+    entries = sub_entries(matches, 4)
+    if not entries:
+        return d
+
+    d.set_type(entries[0])
+    d.size = body[2:4]
+    d.batch = body[4:8]
+    tail = body[8:]
+    if tail[:1] in catalogue.magazine_index:
+        d.magazine = tail[0]
+        tail = tail[1:]
+    d.sn = tail
+    d.sub_end = len(PREFIX) + 4
+    d.valid = d.batch.isdigit() and tail.isdigit()
+
+    return d
+
+def decode_module(d, body, matches):
+
+    # <major><sub:3>[<roc>][<mac:2>]<sn:4>, older labels carry the MAC before the ROC
+    entries = sub_entries(matches, 5)
+    if not entries:
+        return d
+
+    d.set_type(entries[0])
+    middle, d.sn = body[5:-4], body[-4:]
+    if body[5:].isdigit():
+        middle, d.sn = "", body[5:]
+    elif len(middle) == 3 and middle[:2] in MAC_CODES:
+        d.mac, d.roc = middle[:2], middle[2]
+    elif len(middle) == 3 and middle[1:] in MAC_CODES:
+        d.roc, d.mac = middle[0], middle[1:]
+    elif len(middle) == 1:
+        d.roc = middle
+    elif middle:
+        return d
+    d.sub_end = len(PREFIX) + 5
+    d.valid = d.sn.isdigit()
+
+    return d
+
+def decode_hexaboard(d, body, matches):
+
+    # <major><shape><generation><roc><vendor><assembler><sn:5>
+    if len(body) != 12 or body[2] not in SHAPE_CODES or body[5] not in VENDOR_CODES or body[6] not in ASSEMBLER_CODES:
+        return decode_generic(d, body, matches)
+
+    d.set_type(major_entry(matches), sub_code=body[2:7])
+    d.shape, d.generation, d.roc, d.vendor, d.assembler = body[2:7]
+    d.sub_name = "{}{} {} {}{}".format(d.shape, d.generation, d.roc, d.vendor, d.assembler)
+    d.sn = body[7:]
+    d.sub_end = len(PREFIX) + 7
+    d.valid = d.sn.isdigit()
+
+    return d
+
+def decode_generic(d, body, matches):
+
+    # Longest subtype whose remainder is a serial number
+    for length, entries in reversed(matches):
+        entries = [e for e in entries if e.sub_code is not None]
+        m = SN_RE.match(body[length:])
+        if entries and m:
+            d.set_type(entries[0])
+            d.vendor = m.group(1) or None
+            d.sn = m.group(2)
+            d.sub_end = len(PREFIX) + length
+            d.valid = True
+            return d
+
+    return d
+
+def decode_legacy(d, body):
+
+    # 3205<major:2><sub><sn:5> from the original make_label / make_wagon_labels scripts
+    d.layout = "legacy"
+    d.sn = body[-5:]
+    key = body[:-5]
+    for length, entries in match(key[:MAX_KEY]):
+        if length == len(key):
+            entries = [e for e in entries if e.sub_code is not None]
+            if entries:
+                d.set_type(entries[0])
+                d.valid = d.sn.isdigit()
+                break
+    else:
+        major = major_entry(match(key[:MAX_KEY]))
+        if major is not None:
+            d.set_type(major, sub_code=key[2:])
+    d.sub_end = len(LEGACY_PREFIX) + len(key)
+
+    return d
+
+def decode(serial):
+
+    d = DecodedSerial(serial)
+
+    if serial.startswith(LEGACY_PREFIX) and len(serial) == 15:
+        return decode_legacy(d, serial[len(LEGACY_PREFIX):])
+    if not serial.startswith(PREFIX):
+        return d
+
+    d.layout = "current"
+    body = serial[len(PREFIX):]
+    matches = match(body[:MAX_KEY])
+
+    major = major_entry(matches)
+    if major is None:
+        # Older numeric serials, 320<major_sn:2><sub_sn><sn>
+        return decode_generic(d, body, matches)
+
+    d.set_type(major)
+
+    if d.family == "tile":
+        return decode_tile(d, body, matches)
+    elif d.family == "module":
+        return decode_module(d, body, matches)
+    elif d.family == "hexaboard":
+        return decode_hexaboard(d, body, matches)
+
+    return decode_generic(d, body, matches)
+
+def decode_many(serials):
+
+    # Serials of one order share their type prefix, so match() is a cache hit for all but the first
+    return [decode(s) for s in serials]
+
+def load_serials(path):
+
+    with open(path, "r") as f:
+        if path.endswith(".json"):
+            return list(json.load(f))
+        return [line.strip() for line in f if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode HGCAL serial numbers without the database")
+    parser.add_argument("serials", nargs="*", help="Serial numbers to decode")
+    parser.add_argument("--input", default=None, help="File of serials (printed_barcodes.json or one per line)")
+    parser.add_argument("--summary", action="store_true", default=False, help="Print counts per major/sub type instead of every serial")
+    args = parser.parse_args()
+
+    serials = list(args.serials)
+    if args.input:
+        serials += load_serials(args.input)
+
+    decoded = decode_many(serials)
+
+    if not args.summary:
+        for d in decoded:
+            print(d)
+        return
+
+    counts = {}
+    for d in decoded:
+        key = (d.major_name, d.sub_name) if d.valid else ("UNDECODED", None)
+        counts[key] = counts.get(key, 0) + 1
+
+    for (major, sub), n in sorted(counts.items(), key=lambda kv: -kv[1]):
+        print("{:>7}  {} / {}".format(n, major, sub))
+
+if __name__ == "__main__":
+    main()
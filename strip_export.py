@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+
+# Image export of label strips for the traveller documents. Every strip of a job is
+# rendered offline (zpl_render) in label order, lowest serials first, and written as
+# a 1-bit PNG per strip, or as the pages of one Group 4 TIFF or PDF. Strips are made,
+# rendered and written one at a time (except for PDF, which PIL writes in one go).
+#
+#   python strip_export.py big_job.json --output tmp/export/big_job.tif
+#   python strip_export.py tmp/jobs/<job> --size 25.375 88.9 --output tmp/export/pngs
+
+import os
+import argparse
+
+from PIL import TiffImagePlugin
+
+from zpl_render import ZPLRenderer
+from label_engine import label_info, strip_options, load_specs
+from make_label_gui import strip_maker, strip_size
+from job_stream import StreamJob
+
+IMAGE_FORMATS = {".tif": "TIFF", ".tiff": "TIFF", ".pdf": "PDF"}
+
+def spec_strips(spec, borders=False):
+
+    # (height, width) in mm and the ZPL of each strip of a job spec
+    info = label_info(spec.validate())
+    options = strip_options(spec, info)
+    per_strip, make_barcode, make_strip = strip_maker(borders=borders, **options)
+
+    def strips():
+        for i in range(0, len(info), per_strip):
+            yield make_strip([make_barcode(x) for x in info[i:i+per_strip]], False)[1]
+
+    return strip_size(**options), strips()
+
+def stream_strips(job):
+
+    # A streamed job holds its strips last strip first
+    for index in reversed(range(job.strips)):
+        yield job.strip(index).decode()
+
+def render_strips(strips, size, dpmm=8.0):
+
+    height, width = size
+    renderer = ZPLRenderer(width, height, dpmm)
+    for zpl in strips:
+        yield renderer.render(zpl)
+
+def export_strips(images, path, dpmm=8.0):
+
+    # Writes the images to path (.tif/.tiff or .pdf, anything else is a directory of
+    # PNGs) at the printer's resolution, returns how many strips were written
+    fmt = IMAGE_FORMATS.get(os.path.splitext(path)[1].lower())
+    dpi = dpmm * 25.4
+    count = 0
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if fmt == "TIFF":
+        with TiffImagePlugin.AppendingTiffWriter(path, True) as tiff:
+            for im in images:
+                im.save(tiff, format="TIFF", compression="group4", dpi=(dpi, dpi))
+                tiff.newFrame()
+                count += 1
+    elif fmt == "PDF":
+        pages = list(images)
+        if pages:
+            pages[0].save(path, save_all=True, append_images=pages[1:], resolution=dpi)
+        count = len(pages)
+    else:
+        os.makedirs(path, exist_ok=True)
+        for im in images:
+            im.save(os.path.join(path, "strip_{:04d}.png".format(count)), dpi=(dpi, dpi))
+            count += 1
+
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Export label strips as 1-bit PNG, multipage TIFF or PDF")
+    parser.add_argument("jobs", nargs="+", help="label_engine JSON job files or streamed job directories")
+    parser.add_argument("--output", default="./tmp/strips.tif", help="TIFF or PDF file, or a directory for PNGs (default: ./tmp/strips.tif)")
+    parser.add_argument("--size", nargs=2, type=float, default=[25.375, 88.9], metavar=("HEIGHT", "WIDTH"), help="Strip size in mm for streamed jobs (default: 25.375 88.9)")
+    parser.add_argument("--dpmm", type=float, default=8.0, help="Printer dots per mm (default: 8)")
+    parser.add_argument("--borders", action="store_true", default=False, help="Draw label borders")
+    args = parser.parse_args()
+
+    def images():
+        for path in args.jobs:
+            if os.path.isdir(path):
+                yield from render_strips(stream_strips(StreamJob(path)), args.size, args.dpmm)
+                continue
+            for spec in load_specs(path):
+                size, strips = spec_strips(spec, args.borders)
+                yield from render_strips(strips, size, args.dpmm)
+
+    count = export_strips(images(), args.output, args.dpmm)
+    print("{} strips written to {}".format(count, args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+
+# Paged preview of every strip in a streamed job (job_stream). A strip is rendered
+# only when its page is shown, rendered pages are kept in an LRU cache keyed by the
+# hash of the strip's ZPL, and a background thread renders the next few pages ahead
+# of the operator, skipping the ones scrolled past before it got to them. Pages are in label order, page 0 holds the lowest serials (the job
+# itself is sent last strip first).
+#
+#   python strip_preview.py tmp/jobs/<job> --size 25.375 88.9 --pages 0 5 --outdir tmp
+
+import os
+import queue
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+
+from zpl_render import render_zpl
+from job_stream import StreamJob
+
+PAGE_CACHE = 32
+PREFETCH = 3
+
+class StripPages:
+
+    def __init__(self, job, size, dpmm=8.0, cache_size=PAGE_CACHE, prefetch=PREFETCH):
+
+        # size is (height, width) in mm, as make_label_gui.strip_size gives it
+        self.job = job
+        self.height, self.width = size
+        self.dpmm = dpmm
+        self.cache_size = cache_size
+        self.prefetch = prefetch
+
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        # sha1 -> Event of renders under way, a page asked for twice is drawn once
+        self.inflight = {}
+        self.requests = queue.Queue()
+        self.queued = set()
+        self.current = 0
+        self.rendered = 0
+
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def __len__(self):
+        return self.job.strips
+
+    def strip_zpl(self, page):
+
+        if not 0 <= page < len(self):
+            raise IndexError("No page {} in a {} strip job".format(page, len(self)))
+
+        return self.job.strip(len(self) - 1 - page)
+
+    def render(self, page):
+
+        zpl = self.strip_zpl(page)
+        key = hashlib.sha1(zpl).hexdigest()
+
+        # The lock only covers the cache, rendering happens outside it so the Tk thread
+        # is never held up by a prefetch of another page
+        while True:
+            with self.lock:
+                im = self.cache.get(key)
+                if im is not None:
+                    self.cache.move_to_end(key)
+                    return im
+                done = self.inflight.get(key)
+                if done is None:
+                    done = self.inflight[key] = threading.Event()
+                    break
+
+            # Someone else is drawing this page, use theirs (or draw it if that failed)
+            done.wait()
+
+        try:
+            im = render_zpl(zpl.decode(), self.width, self.height, self.dpmm)
+            with self.lock:
+                self.rendered += 1
+                self.cache[key] = im
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            done.set()
+
+        return im
+
+    def wanted(self, page):
+
+        # Pages worth prefetching around the one on screen
+        return self.current - 1 <= page <= self.current + self.prefetch
+
+    def page(self, page):
+
+        self.current = page
+        im = self.render(page)
+        for ahead in list(range(page + 1, page + 1 + self.prefetch)) + [page - 1]:
+            if 0 <= ahead < len(self):
+                with self.lock:
+                    if ahead in self.queued:
+                        continue
+                    self.queued.add(ahead)
+                self.requests.put(ahead)
+
+        return im
+
+    def run(self):
+
+        while True:
+            page = self.requests.get()
+            if page is None:
+                return
+            with self.lock:
+                self.queued.discard(page)
+
+            # Pages scrolled past while waiting in the queue are dropped
+            if not self.wanted(page):
+                continue
+            try:
+                self.render(page)
+            except (OSError, ValueError, IndexError) as e:
+                print("Prefetching page {} failed: {}".format(page, e))
+
+    def close(self):
+
+        self.requests.put(None)
+
+def main():
+    parser = argparse.ArgumentParser(description="Render pages of a streamed job's strips to PNG")
+    parser.add_argument("job", help="Job directory")
+    parser.add_argument("--size", nargs=2, type=float, default=[25.375, 88.9], metavar=("HEIGHT", "WIDTH"), help="Strip size in mm (default: 25.375 88.9)")
+    parser.add_argument("--pages", nargs="+", type=int, default=[0], help="Pages to render, 0 is the strip with the lowest serials")
+    parser.add_argument("--outdir", default="./tmp", help="Directory for the page PNGs (default: ./tmp)")
+    args = parser.parse_args()
+
+    pages = StripPages(StreamJob(args.job), args.size)
+    os.makedirs(args.outdir, exist_ok=True)
+
+    for page in args.pages:
+        outpath = os.path.join(args.outdir, "strip_{:04d}.png".format(page))
+        pages.page(page).save(outpath)
+        print("Page {} of {} saved to {}".format(page + 1, len(pages), outpath))
+
+    pages.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The scripts import each other as top-level modules, run from the repo root, static/
+# or utils/, so all three go on the path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in [ROOT, os.path.join(ROOT, "static"), os.path.join(ROOT, "utils")]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
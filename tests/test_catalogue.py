@@ -0,0 +1,54 @@
+import json
+
+import MajorTypes
+from catalogue_compiler import SOURCE, ARTIFACT, source_digest, compile_catalogue, load_artifact
+from catalogue import catalogue
+from decoder import decode
+
+def test_artifact_is_current():
+
+    # static/catalogue.json has to be recompiled whenever MajorTypes.py changes
+    with open(SOURCE, "rb") as f:
+        digest = source_digest(f.read())
+    with open(ARTIFACT, "r") as f:
+        artifact = json.load(f)
+
+    assert artifact["source"] == digest
+    assert not [c for c in load_artifact(artifact)["collisions"] if c.level == "error"]
+
+def test_artifact_loads_back_to_majortypes():
+
+    artifact, collisions = compile_catalogue()
+    tables = load_artifact(json.loads(json.dumps(artifact)))
+
+    assert tables["majortypes"] == MajorTypes.majortypes
+    assert tables["magazine_list"] == MajorTypes.magazine_list
+    assert tables["MACs"] == MajorTypes.MACs
+
+def test_collisions_are_found(tmp_path):
+
+    source = tmp_path / "MajorTypes.py"
+    source.write_text("MACs = {'A': {'mac_code': 'X'}, 'B': {'mac_code': 'X'}}\n"
+                      "hexaboard_shapes = {}\nhexaboard_vendors = {}\nhexaboard_assemblers = {}\nmagazine_list = []\n"
+                      "majortypes = {'One': {'major_code': 'AA', 'major_sn': 1, 'subtypes': None},\n"
+                      "              'Two': {'major_code': 'AA', 'major_sn': 2, 'subtypes': None},\n"
+                      "              'One': {'major_code': 'BB', 'major_sn': 3, 'subtypes': None}}\n")
+
+    artifact, collisions = compile_catalogue(str(source))
+    messages = [(c.level, c.message) for c in collisions]
+
+    assert ("warning", "majortypes: key 'One' on line 8 replaces the one on line 6") in messages
+    assert any(level == "error" and "MACs: mac_code 'X'" in message for level, message in messages)
+
+def test_decoder_uses_catalogue_codes():
+
+    # The first subtype of every major type decodes back to its major type
+    checked = 0
+    for name, major in catalogue.majors.items():
+        for sub_name, sub in list(major.subtypes.items())[:1]:
+            if not major.code or not isinstance(sub.get("sub_code"), str):
+                continue
+            assert decode("320" + major.code + sub["sub_code"] + "0" * 12).major_name == name
+            checked += 1
+
+    assert checked > 10
@@ -0,0 +1,66 @@
+import pytest
+
+import datamatrix
+from datamatrix import encode, encode_ascii, pad_codewords, pick_symbol, add_ecc, symbol_image, symbol_layout
+
+# ISO/IEC 16022 worked example: "123456" in a 10x10 symbol
+ISO_CODEWORDS = [142, 164, 186, 114, 25, 5, 88, 102]
+ISO_SYMBOL = ["1010101010",
+              "1100101101",
+              "1100000100",
+              "1100011101",
+              "1100001000",
+              "1000001111",
+              "1110110000",
+              "1111011001",
+              "1001110100",
+              "1111111111"]
+
+def codewords(text):
+
+    data = encode_ascii(text)
+    size = pick_symbol(len(data))
+    return add_ecc(pad_codewords(data, size[2]), size)
+
+def test_iso_example_codewords():
+
+    assert codewords("123456") == ISO_CODEWORDS
+
+def test_iso_example_symbol():
+
+    assert ["".join(map(str, row)) for row in encode("123456")] == ISO_SYMBOL
+
+@pytest.mark.parametrize("text", ["123456", "320XLF4F4QH00001", "320MLF3TCUB0000123", "HGCAL label " * 4])
+def test_modules_read_back_to_the_codewords(text):
+
+    # Every module holds the bit of the codeword the symbol layout says, and the
+    # finder pattern is solid left and bottom, alternating top and right
+    matrix = encode(text)
+    words = codewords(text)
+    size = pick_symbol(len(encode_ascii(text)))
+    flat = [v for row in matrix for v in row]
+
+    for value, (index, shift) in zip(flat, symbol_layout(size)):
+        if index < len(words):
+            assert value == words[index] >> shift & 1
+
+    assert all(row[0] == 1 for row in matrix) and all(matrix[-1])
+    assert matrix[0] == [1 - x % 2 for x in range(len(matrix[0]))]
+    assert [row[-1] for row in matrix] == [y % 2 for y in range(len(matrix))]
+
+def test_symbol_sizes_and_padding():
+
+    assert len(encode("1234567890")) == 12
+    assert len(encode("A" * 30)) == 22
+    assert pad_codewords([66], 5) == [66, 129, 70, 220, 115]
+    with pytest.raises(ValueError):
+        encode("A" * 1600)
+
+def test_cached_images_match_fresh_ones():
+
+    datamatrix.symbol_image.cache_clear()
+    first = symbol_image("320XLF4F4QH00001", 3)
+
+    assert symbol_image("320XLF4F4QH00001", 3) is first
+    assert first.tobytes() == datamatrix.to_image(encode("320XLF4F4QH00001"), 3).tobytes()
+    assert first.size == (18 * 3, 18 * 3)
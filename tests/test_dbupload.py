@@ -0,0 +1,95 @@
+import os
+import json
+import shutil
+
+import pytest
+
+import DBUpload
+from connect import connect_sqlite
+
+from conftest import ROOT
+
+SCHEMA = os.path.join(ROOT, "sql", "labeling_schema_sqlite.sql")
+PRINTED = os.path.join(ROOT, "static", "printed_barcodes.json")
+
+# Serials the two paths have split differently before: tiles whose size digits match
+# a numeric sub_sn, hexaboards with 5 character codes, wagons with a 6 character code
+KNOWN = ["320TC0140100001", "320TC0100100001", "320XLF02PU00001", "320WE10A1000001", "320WE30A3000001", "3205WE10A000001"]
+
+LABEL_QUERY = "SELECT full_label, type_sn, type_code, sn, major_type_id, sub_type_id FROM Label ORDER BY full_label"
+
+@pytest.fixture(scope="module")
+def labels():
+
+    with open(PRINTED, "r") as f:
+        printed = list(json.load(f))
+
+    return KNOWN + [l for l in printed[::5] if l not in KNOWN]
+
+@pytest.fixture(scope="module")
+def meta_db(tmp_path_factory):
+
+    # Meta tables filled once, each test works on a copy
+    path = tmp_path_factory.mktemp("meta") / "meta.db"
+    cnx = connect_sqlite(str(path), schema_path=SCHEMA)
+    DBUpload.update_metatables(cnx, DBUpload.majortypes)
+    cnx.close()
+
+    return path
+
+def fresh_db(meta_db, path):
+
+    shutil.copy(meta_db, path)
+    return connect_sqlite(str(path))
+
+def test_bulk_matches_per_label(labels, meta_db, tmp_path):
+
+    single = fresh_db(meta_db, tmp_path / "single.db")
+    with open(tmp_path / "single_orphans.txt", "w") as f:
+        for label in labels:
+            DBUpload.upload_label(label, single, f)
+
+    bulk = fresh_db(meta_db, tmp_path / "bulk.db")
+    with open(tmp_path / "bulk_orphans.txt", "w") as f:
+        inserted, duplicates = DBUpload.upload_labels_bulk(labels, bulk, f)
+
+    assert duplicates == []
+    assert bulk.execute(LABEL_QUERY).fetchall() == single.execute(LABEL_QUERY).fetchall()
+    assert (tmp_path / "bulk_orphans.txt").read_text() == (tmp_path / "single_orphans.txt").read_text()
+
+def test_bulk_reports_duplicates(labels, meta_db, tmp_path):
+
+    # 3205 labels are skipped, not uploaded
+    current = [l for l in labels if not l.startswith("3205")]
+
+    cnx = fresh_db(meta_db, tmp_path / "bulk.db")
+    with open(tmp_path / "orphans.txt", "w") as f:
+        DBUpload.upload_labels_bulk(current[:20], cnx, f)
+        inserted, duplicates = DBUpload.upload_labels_bulk(current[15:25] + current[:1], cnx, f)
+
+    assert inserted == 5
+    assert duplicates == current[15:20] + current[:1]
+
+def test_sql_int_follows_mysql():
+
+    assert DBUpload.sql_int("3W") == 3
+    assert DBUpload.sql_int("W3") == 0
+    assert DBUpload.sql_int("0042") == 42
+
+@pytest.mark.parametrize("label, type_code, sn", [("320WE10A1000001", "WE10A1", 1),
+                                                  ("320TC0000010001", "TC00", 10001),
+                                                  ("320MLF3W000001", "MLF3W", 1)])
+def test_decoded_labels_take_one_query(label, type_code, sn, meta_db, tmp_path):
+
+    # The decoder's split is used where the meta tables have it, found with one SELECT
+    cnx = fresh_db(meta_db, tmp_path / "single.db")
+    selects = []
+    cnx.set_trace_callback(lambda sql: selects.append(sql) if sql.startswith("SELECT") else None)
+
+    with open(tmp_path / "orphans.txt", "w") as f:
+        DBUpload.upload_label(label, cnx, f)
+    cnx.set_trace_callback(None)
+
+    assert len(selects) == 1
+    assert cnx.execute("SELECT type_code, sn FROM Label").fetchall() == [(type_code, sn)]
+    assert (tmp_path / "orphans.txt").read_text() == ""
@@ -0,0 +1,72 @@
+import os
+import random
+
+import pytest
+
+from graphic_compression import METHODS, acs_encode, z64_encode, decode_graphic, compress_gfa
+from print_pictures import convert_wagon_image
+
+from conftest import ROOT
+
+IMAGES = os.path.join(ROOT, "WagonImages", "Images")
+
+def bitmaps():
+
+    # (name, raw, row_bytes) covering the ACS cases: fills, repeated rows, runs past
+    # 400 digits and rows ending in 0 or F runs
+    rng = random.Random(23)
+    noise = bytes(rng.randrange(256) for n in range(40 * 12))
+    wide = bytes(300) + b"\x0f" + b"\xff" * 250 + b"\x12"
+
+    return [("blank", bytes(32 * 10), 32),
+            ("black", b"\xff" * 32 * 10, 32),
+            ("noise", noise, 40),
+            ("repeated rows", (b"\x00\x3c\xff\x81" * 4) * 6 + b"\x01" * 16, 16),
+            ("zero tail", (b"\xa5" * 5 + bytes(11)) * 4, 16),
+            ("f tail", (b"\x5a" * 3 + b"\xff" * 13) * 4, 16),
+            ("long runs", wide * 2, len(wide))]
+
+@pytest.mark.parametrize("name, raw, row_bytes", bitmaps(), ids=[b[0] for b in bitmaps()])
+def test_acs_round_trip(name, raw, row_bytes):
+
+    assert decode_graphic(acs_encode(raw, row_bytes), len(raw), row_bytes) == raw
+
+@pytest.mark.parametrize("name, raw, row_bytes", bitmaps(), ids=[b[0] for b in bitmaps()])
+def test_z64_round_trip(name, raw, row_bytes):
+
+    assert decode_graphic(z64_encode(raw), len(raw), row_bytes) == raw
+
+def test_plain_hex_reads_back():
+
+    raw = bytes(range(256))
+    assert decode_graphic(raw.hex().upper(), len(raw), 16) == raw
+
+def test_z64_crc_mismatch_is_rejected():
+
+    data = z64_encode(bytes(64))
+    bad = data[:-4] + "{:04X}".format(int(data[-4:], 16) ^ 1)
+
+    with pytest.raises(ValueError):
+        decode_graphic(bad, 64, 8)
+
+@pytest.mark.parametrize("image", ["WE10A1", "WE10B1", "WE11A1"])
+def test_wagon_graphics_keep_their_bitmap(image):
+
+    plain = convert_wagon_image(os.path.join(IMAGES, image + ".png"), compression="none")["gfa"]
+    _, _, total, row_bytes, data = plain.split(",", 4)
+    raw = decode_graphic(data, int(total), int(row_bytes))
+
+    sizes = {}
+    for method in METHODS:
+        gfa = compress_gfa(plain, method)
+        head, _, _, _, data = gfa.split(",", 4)
+        assert head == "^GFA" and decode_graphic(data, int(total), int(row_bytes)) == raw
+        sizes[method] = len(gfa)
+
+    assert sizes["none"] == len(plain)
+    assert sizes["auto"] == min(sizes.values())
+
+def test_unknown_method_is_rejected():
+
+    with pytest.raises(ValueError):
+        compress_gfa("^GFA,2,2,1,FF", "rle")
@@ -0,0 +1,148 @@
+import io
+import contextlib
+from datetime import datetime, timedelta
+
+import pytest
+
+from job_scheduler import ScheduledJob, schedule, late_jobs, count_switches, runs, switch_report, output_runs, check_jobs
+from label_engine import JobSpec, label_length_file
+from print_spooler import PrintSpooler
+from stash_printed import SerialStore
+
+from conftest import ROOT
+
+START = datetime(2024, 3, 1, 9, 0)
+
+def job(seq, stock, deadline=None):
+
+    # 10 labels, 5 s on the printer, and 20 s for a stock switch
+    return ScheduledJob("job{}".format(seq), stock, 10, START + timedelta(seconds=deadline) if deadline else None, seq)
+
+def test_jobs_on_the_loaded_stock_are_batched():
+
+    jobs = [job(0, "A", 3600), job(1, "B", 7200), job(2, "A", 10800)]
+
+    order = schedule(jobs, START)
+
+    assert [j.seq for j in order] == [0, 2, 1]
+    assert count_switches(jobs) == 3 and count_switches(order) == 2
+    assert count_switches(order, current_stock="A") == 1
+    assert late_jobs(order, START) == set()
+
+def test_batching_never_makes_a_job_late():
+
+    # A is loaded, B is due right when EDF finishes it, running A first would make it late
+    jobs = [job(0, "B", 25), job(1, "A", 3600)]
+
+    assert [j.seq for j in schedule(jobs, START, current_stock="A")] == [0, 1]
+    assert late_jobs(jobs, START, current_stock="A") == set()
+    assert late_jobs(jobs[::-1], START, current_stock="A") == {0}
+
+    # With time to spare the loaded stock goes first
+    jobs[0].deadline = START + timedelta(seconds=30)
+    assert [j.seq for j in schedule(jobs, START, current_stock="A")] == [1, 0]
+
+def test_jobs_without_deadline_go_last():
+
+    jobs = [job(0, "A"), job(1, "B", 3600), job(2, "B")]
+
+    assert [j.seq for j in schedule(jobs, START)] == [1, 2, 0]
+    assert [j.seq for j in schedule(jobs, START, current_stock="A")] == [0, 1, 2]
+
+def test_runs_and_switch_report():
+
+    jobs = [job(0, "A"), job(1, "B"), job(2, "A"), job(3, "A")]
+    order = schedule(jobs, START)
+
+    assert [(stock, [j.seq for j in group]) for stock, group in runs(order)] == [("A", [0, 2, 3]), ("B", [1])]
+    assert switch_report(jobs, order) == "2 media switches instead of 3 (1 saved)"
+
+    overdue = [job(0, "A", -60)]
+    assert switch_report(overdue, overdue).endswith("1 jobs will miss their deadline")
+
+def stock_runs():
+
+    specs = [JobSpec("LD Engine", subtype="EngV2", count=4, start=900001, name="engines"),
+             JobSpec("LD Module", subtype="Full, 300 um, CuW baseplate", count=3, start=900001, mac="UCSB", roc="X", name="modules")]
+    jobs = [ScheduledJob(spec, label_length_file(spec), spec.count, seq=i) for i, spec in enumerate(specs)]
+
+    return runs(schedule(jobs, START))
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+
+    # The setLabelLength_* files are read from the repo root
+    monkeypatch.chdir(ROOT)
+    store = SerialStore(str(tmp_path / "printed.db"))
+    yield store
+    store.close()
+
+def output(*args, **kwargs):
+
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        output_runs(*args, **kwargs)
+
+    return out.getvalue()
+
+def test_jobs_with_printed_or_shared_serials_are_skipped(store):
+
+    specs = [JobSpec("LD Engine", subtype="EngV2", count=4, start=900001, name="first"),
+             JobSpec("LD Engine", subtype="EngV2", count=4, start=900003, name="overlap"),
+             JobSpec("LD Engine", subtype="EngV2", count=4, start=900101, name="printed"),
+             JobSpec("LD Engine", subtype="EngV2", count=4, start=900201, name="clean")]
+    jobs = [ScheduledJob(spec, label_length_file(spec), spec.count, seq=i) for i, spec in enumerate(specs)]
+    store.add_many(["320EL0100900102"])
+
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        kept = check_jobs(jobs, store)
+
+    assert [j.item.name for j in kept] == ["clean"]
+    assert "Skipping printed: 1 serials already printed or in another job (first 320EL0100900102)" in out.getvalue()
+    assert check_jobs(jobs, store, force=True) == jobs
+
+def test_each_run_is_stashed_once_written(tmp_path, store):
+
+    def spec(job):
+        if job.item.name == "modules":
+            raise OSError("disk full")
+        return job.item
+
+    with pytest.raises(OSError):
+        output(stock_runs(), str(tmp_path / "out"), store, spec=spec)
+
+    assert [s[:9] for s in store.serials()] == ["320EL0100"] * 4
+
+def test_runs_with_setup_print_on_their_own(tmp_path, store):
+
+    text = output(stock_runs(), str(tmp_path / "out"), store, with_setup=True)
+
+    with open(tmp_path / "out" / "01_Module.zpl") as f, open("setLabelLength_Module.zpl") as setup:
+        assert f.read().startswith(setup.read().strip())
+    assert "Wrote 1 jobs, 3 labels to" in text
+    assert len(store) == 7
+
+class FlakyPrinter:
+
+    # Takes the first run and fails on the next
+
+    def __init__(self):
+        self.sent = []
+
+    def get(self):
+        return self
+
+    def print_zpl(self, zpl, progress=None):
+
+        if self.sent:
+            raise OSError("paper out")
+        self.sent.append(zpl)
+        return 1
+
+def test_printed_runs_are_stashed_when_done(tmp_path, store):
+
+    printer = FlakyPrinter()
+    text = output(stock_runs(), str(tmp_path / "out"), store, PrintSpooler(printers=printer), with_setup=True)
+
+    assert "Printing" in text and "failed: paper out" in text
+    assert len(printer.sent) == 1
+    assert [s[:9] for s in store.serials()] == ["320EL0100"] * 4
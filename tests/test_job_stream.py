@@ -0,0 +1,133 @@
+import io
+import os
+import json
+import contextlib
+
+import pytest
+
+from job_stream import JobWriter, StreamJob, prune_jobs
+from label_engine import JobSpec, stream_job
+from printer_memory import PrinterMemory
+from print_spooler import PrintSpooler
+from raw_printer import PrinterError, split_formats
+
+def write_job(job_dir, strips, chunk_size=64):
+
+    writer = JobWriter(str(job_dir), name="test", chunk_size=chunk_size)
+    for strip in strips:
+        writer.add_strip(strip)
+
+    return writer.close()
+
+STRIPS = ["^XA^FD{:03d}^XZ".format(n) for n in range(10)]
+
+def test_chunks_manifest_and_progress_round_trip(tmp_path):
+
+    job = write_job(tmp_path / "job", STRIPS)
+
+    with open(tmp_path / "job" / "manifest.json") as f:
+        manifest = json.load(f)
+    assert manifest["complete"] and manifest["strips"] == 10
+    assert len(manifest["chunks"]) > 1 and sum(c["strips"] for c in manifest["chunks"]) == 10
+
+    assert job.read() == "".join(s + "\n" for s in STRIPS).encode()
+    assert job.strip(7) == (STRIPS[7] + "\n").encode()
+    with pytest.raises(IndexError):
+        job.strip(10)
+
+    # Progress is kept on disk, a reloaded job carries on after the confirmed strip
+    job.confirm(6)
+    again = StreamJob(str(tmp_path / "job"))
+    assert again.confirmed == 6 and not again.finished()
+    assert [s for first, strips in again.chunks() for s in strips] == [(s + "\n").encode() for s in STRIPS[6:]]
+    assert [first for first, strips in again.chunks()][0] == 6
+
+    again.confirm(10)
+    assert StreamJob(str(tmp_path / "job")).finished()
+
+def test_unfinished_writer_is_not_finished(tmp_path):
+
+    writer = JobWriter(str(tmp_path / "job"), chunk_size=16)
+    writer.add_strip(STRIPS[0])
+    writer.add_strip(STRIPS[1])
+
+    job = StreamJob(str(tmp_path / "job"))
+    assert job.strips == 2 and not job.finished()
+
+def test_prune_keeps_queued_and_partly_printed_jobs(tmp_path):
+
+    root = tmp_path / "jobs"
+    printed = write_job(root / "1-printed", STRIPS[:2])
+    printed.confirm(2)
+    partial = write_job(root / "2-partial", STRIPS[:2])
+    partial.confirm(1)
+    write_job(root / "3-queued", STRIPS[:2])
+    old = write_job(root / "4-old", STRIPS[:2])
+    os.utime(os.path.join(old.job_dir, "manifest.json"), (0, 0))
+    write_job(root / "5-newest", STRIPS[:2])
+
+    prune_jobs(str(root), keep=1)
+
+    assert sorted(os.listdir(root)) == ["2-partial", "3-queued", "5-newest"]
+
+class FailingPrinter:
+
+    # Takes formats one by one like RawPrinter.print_zpl and fails after limit of them
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.sent = []
+
+    def print_zpl(self, zpl, progress=None):
+
+        formats = split_formats(zpl)
+        for i, fmt in enumerate(formats):
+            if self.limit is not None and len(self.sent) >= self.limit:
+                raise PrinterError("paper out")
+            self.sent.append(fmt)
+            if progress is not None:
+                progress(i + 1, len(formats))
+
+        return len(formats)
+
+class OnePrinter:
+
+    def __init__(self, printer):
+        self.printer = printer
+
+    def get(self):
+        return self.printer
+
+def send(job, printer):
+
+    spooler = PrintSpooler(printers=OnePrinter(printer))
+    spooler.submit_job(job)
+    spooler.stop()
+
+    return [kind for kind, job, message in spooler.poll()]
+
+def test_stored_format_job_resumes_after_the_last_whole_strip(tmp_path):
+
+    memory = PrinterMemory("zebra", state_path=str(tmp_path / "memory.json"))
+    spec = JobSpec("LD Hexaboard", count=40, start=1, shape="Full", generation="4", roc="4", vendor="HiQ", assembler="Hybrid SA")
+    with contextlib.redirect_stdout(io.StringIO()):
+        job, barcodes = stream_job(spec, str(tmp_path / "job"), preview=False, memory=memory)
+
+    # The first strip of each layout carries the ^DF download ahead of its recall
+    strips = [strip for first, chunk in job.chunks(0) for strip in chunk]
+    assert [len(split_formats(s)) for s in strips] == [2, 2, 1]
+
+    # Paper runs out after the ^DF download, the strip carrying it is not printed
+    first = FailingPrinter(limit=1)
+    assert "error" in send(job, first)
+    assert job.confirmed == 0
+
+    # nor is the second one after only its download went out
+    second = FailingPrinter(limit=3)
+    assert "error" in send(job, second)
+    assert job.confirmed == 1
+
+    rest = FailingPrinter()
+    assert "done" in send(job, rest)
+    assert job.finished()
+    assert [f.strip() for f in second.sent[:2] + rest.sent] == [f.strip() for s in strips for f in split_formats(s)]
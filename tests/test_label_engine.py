@@ -0,0 +1,46 @@
+import io
+import sys
+import json
+import contextlib
+
+import label_engine
+from stash_printed import SerialStore
+
+JOBS = [{"major_type": "LD Engine", "subtype": "EngV2", "count": 5, "start": 900001, "name": "first"},
+        {"major_type": "LD Engine", "subtype": "EngV2", "count": 5, "start": 900003, "name": "overlap"}]
+
+def run_main(monkeypatch, *args):
+
+    monkeypatch.setattr(sys, "argv", ["label_engine.py"] + [str(a) for a in args])
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        label_engine.main()
+
+    return out.getvalue()
+
+def test_skipped_job_stashes_nothing(tmp_path, monkeypatch):
+
+    jobs = tmp_path / "jobs.json"
+    jobs.write_text(json.dumps(JOBS))
+    db = tmp_path / "printed.db"
+    SerialStore(str(db)).close()
+
+    output = run_main(monkeypatch, jobs, "--outdir", tmp_path / "out", "--db", db)
+
+    assert "Skipping overlap: 3 serials already printed" in output
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == ["first.zpl"]
+
+    store = SerialStore(str(db))
+    assert store.serials() == ["320EL0100{}".format(900001 + n) for n in range(5)]
+
+def test_forced_job_is_written_and_stashed(tmp_path, monkeypatch):
+
+    jobs = tmp_path / "jobs.json"
+    jobs.write_text(json.dumps(JOBS))
+    db = tmp_path / "printed.db"
+    SerialStore(str(db)).close()
+
+    run_main(monkeypatch, jobs, "--outdir", tmp_path / "out", "--db", db, "--force")
+
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == ["first.zpl", "overlap.zpl"]
+    assert len(SerialStore(str(db))) == 7
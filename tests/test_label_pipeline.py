@@ -0,0 +1,101 @@
+import io
+import sys
+import json
+import contextlib
+
+import pytest
+
+import label_pipeline
+from label_engine import JobSpec, job_barcodes
+from label_pipeline import pipeline
+from stash_printed import SerialStore
+
+from conftest import ROOT
+
+SPEC = {"major_type": "LD Engine", "subtype": "EngV2", "count": 200, "start": 900001, "name": "engines"}
+
+def serials(spec=SPEC):
+
+    return [b.full_serial for b in job_barcodes(JobSpec.from_dict(spec))]
+
+@pytest.fixture
+def store(tmp_path):
+
+    store = SerialStore(str(tmp_path / "printed.db"))
+    yield store
+    store.close()
+
+def run(store, on_printed, chunk_size=2048):
+
+    sent = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        chunks = list(pipeline(JobSpec.from_dict(SPEC), sent.append, store, on_printed, chunk_size=chunk_size))
+
+    return sent, [b.full_serial for chunk in chunks for b in chunk]
+
+def test_stop_raises_before_anything_is_sent(store):
+
+    store.add_many(serials()[150:153])
+    sent = []
+
+    with pytest.raises(ValueError, match="3 serials already printed"):
+        pipeline(JobSpec.from_dict(SPEC), sent.append, store, "stop")
+    assert sent == []
+
+def test_skip_leaves_out_printed_labels(store):
+
+    store.add_many(serials()[:10] + serials()[100:103])
+
+    sent, labels = run(store, "skip")
+
+    assert sorted(labels) == sorted(set(serials()) - store.contains_many(serials()))
+    assert not any(s.encode() in b"".join(sent) for s in serials()[100:103])
+
+def test_print_sends_every_label(store):
+
+    store.add_many(serials()[:10])
+
+    sent, labels = run(store, "print")
+
+    assert sorted(labels) == serials()
+    assert all(s.encode() in b"".join(sent) for s in serials())
+
+def test_chunks_follow_the_sends(store):
+
+    # One chunk of barcodes for each send, the first strip on its own
+    sent, labels = run(None, "stop")
+    assert len(sent) > 2 and len(sent[0]) < len(sent[1])
+    assert sorted(labels) == serials()
+
+class FailingLp:
+
+    # send_lp that takes limit pieces of data and then fails
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.sent = []
+
+    def __call__(self, command, data):
+        if len(self.sent) >= self.limit:
+            raise OSError("lp: printer offline")
+        self.sent.append(data)
+
+def test_only_accepted_chunks_are_stashed(tmp_path, monkeypatch):
+
+    jobs = tmp_path / "jobs.json"
+    jobs.write_text(json.dumps([SPEC]))
+    db = tmp_path / "printed.db"
+    SerialStore(str(db)).close()
+
+    # The length command and the first strip go out, the rest of the job does not
+    lp = FailingLp(2)
+    monkeypatch.setattr(label_pipeline, "send_lp", lp)
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(sys, "argv", ["label_pipeline.py", str(jobs), "--db", str(db)])
+
+    with contextlib.redirect_stdout(io.StringIO()), pytest.raises(OSError):
+        label_pipeline.main()
+
+    stashed = SerialStore(str(db)).serials()
+    assert len(stashed) == 4
+    assert all(s.encode() in lp.sent[1] for s in stashed)
@@ -0,0 +1,104 @@
+import os
+import csv
+
+import pytest
+
+from order_queue import COLUMNS, Order, parse_range, find_major_type, load_orders, check_orders
+from stash_printed import SerialStore
+
+from conftest import ROOT
+
+FORM = os.path.join(ROOT, "utils", "HGCAL_Labeling_Request_Form.csv")
+
+def row(**fields):
+
+    # A form row with the given fields (by Order attribute name), the rest empty
+    values = {column: "" for column in COLUMNS.values()}
+    for field, value in fields.items():
+        values[COLUMNS[field]] = value
+
+    return values
+
+def test_ranges_are_end_exclusive():
+
+    assert parse_range("101-213", 112) == (101, 213)
+    assert parse_range(" 1 - 15 ", 14) == (1, 15)
+    assert parse_range("40", 5) == (40, 45)
+
+    with pytest.raises(ValueError, match="holds 113 labels but 112"):
+        parse_range("101-214", 112)
+    with pytest.raises(ValueError):
+        parse_range("one to ten", 10)
+
+def test_major_type_names_from_the_form():
+
+    assert find_major_type("LD Hexaboards (XL)") == "LD Hexaboard"
+    assert find_major_type("LD Engines") == "LD Engine"
+    assert find_major_type("HD Module") == "HD Module"
+    with pytest.raises(ValueError):
+        find_major_type("Flux capacitors (QQ)")
+
+def test_hexaboard_subtype_is_split_into_its_codes():
+
+    order = Order(2, row(major_type="LD Hexaboards (XL)", subtype="F44-MH", count="112", serials="101-213", location="CERN"))
+
+    assert order.ok()
+    spec = order.spec
+    assert (spec.shape, spec.generation, spec.roc, spec.vendor, spec.assembler) == ("Full", "4", "4", "Micropack", "Hybrid SA")
+    assert (spec.count, spec.start, spec.name) == (112, 101, "order002")
+
+def test_module_takes_its_mac_from_the_institution_and_notes():
+
+    order = Order(5, row(major_type="LD Modules (ML)", subtype="F3W", count="20", serials="1-21", location="UCSB", notes="roc=X"))
+
+    assert order.ok()
+    assert (order.spec.subtype, order.spec.mac, order.spec.roc) == ("Full, 300 um, CuW baseplate", "UCSB", "X")
+
+@pytest.mark.parametrize("fields, error", [(dict(major_type="LD Engines", subtype="EngV2", count="ten", serials="1-11"), "Bad label count"),
+                                           (dict(major_type="LD Engines", subtype="EngV2", count="10", serials="1-12"), "holds 11 labels"),
+                                           (dict(major_type="LD Engines", subtype="NoSuch", count="10", serials="1-11"), "Unknown sub_code"),
+                                           (dict(major_type="LD Hexaboards (XL)", subtype="F44", count="10", serials="1-11"), "Bad hexaboard subtype")])
+def test_bad_rows_are_reported(fields, error):
+
+    order = Order(3, row(**fields))
+
+    assert not order.ok() and order.spec is None
+    assert error in order.errors[0]
+
+def test_load_orders_skips_blank_rows(tmp_path):
+
+    path = tmp_path / "form.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(COLUMNS.values()))
+        writer.writeheader()
+        writer.writerow(row(major_type="LD Engines", subtype="EngV2", count="10", serials="1-11", order_date="3/1/2024 9:00:00", fulfillment_date="3/7/2024"))
+        writer.writerow(row())
+        writer.writerow(row(major_type="LD Engines", subtype="EngV1", count="4", serials="20"))
+
+    orders = load_orders(str(path))
+
+    assert [o.order_id for o in orders] == [2, 4]
+    assert orders[0].fulfillment_date.day == 7 and orders[0].order_date.hour == 9
+    assert orders[1].spec.start == 20 and orders[1].fulfillment_date is None
+
+def test_shipped_form_parses():
+
+    orders = load_orders(FORM)
+
+    assert orders and all(o.ok() for o in orders)
+    assert orders[0].spec.count == 112 and orders[0].spec.start == 101
+
+def test_orders_with_printed_or_shared_serials_are_held(tmp_path):
+
+    orders = [Order(2, row(major_type="LD Engines", subtype="EngV2", count="10", serials="900001-900011")),
+              Order(3, row(major_type="LD Engines", subtype="EngV2", count="5", serials="900010-900015")),
+              Order(4, row(major_type="LD Engines", subtype="EngV2", count="5", serials="900020-900025"))]
+    store = SerialStore(str(tmp_path / "printed.db"))
+    store.add_many(["320EL0100900002"])
+
+    check_orders(orders, store)
+
+    assert orders[0].errors == ["320EL0100900002 already printed", "320EL0100900010 also in order 3"]
+    assert orders[1].errors == ["320EL0100900010 also in order 2"]
+    assert orders[2].ok()
+    store.close()
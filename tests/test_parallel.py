@@ -0,0 +1,46 @@
+import io
+import contextlib
+
+import pytest
+
+import make_label_gui
+from make_label_gui import load_barcodes, stream_barcodes, use_pool, PARALLEL_MIN_LABELS
+from label_engine import JobSpec, label_info, strip_options
+
+SPEC = JobSpec("LD Hexaboard", count=60, start=1, shape="Full", generation="4", roc="4", vendor="HiQ", assembler="Hybrid SA")
+
+def test_pool_only_for_big_jobs_without_templates():
+
+    assert not use_pool(10 * PARALLEL_MIN_LABELS, 4, dict(templates=True))
+    assert not use_pool(PARALLEL_MIN_LABELS - 1, 4, dict(templates=False))
+    assert not use_pool(PARALLEL_MIN_LABELS, 1, dict(templates=False))
+    assert not use_pool(PARALLEL_MIN_LABELS, 4, dict(templates=False, debug=True))
+    assert use_pool(PARALLEL_MIN_LABELS, 4, dict(templates=False))
+
+@pytest.mark.parametrize("templates", [True, False])
+def test_pool_output_is_byte_identical(templates, monkeypatch):
+
+    # Pool on for this small job, three workers so the shards are uneven
+    info = label_info(SPEC)
+    options = dict(preview=False, templates=templates, **strip_options(SPEC, info))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        zpl, barcodes = load_barcodes(info, workers=1, **options)
+        monkeypatch.setattr(make_label_gui, "use_pool", lambda labels, workers, options: workers > 1)
+        zpl_n, barcodes_n = load_barcodes(info, workers=3, **options)
+
+    assert zpl_n.encode() == zpl.encode()
+    assert [b.full_serial for b in barcodes_n] == [b.full_serial for b in barcodes]
+
+def test_pool_streams_in_the_same_order(tmp_path, monkeypatch):
+
+    info = label_info(SPEC)
+    options = dict(preview=False, **strip_options(SPEC, info))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        job, barcodes = stream_barcodes(info, str(tmp_path / "one"), workers=1, **options)
+        monkeypatch.setattr(make_label_gui, "use_pool", lambda labels, workers, options: workers > 1)
+        job_n, barcodes_n = stream_barcodes(info, str(tmp_path / "three"), workers=3, **options)
+
+    assert job_n.read() == job.read()
+    assert [b.full_serial for b in barcodes_n] == [b.full_serial for b in barcodes]
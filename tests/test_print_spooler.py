@@ -0,0 +1,99 @@
+import shlex
+
+from print_spooler import PrintSpooler
+from job_stream import JobWriter
+
+class FakePrinter:
+
+    # Stands in for a RawPrinter, records what was sent to it and in what order
+
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def print_zpl(self, zpl, progress=None):
+
+        self.log.append((self.name, zpl))
+        if progress is not None:
+            progress(zpl.count(b"^XZ"), zpl.count(b"^XZ"))
+
+        return zpl.count(b"^XZ")
+
+class FakePool:
+
+    def __init__(self, n):
+        self.log = []
+        self.printers = [FakePrinter("P{}".format(i), self.log) for i in range(n)]
+        self.next_index = 0
+
+    def get(self):
+
+        printer = self.printers[self.next_index % len(self.printers)]
+        self.next_index += 1
+        return printer
+
+def write(path, text):
+
+    path.write_text(text)
+    return str(path)
+
+def test_jobs_print_in_submission_order(tmp_path):
+
+    # lp stand-in that appends each job to one file, so the file shows the send order
+    out = tmp_path / "printed.zpl"
+    spooler = PrintSpooler("sh -c {}".format(shlex.quote("cat >> " + shlex.quote(str(out)))))
+
+    module_setup = write(tmp_path / "setLabelLength_module.zpl", "^XA^LL100^XZ\n")
+    tile_setup = write(tmp_path / "setLabelLength_tile.zpl", "^XA^LL200^XZ\n")
+    modules = write(tmp_path / "modules.zpl", "^XA^FDmodule^XZ\n")
+    more = write(tmp_path / "more.zpl", "^XA^FDmore^XZ\n")
+    tiles = write(tmp_path / "tiles.zpl", "^XA^FDtile^XZ\n")
+
+    spooler.submit(modules, module_setup)
+    spooler.submit(more)
+    spooler.submit(tiles, tile_setup)
+    spooler.stop()
+
+    assert out.read_text() == "^XA^LL100^XZ\n^XA^FDmodule^XZ\n^XA^FDmore^XZ\n^XA^LL200^XZ\n^XA^FDtile^XZ\n"
+
+    events = spooler.poll()
+    assert [kind for kind, job, message in events if kind != "queued"] == ["started", "done"] * 3
+    assert [job.name for kind, job, message in events if kind == "done"] == [modules, more, tiles]
+
+def test_failed_job_does_not_stop_the_queue(tmp_path):
+
+    spooler = PrintSpooler("false")
+    first = spooler.submit_data(b"^XA^XZ", "first")
+    second = spooler.submit_data(b"^XA^XZ", "second")
+    spooler.stop()
+
+    assert [(kind, job) for kind, job, message in spooler.poll() if kind in ("done", "error")] == [("error", first), ("error", second)]
+
+def test_setup_goes_to_the_printer_of_its_job(tmp_path):
+
+    pool = FakePool(2)
+    spooler = PrintSpooler(printers=pool)
+
+    setup = write(tmp_path / "setLabelLength_module.zpl", "^XA^LL100^XZ")
+    first = spooler.submit_data(b"^XA^FDone^XZ", "one", setup)
+    second = spooler.submit_data(b"^XA^FDtwo^XZ", "two", setup)
+    spooler.stop()
+
+    assert pool.log == [("P0", b"^XA^LL100^XZ"), ("P0", b"^XA^FDone^XZ"), ("P1", b"^XA^LL100^XZ"), ("P1", b"^XA^FDtwo^XZ")]
+    assert first.printer.name == "P0" and second.printer.name == "P1"
+
+def test_stream_job_after_its_setup(tmp_path):
+
+    pool = FakePool(1)
+    writer = JobWriter(str(tmp_path / "job"), chunk_size=32)
+    for n in range(5):
+        writer.add_strip("^XA^FD{}^XZ".format(n))
+    stream = writer.close()
+
+    spooler = PrintSpooler(printers=pool)
+    spooler.submit_job(stream, write(tmp_path / "setLabelLength_tile.zpl", "^XA^LL200^XZ"))
+    spooler.stop()
+
+    assert pool.log[0] == ("P0", b"^XA^LL200^XZ")
+    assert b"".join(zpl for name, zpl in pool.log[1:]) == stream.read()
+    assert stream.finished()
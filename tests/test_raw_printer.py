@@ -0,0 +1,140 @@
+import pytest
+
+import raw_printer
+from raw_printer import RawPrinter, PrinterPool, PrinterError
+
+def hs_reply(formats=0, buffer_full=False, paper_out=False, head_up=False):
+
+    # ~HS answer with the fields HostStatus reads, everything else zero
+    first = "030,{},0,1245,{:03d},{},0,0,000,0,0,0".format(int(paper_out), formats, int(buffer_full))
+    second = "000,0,{},0,0,2,4,0,00000000,1,000".format(int(head_up))
+    third = "1234,0"
+
+    return b"".join(b"\x02" + s.encode() + b"\x03\r\n" for s in [first, second, third])
+
+class FakeSocket:
+
+    # A printer connection, fail_after makes send raise once that many bytes went out
+    # over it
+
+    def __init__(self, fail_after=None, replies=()):
+        self.fail_after = fail_after
+        self.replies = list(replies)
+        self.sent = b""
+        self.closed = False
+
+    def setsockopt(self, *args):
+        pass
+
+    def send(self, data):
+
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise BrokenPipeError("connection reset")
+        if self.fail_after is not None:
+            data = data[:self.fail_after - len(self.sent)]
+        self.sent += data
+
+        return len(data)
+
+    def recv(self, size):
+
+        if b"~HS" not in self.sent or not self.replies:
+            return b""
+
+        return self.replies.pop(0)
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def connections(monkeypatch):
+
+    # Sockets handed out by socket.create_connection, in order
+    sockets = []
+    opened = []
+
+    def create_connection(address, timeout=None):
+        sock = sockets.pop(0)
+        opened.append(sock)
+        return sock
+
+    monkeypatch.setattr(raw_printer.socket, "create_connection", create_connection)
+
+    return sockets, opened
+
+def test_stale_connection_is_resent_on_a_new_one(connections):
+
+    sockets, opened = connections
+    sockets += [FakeSocket(fail_after=12), FakeSocket()]
+
+    printer = RawPrinter("zebra")
+    printer.send(b"^XA^FDone^XZ")
+    printer.send(b"^XA^FDtwo^XZ")
+
+    assert opened[0].closed and opened[0].sent == b"^XA^FDone^XZ"
+    assert opened[1].sent == b"^XA^FDtwo^XZ"
+
+def test_partial_send_is_not_repeated(connections):
+
+    sockets, opened = connections
+    sockets += [FakeSocket(fail_after=10), FakeSocket()]
+
+    printer = RawPrinter("zebra")
+    printer.send(b"^XA^XZ")
+    with pytest.raises(OSError):
+        printer.send(b"^XA^FDtwo^XZ")
+
+    assert opened[0].sent == b"^XA^XZ^XA^"
+    assert len(opened) == 1 and printer.sock is None
+
+def test_new_connection_failing_is_not_retried(connections):
+
+    sockets, opened = connections
+    sockets += [FakeSocket(fail_after=0), FakeSocket()]
+
+    with pytest.raises(OSError):
+        RawPrinter("zebra").send(b"^XA^XZ")
+
+    assert len(opened) == 1
+
+def test_host_status_asked_again_after_a_stale_connection(connections):
+
+    sockets, opened = connections
+    sockets += [FakeSocket(fail_after=6), FakeSocket(replies=[hs_reply(formats=2)])]
+
+    printer = RawPrinter("zebra")
+    printer.send(b"^XA^XZ")
+    status = printer.host_status()
+
+    assert status.formats_in_buffer == 2 and status.errors() == []
+    assert opened[1].sent == b"~HS"
+
+def test_print_zpl_waits_for_buffer_room(connections, monkeypatch):
+
+    sockets, opened = connections
+    sock = FakeSocket(replies=[hs_reply(formats=4), hs_reply(formats=1), hs_reply(buffer_full=True), hs_reply()])
+    sockets.append(sock)
+    monkeypatch.setattr(raw_printer.time, "sleep", lambda seconds: None)
+
+    progress = []
+    n = RawPrinter("zebra", max_formats=4).print_zpl("^XA^FD1^XZ^XA^FD2^XZ", lambda i, total: progress.append((i, total)))
+
+    assert n == 2 and progress == [(1, 2), (2, 2)]
+    assert sock.sent == b"~HS~HS^XA^FD1^XZ~HS~HS^XA^FD2^XZ"
+
+def test_printer_errors_stop_the_job(connections):
+
+    sockets, opened = connections
+    sockets.append(FakeSocket(replies=[hs_reply(paper_out=True, head_up=True)]))
+
+    with pytest.raises(PrinterError, match="paper out, head open"):
+        RawPrinter("zebra").print_zpl(b"^XA^XZ")
+
+def test_pool_hands_out_printers_round_robin():
+
+    pool = PrinterPool(["a", "b:9101"])
+
+    assert [pool.get().address for n in range(3)] == ["a:9100", "b:9101", "a:9100"]
+    assert pool.get("b:9101") is pool.printers[1]
+    with pytest.raises(KeyError):
+        pool.get("c")
@@ -0,0 +1,123 @@
+import os
+import json
+import sqlite3
+
+import pytest
+
+import stash_printed
+from stash_printed import SerialStore, Clash, open_store, import_legacy, check_printed, QUERY_CHUNK
+
+from conftest import ROOT
+
+SHIPPED = os.path.join(ROOT, "static", "printed_barcodes.json")
+
+def serials(n, prefix="320XLF4F4QH"):
+
+    return ["{}{:05d}".format(prefix, i) for i in range(n)]
+
+@pytest.fixture
+def store(tmp_path):
+
+    store = SerialStore(str(tmp_path / "printed.db"))
+    yield store
+    store.close()
+
+def write_cache(path, values):
+
+    with open(path, "w") as f:
+        json.dump({s: s for s in values}, f)
+
+def test_new_store_imports_the_legacy_cache_and_backup(tmp_path):
+
+    cache = tmp_path / "printed_barcodes.json"
+    write_cache(cache, serials(5))
+    write_cache(str(cache) + ".backup", serials(8))
+
+    store = open_store(str(tmp_path / "printed.db"), str(cache))
+    assert store.serials() == serials(8)
+    store.close()
+
+    # An existing store is not imported into again
+    write_cache(cache, serials(12))
+    store = open_store(str(tmp_path / "printed.db"), str(cache))
+    assert len(store) == 8
+    assert import_legacy(store, str(cache)) == 4 and len(store) == 12
+    store.close()
+
+def test_shipped_cache_imports_every_serial(store):
+
+    with open(SHIPPED) as f:
+        shipped = json.load(f)
+
+    assert store.import_json(SHIPPED) == len(shipped)
+    assert store.contains_many(shipped) == set(shipped)
+
+def test_add_many_counts_only_new_serials(store):
+
+    assert store.add_many(serials(10)) == 10
+    assert store.add_many(serials(15)) == 5
+    assert store.add_many(serials(3) + serials(3)) == 0
+    assert store.add_many(["320ABC", "320ABC"]) == 1
+    assert len(store) == 16
+
+@pytest.mark.parametrize("n", [QUERY_CHUNK - 1, QUERY_CHUNK, QUERY_CHUNK + 1, 2 * QUERY_CHUNK + 7])
+def test_contains_many_across_chunks(store, n):
+
+    # Every other serial printed, asked for as a list and as a generator
+    values = serials(n)
+    store.add_many(values[::2])
+
+    assert store.contains_many(values) == set(values[::2])
+    assert store.contains_many(s for s in values) == set(values[::2])
+    assert store.contains_many([]) == set()
+
+def test_export_round_trip(store, tmp_path):
+
+    store.add_many(serials(20))
+    store.export_json(str(tmp_path / "export.json"))
+
+    with open(tmp_path / "export.json") as f:
+        exported = json.load(f)
+    assert exported == {s: s for s in serials(20)}
+
+    again = SerialStore(str(tmp_path / "again.db"))
+    assert again.import_json(str(tmp_path / "export.json")) == 20
+    assert again.serials() == store.serials()
+    again.close()
+
+def test_check_printed_finds_printed_and_shared_serials(store):
+
+    store.add_many(serials(3))
+    jobs = [("a", serials(5)), ("b", serials(10)[4:]), ("c", serials(20)[12:])]
+
+    clashes = check_printed(jobs, store)
+
+    assert clashes["a"] == [Clash(s, True, []) for s in serials(3)] + [Clash(serials(5)[4], False, ["b"])]
+    assert clashes["b"] == [Clash(serials(5)[4], False, ["a"])]
+    assert "c" not in clashes
+
+def test_check_printed_single_job_streams(store):
+
+    store.add_many(serials(30)[20:23])
+
+    assert check_printed([("a", (s for s in serials(30)))], store) == {"a": [Clash(s, True, []) for s in serials(30)[20:23]]}
+    assert check_printed([("a", serials(10))], store) == {}
+
+def test_backup_holds_every_serial(store):
+
+    store.add_many(serials(30))
+    store.backup()
+
+    cnx = sqlite3.connect(store.db_path + ".backup")
+    assert cnx.execute("SELECT COUNT(*) FROM printed").fetchone()[0] == 30
+    cnx.close()
+
+def test_stasher_uses_the_store(tmp_path):
+
+    cache = tmp_path / "printed_barcodes.json"
+    write_cache(cache, serials(3))
+
+    stasher = stash_printed.Stasher([], cache_path=str(cache), db_path=str(tmp_path / "printed.db"))
+    stasher.stash(serials(5))
+
+    assert stasher.load() == set(serials(5))
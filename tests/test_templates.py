@@ -0,0 +1,44 @@
+import io
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import make_label_gui
+from benchmarks import golden_jobs, job_strips
+from label_engine import label_info, strip_options
+
+# Compiled layouts have to give byte for byte the ZPL of the zpl.Label method calls,
+# for one job of every label family, with and without borders
+
+@pytest.mark.parametrize("borders", [False, True])
+@pytest.mark.parametrize("spec", golden_jobs(), ids=lambda spec: spec.major_type)
+def test_templates_match_label_calls(spec, borders):
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        plain = job_strips(spec, False, borders)()
+        compiled = job_strips(spec, True, borders)()
+
+    assert plain
+    assert compiled == plain
+
+def test_every_family_compiles_alongside_other_threads():
+
+    # Compiling leaves the layout module alone, so strips can be made on several threads
+    # at once, and no family falls back to zpl.Label calls
+    def strips(spec):
+        info = label_info(spec.validate())
+        per_strip, make_barcode, make_strip = make_label_gui.strip_maker(**strip_options(spec, info))
+        barcodes = [make_barcode(x) for x in info]
+        zpl = [make_strip(barcodes[i:i+per_strip], False)[1] for i in range(0, len(barcodes), per_strip)]
+        return zpl, make_strip.fallbacks
+
+    jobs = golden_jobs() * 4
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(strips, jobs))
+        plain = [job_strips(spec, False)() for spec in golden_jobs()]
+
+    assert "int" not in vars(make_label_gui)
+    assert all(fallbacks == 0 for zpl, fallbacks in results)
+    assert [zpl for zpl, fallbacks in results] == plain * 4
@@ -0,0 +1,52 @@
+import io
+import os
+import contextlib
+
+from PIL import Image
+
+import zpl_render
+import datamatrix
+from zpl_render import ZPLRenderer, render_zpl
+from label_engine import JobSpec
+from strip_export import spec_strips
+
+from conftest import ROOT
+
+GOLDEN = os.path.join(ROOT, "tests", "data", "hexaboard_strip.png")
+
+def hexaboard_strip():
+
+    spec = JobSpec("LD Hexaboard", count=14, start=1, shape="Full", generation="4", roc="4", vendor="HiQ", assembler="Hybrid SA")
+    with contextlib.redirect_stdout(io.StringIO()):
+        size, strips = spec_strips(spec)
+        return size, next(strips)
+
+def clear_caches():
+
+    for cached in [zpl_render.box_mask, zpl_render.graphic_mask, zpl_render.text_mask, zpl_render.glyph_mask, datamatrix.symbol_image]:
+        cached.cache_clear()
+
+def test_hexaboard_strip_matches_golden():
+
+    # Rendered with cold and with warm mask caches, both have to give the golden pixels
+    (height, width), zpl = hexaboard_strip()
+    with Image.open(GOLDEN) as golden:
+        expected = golden.convert("1")
+
+    clear_caches()
+    cold = render_zpl(zpl, width, height)
+    warm = render_zpl(zpl, width, height)
+
+    assert cold.size == expected.size
+    assert cold.convert("1").tobytes() == expected.tobytes()
+    assert warm.tobytes() == cold.tobytes()
+
+def test_renderer_reuse_gives_the_same_image():
+
+    (height, width), zpl = hexaboard_strip()
+    renderer = ZPLRenderer(width, height)
+
+    first = renderer.render(zpl).tobytes()
+    renderer.render("^XA^FO10,10^GB100,100,100^FS^XZ")
+
+    assert renderer.render(zpl).tobytes() == first
@@ -2,10 +2,16 @@ from argparse import ArgumentParser
 import json
 import sys
 
+sys.path.append("..")
 sys.path.append("../static")
 
-from MajorTypes import majortypes
-from connect import connect
+from catalogue import load_tables
+from decoder import decode
+from connect import connect, connect_sqlite
+from stash_printed import open_store
+
+# The checked tables of static/catalogue.json, in the layout of MajorTypes.majortypes
+majortypes = load_tables()["majortypes"]
 
 def load_labels(inpath):
 
@@ -16,6 +22,11 @@ def load_labels(inpath):
 
     return label_dict
 
+def load_printed(db_path="../static/printed_barcodes.db", cache_path="../static/printed_barcodes.json"):
+
+    # Every serial in the printed barcode store, as {serial: serial} like the JSON file
+    return {s: s for s in open_store(db_path, cache_path).serials()}
+
 def update_metatables(cnx, majortypes):
    
     print("\nChecking for new major types and subtypes:\n")
@@ -101,7 +112,7 @@ def update_metatables(cnx, majortypes):
             digits = len(sub_code)
 
             sql = "SELECT sub_type_id FROM Sub_Type WHERE sub_sn = %s and sub_code = %s"
-            val = (sub_sn, sub_code)
+            val = (sql_int(sub_sn), sub_code)
 
             cur.execute(sql, val)
         
@@ -126,7 +137,7 @@ def update_metatables(cnx, majortypes):
             maj_id = cur.fetchall()[0][0]
 
             sql = 'SELECT sub_type_id FROM Sub_Type WHERE sub_code = %s and sub_sn = %s'
-            val = (sub_code, sub_sn)
+            val = (sub_code, sql_int(sub_sn))
 
             cur.execute(sql, val)
             sub_ids = cur.fetchall()
@@ -151,6 +162,37 @@ def update_metatables(cnx, majortypes):
                     cur.execute(sql, val)
                     cnx.commit()
 
+def sql_int(value):
+
+    # Integer value the way MySQL casts a string compared with or stored in an int column
+    # (leading digits only, 0 if none). Serial fields are passed through this so the
+    # SQLite stand-in matches the same rows MySQL does
+    digits = ""
+    for c in str(value).strip():
+        if not c.isdigit():
+            break
+        digits += c
+
+    return int(digits) if digits else 0
+
+def match_decoded(decoded, cur):
+
+    # (major_type_id, major_sn, sub_type_id, sub_sn) of the decoder's major and sub
+    # codes, lowest sub_type_id first like the probes, or None without stitched rows
+    if not decoded.valid or decoded.layout != "current" or decoded.sub_code is None:
+        return None
+
+    sql = ("SELECT Major_Type.major_type_id, Major_Type.major_sn, Sub_Type.sub_type_id, Sub_Type.sub_sn FROM Major_Type "
+           "JOIN Major_Sub_Stitch ON Major_Sub_Stitch.major_type_id = Major_Type.major_type_id "
+           "JOIN Sub_Type ON Sub_Type.sub_type_id = Major_Sub_Stitch.sub_type_id "
+           "WHERE Major_Type.major_code = %s AND Sub_Type.sub_code = %s ORDER BY Sub_Type.sub_type_id, Major_Type.major_type_id")
+    val = (decoded.major_code, decoded.sub_code)
+
+    cur.execute(sql, val)
+    rows = cur.fetchall()
+
+    return tuple(rows[0]) if rows else None
+
 def upload_label(label, cnx, f):
 
     def match_major(maj, cur):
@@ -164,7 +206,7 @@ def upload_label(label, cnx, f):
             return major_type_id[0], major_type_id[1], major_type_id[2]
         except:
             sql = "SELECT major_type_id, major_sn, major_code FROM Major_Type WHERE major_sn = %s"
-            val = (maj,)
+            val = (sql_int(maj),)
             
             cur.execute(sql, val)
             try:
@@ -176,7 +218,7 @@ def upload_label(label, cnx, f):
     def check_sub(sub, maj_id, cur):
 
         sql = "SELECT sub_type_id, sub_sn, sub_code FROM Sub_Type WHERE sub_code = %s OR sub_sn = %s"
-        val = (sub, sub)
+        val = (sub, sql_int(sub))
     
         cur.execute(sql, val)
         try:
@@ -209,99 +251,280 @@ def upload_label(label, cnx, f):
         prefix = label[:4]
         offset = 1
 
-    prefix = label[:3+offset]
-    major = label[3+offset:5+offset]
-
-    major_type_id, major_sn, major_code = match_major(major, cur)
-
-    temp_two_sub = label[5+offset:7+offset]
-    temp_three_sub = label[5+offset:8+offset]
-    temp_four_sub = label[5+offset:9+offset]
-
-    is_two_sub, two_sub_type_id, two_sub_sn, two_sub_code = check_sub(temp_two_sub, major_type_id, cur)
-    is_three_sub, three_sub_type_id, three_sub_sn, three_sub_code = check_sub(temp_three_sub, major_type_id, cur)
-    is_four_sub, four_sub_type_id, four_sub_sn, four_sub_code = check_sub(temp_four_sub, major_type_id, cur)
-
-    if is_three_sub:
-        sub = temp_three_sub
-        sub_type_id = three_sub_type_id
-        sub_sn = three_sub_sn
-        sub_code = three_sub_code
-        sn = label[8+offset:]
-    elif is_four_sub:
-        sub = temp_four_sub
-        sub_type_id = four_sub_type_id
-        sub_sn = four_sub_sn
-        sub_code = four_sub_code
-        sn = label[9+offset:]
-    elif is_two_sub:
-        sub = temp_two_sub
-        sub_type_id = two_sub_type_id
-        sub_sn = two_sub_sn
-        sub_code = two_sub_code
-        sn = label[7+offset:]
+    # The decoder splits the serial, one query finds its stitched type rows. Only
+    # serials whose split has no rows in the meta tables go through the old probes
+    decoded = decode(label)
+    found = match_decoded(decoded, cur)
+
+    if found is not None:
+        major_type_id, major_sn, sub_type_id, sub_sn = found
+        major = label[3:5]
+        sub = label[5:decoded.sub_end]
+        sn = label[decoded.sub_end:]
     else:
-        sn = label[9+offset:]
-        sub = temp_four_sub
-        sub_sn = four_sub_sn
-        sub_code = four_sub_code
-        sub_type_id = four_sub_type_id
+        prefix = label[:3+offset]
+        major = label[3+offset:5+offset]
+
+        major_type_id, major_sn, major_code = match_major(major, cur)
+
+        temp_two_sub = label[5+offset:7+offset]
+        temp_three_sub = label[5+offset:8+offset]
+        temp_four_sub = label[5+offset:9+offset]
+
+        is_two_sub, two_sub_type_id, two_sub_sn, two_sub_code = check_sub(temp_two_sub, major_type_id, cur)
+        is_three_sub, three_sub_type_id, three_sub_sn, three_sub_code = check_sub(temp_three_sub, major_type_id, cur)
+        is_four_sub, four_sub_type_id, four_sub_sn, four_sub_code = check_sub(temp_four_sub, major_type_id, cur)
+
+        if is_three_sub:
+            sub = temp_three_sub
+            sub_type_id = three_sub_type_id
+            sub_sn = three_sub_sn
+            sub_code = three_sub_code
+            sn = label[8+offset:]
+        elif is_four_sub:
+            sub = temp_four_sub
+            sub_type_id = four_sub_type_id
+            sub_sn = four_sub_sn
+            sub_code = four_sub_code
+            sn = label[9+offset:]
+        elif is_two_sub:
+            sub = temp_two_sub
+            sub_type_id = two_sub_type_id
+            sub_sn = two_sub_sn
+            sub_code = two_sub_code
+            sn = label[7+offset:]
+        else:
+            sn = label[9+offset:]
+            sub = temp_four_sub
+            sub_sn = four_sub_sn
+            sub_code = four_sub_code
+            sub_type_id = four_sub_type_id
+
+        if major_type_id < 0 or sub_type_id < 0:
+            print("Cannot find major type {} or sub type {} for sn={}".format(major, sub, label))
+            print("Will continue as orphan label upload")
+
+            f.write(label + "\n")
+
+            major = "XX"
+            sub = "XXXX"
+
+            major_sn = 99
+            sub_sn = 9999
+
+
+        elif not is_two_sub and not is_three_sub and not is_four_sub:
+            print("No mathcing subtype for {} or {} or {}".format(temp_two_sub, temp_three_sub, temp_four_sub))
+
+            f.write(label + "\n")
+
+            major = "XX"
+            sub = "XXXX"
+  
+            major_sn = 99
+            sub_sn = 9999
+
+        if major == "XX":
+            major_type_id = 1
+            sub_type_id = 1
 
-    if major_type_id < 0 or sub_type_id < 0:
-        print("Cannot find major type {} or sub type {} for sn={}".format(major, sub, label))
-        print("Will continue as orphan label upload")
+    type_sn = major_sn * 10000 + sub_sn
+    type_code = major + sub
 
-        f.write(label + "\n")
+    query = "INSERT INTO Label (full_label, type_sn, type_code, sn, major_type_id, sub_type_id, creation_date) VALUES (%s, %s, %s, %s, %s, %s, NOW())"
+    args = (label, str(type_sn), type_code, sn, str(major_type_id), str(sub_type_id))
 
-        major = "XX"
-        sub = "XXXX"
+    try:
+        cur.execute(query, args)
+        cnx.commit()
+    except:
+        print("Issue uploading label with sn={}, please check for duplicates.".format(label))
 
-        major_sn = 99
-        sub_sn = 9999
+# Bulk, set-based upload path. The three meta tables are read once and every
+# label is resolved in memory with the same rules as upload_label, then inserted
+# with executemany in a single transaction.
 
+def load_metatables(cnx):
 
-    elif not is_two_sub and not is_three_sub and not is_four_sub:
-        print("No mathcing subtype for {} or {} or {}".format(temp_two_sub, temp_three_sub, temp_four_sub))
+    cur = cnx.cursor()
 
-        f.write(label + "\n")
+    meta = {"major_code": {}, "major_sn": {}, "sub_code": {}, "sub_sn": {}, "stitch": set(), "decoded": {}}
+
+    # In id order, the order the per-label queries return rows in
+    cur.execute("SELECT major_type_id, major_sn, major_code FROM Major_Type ORDER BY major_type_id")
+    majors = cur.fetchall()
+    for row in majors:
+        meta["major_code"].setdefault(row[2], row)
+        meta["major_sn"].setdefault(sql_int(row[1]), row)
+
+    cur.execute("SELECT sub_type_id, sub_sn, sub_code FROM Sub_Type ORDER BY sub_type_id")
+    subs = cur.fetchall()
+    for row in subs:
+        meta["sub_code"].setdefault(row[2], []).append(row)
+        meta["sub_sn"].setdefault(sql_int(row[1]), []).append(row)
+
+    cur.execute("SELECT major_type_id, sub_type_id FROM Major_Sub_Stitch")
+    meta["stitch"] = set((row[0], row[1]) for row in cur.fetchall())
+
+    # (major_code, sub_code) -> what match_decoded returns, for the decoder's splits
+    majors = {row[0]: row for row in majors}
+    subs = {row[0]: row for row in subs}
+    for maj_id, sub_id in sorted(meta["stitch"], key=lambda pair: (pair[1], pair[0])):
+        if maj_id in majors and sub_id in subs:
+            key = (majors[maj_id][2], subs[sub_id][2])
+            meta["decoded"].setdefault(key, (maj_id, majors[maj_id][1], sub_id, subs[sub_id][1]))
+
+    return meta
+
+def resolve_label(label, meta):
+
+    # Mirrors upload_label: the decoder's split when the meta tables have it, else 3, 4
+    # then 2 character subtypes, so both paths write the same rows. Returns (insert
+    # args, is_orphan) or None for skipped labels
+
+    def match_major(maj):
+        row = meta["major_code"].get(maj)
+        if row is None:
+            row = meta["major_sn"].get(sql_int(maj))
+        if row is None:
+            return -1, -1, -1
+        return row[0], row[1], row[2]
+
+    def check_sub(sub, maj_id):
+        # sub_code = sub OR sub_sn = sub, in id order
+        rows = set(meta["sub_code"].get(sub, [])) | set(meta["sub_sn"].get(sql_int(sub), []))
+        if not rows:
+            return False, -1, -1, -1
+        for row in sorted(rows):
+            if (maj_id, row[0]) in meta["stitch"]:
+                return True, row[0], row[1], row[2]
+        return False, -2, -2, -2
 
+    if "3205" == label[:4]:
+        return None
+
+    decoded = decode(label)
+    found = None
+    if decoded.valid and decoded.layout == "current":
+        found = meta["decoded"].get((decoded.major_code, decoded.sub_code))
+
+    if found is not None:
+        major_type_id, major_sn, sub_type_id, sub_sn = found
+        type_sn = sql_int(major_sn) * 10000 + sql_int(sub_sn)
+        type_code = label[3:decoded.sub_end]
+        return (label, str(type_sn), type_code, label[decoded.sub_end:], str(major_type_id), str(sub_type_id)), False
+
+    major = label[3:5]
+    major_type_id, major_sn, major_code = match_major(major)
+
+    for length in [3, 4, 2]:
+        is_sub, sub_type_id, sub_sn, sub_code = check_sub(label[5:5+length], major_type_id)
+        if is_sub:
+            break
+    else:
+        length = 4
+
+    orphan = major_type_id < 0 or not is_sub
+
+    if orphan:
         major = "XX"
         sub = "XXXX"
-  
         major_sn = 99
         sub_sn = 9999
-
-    if major == "XX":
         major_type_id = 1
         sub_type_id = 1
- 
-    pass_stitch = check_stitch(major_type_id, sub_type_id)
+        sn = label[9:]
+    else:
+        sub = label[5:5+length]
+        sn = label[5+length:]
 
-    type_sn = major_sn * 10000 + sub_sn
+    type_sn = sql_int(major_sn) * 10000 + sql_int(sub_sn)
     type_code = major + sub
 
+    return (label, str(type_sn), type_code, sn, str(major_type_id), str(sub_type_id)), orphan
+
+def existing_labels(cnx, labels, chunk_size=500):
+
+    cur = cnx.cursor()
+    found = set()
+
+    for i in range(0, len(labels), chunk_size):
+        chunk = labels[i:i+chunk_size]
+        sql = "SELECT full_label FROM Label WHERE full_label IN ({})".format(", ".join(["%s"] * len(chunk)))
+        cur.execute(sql, tuple(chunk))
+        found.update(row[0] for row in cur.fetchall())
+
+    return found
+
+def upload_labels_bulk(labels, cnx, f, chunk_size=1000):
+
+    meta = load_metatables(cnx)
+
+    rows = []
+    for label in labels:
+        resolved = resolve_label(label, meta)
+        if resolved is None:
+            continue
+        args, orphan = resolved
+        if orphan:
+            # What the serial decodes to offline, for fixing the meta tables
+            decoded = decode(label)
+            found = " (decodes as {} / {})".format(decoded.major_name, decoded.sub_name) if decoded.valid else ""
+            print("Cannot resolve major/sub type for sn={}{}, will continue as orphan label upload".format(label, found))
+            f.write(label + "\n")
+        rows.append(args)
+
+    # Report duplicates per row instead of letting one failure abort a whole executemany chunk
+    present = existing_labels(cnx, [r[0] for r in rows])
+    seen = set()
+    to_insert = []
+    duplicates = []
+
+    for args in rows:
+        if args[0] in present or args[0] in seen:
+            duplicates.append(args[0])
+            continue
+        seen.add(args[0])
+        to_insert.append(args)
+
+    for label in duplicates:
+        print("Issue uploading label with sn={}, already in database.".format(label))
+
     query = "INSERT INTO Label (full_label, type_sn, type_code, sn, major_type_id, sub_type_id, creation_date) VALUES (%s, %s, %s, %s, %s, %s, NOW())"
-    args = (label, str(type_sn), type_code, sn, str(major_type_id), str(sub_type_id))
 
+    cur = cnx.cursor()
     try:
-        cur.execute(query, args)
+        for i in range(0, len(to_insert), chunk_size):
+            cur.executemany(query, to_insert[i:i+chunk_size])
         cnx.commit()
-    except:
-        print("Issue uploading label with sn={}, please check for duplicates.".format(label))
+    except Exception as e:
+        cnx.rollback()
+        print("Bulk upload failed, no labels were inserted: {}".format(e))
+        return 0, duplicates
+
+    print("Inserted {} labels, {} duplicates skipped".format(len(to_insert), len(duplicates)))
+
+    return len(to_insert), duplicates
 
 if __name__ == "__main__":
 
     parser = ArgumentParser()
 
-    parser.add_argument("--input", type=str, default="../static/printed_barcodes.json", help="Name of input file with printed barcodes")
+    parser.add_argument("--db", type=str, default="../static/printed_barcodes.db", help="Printed barcode store to upload from (default: ../static/printed_barcodes.db)")
+    parser.add_argument("--input", type=str, default=None, help="Upload from this printed_barcodes.json style file instead of the store")
     parser.add_argument("--updateMeta", action="store_true", default=False, help="Update major type and subtype tables (default=False)")
     parser.add_argument("--loadLabels", action="store_true", default=False, help="Load labels into DB for JSON file")
+    parser.add_argument("--bulk", action="store_true", default=False, help="Resolve labels in memory and insert them in one transaction (use with --loadLabels)")
+    parser.add_argument("--sqlite", type=str, default=None, help="Use a local SQLite stand-in database at this path instead of MySQL")
 
     args = parser.parse_args()
 
-    label_dict = load_labels(args.input)
+    label_dict = load_labels(args.input) if args.input else load_printed(args.db)
 
-    cnx = connect(1)
+    if args.sqlite:
+        cnx = connect_sqlite(args.sqlite, schema_path="../sql/labeling_schema_sqlite.sql")
+    else:
+        cnx = connect(1)
 
     if args.updateMeta:
         update_metatables(cnx, majortypes)
@@ -310,8 +533,11 @@ if __name__ == "__main__":
 
         with open("./Orphan_Labels.txt", "w") as f:
 
-            for l in label_dict.keys():
+            if args.bulk:
+                upload_labels_bulk(list(label_dict.keys()), cnx, f)
+            else:
+                for l in label_dict.keys():
                 
-                upload_label(l, cnx, f)
+                    upload_label(l, cnx, f)
 
         f.close()
@@ -1,7 +1,9 @@
-import mysql.connector
+import sqlite3
 
 def connect(con_type):
 
+    import mysql.connector
+
     # con_type is a number specifying reader or inserter
     # These users have different permissions so user the right one
 
@@ -17,3 +19,32 @@ def connect(con_type):
     )
 
     return cnx
+
+# Local SQLite stand-in for the MySQL database, used for testing uploads offline.
+# Queries are written for mysql.connector (%s placeholders, NOW()) so translate them.
+
+def translate_sql(sql):
+    return sql.replace("%s", "?").replace("NOW()", "CURRENT_TIMESTAMP")
+
+class StandInCursor(sqlite3.Cursor):
+
+    def execute(self, sql, params=()):
+        return super().execute(translate_sql(sql), params)
+
+    def executemany(self, sql, seq_of_params):
+        return super().executemany(translate_sql(sql), seq_of_params)
+
+class StandInConnection(sqlite3.Connection):
+
+    def cursor(self, factory=StandInCursor):
+        return super().cursor(factory)
+
+def connect_sqlite(db_path, schema_path=None):
+
+    cnx = sqlite3.connect(db_path, factory=StandInConnection)
+
+    if schema_path is not None:
+        with open(schema_path, "r") as f:
+            cnx.executescript(f.read())
+
+    return cnx
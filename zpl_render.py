@@ -0,0 +1,344 @@
+#!/usr/bin/python3
+
+# Offline rasterizer for the ZPL subset produced by make_label_gui / print_pictures
+# (^FO, ^A0, ^FB, ^FD, ^GB, ^BX, ^GFA (hex, ACS, :Z64:), ~DG/^XG, ^DF/^XF/^FN, ^LR, ^FR). Replaces the labelary round-trip
+# for previews so they work without a network connection.
+
+import re
+import argparse
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont, ImageChops
+
+import datamatrix
+from graphic_compression import decode_graphic
+
+FONT_CANDIDATES = [
+    "DejaVuSansCondensed-Bold.ttf",
+    "LiberationSansNarrow-Bold.ttf",
+    "Arial Narrow Bold.ttf",
+    "arialbd.ttf",
+    "DejaVuSans-Bold.ttf",
+]
+
+# Font 0 on the Zebra is a bold condensed face, squeeze the fallback fonts to match
+FONT_CONDENSE = 0.8
+
+# Rendered text fields, boxes and graphics kept for reuse
+MASK_CACHE = 4096
+
+COMMAND_RE = re.compile(r"([\^~])([A-Z@0-9]{2})([^\^~]*)")
+
+@lru_cache(maxsize=64)
+def get_font(size):
+
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+
+    return ImageFont.load_default(size=size)
+
+# ~DG downloads live outside ^XA...^XZ, the labels recall them with ^XG
+STORED_GRAPHIC_RE = re.compile(r"~DG(?:[A-Z]:)?([^.,]+)(?:\.GRF)?,(\d+),(\d+),([^\^~\s]+)")
+
+def stored_graphics(zpl):
+
+    return {name: "A,{0},{0},{1},{2}".format(total, row_bytes, data) for name, total, row_bytes, data in STORED_GRAPHIC_RE.findall(zpl)}
+
+# Stored formats (^DF) and the labels that recall them (^XF) with ^FN field data
+STORED_FORMAT_RE = re.compile(r"\^XA\^DF(?:[A-Z]:)?([^.^]+)(?:\.ZPL)?\^FS(.*?)\^XZ", re.S)
+RECALL_RE = re.compile(r"\^XA\^XF(?:[A-Z]:)?([^.^]+)(?:\.ZPL)?\^FS(.*?)\^XZ", re.S)
+FIELD_DATA_RE = re.compile(r"\^FN(\d+)\^FD([^\^]*)\^FS")
+FIELD_NUMBER_RE = re.compile(r"\^FN(\d+)")
+
+def expand_formats(zpl, formats=None):
+
+    # Replace each ^XF recall with its stored format, field data put back in place of ^FN
+    formats = dict(formats or {})
+    formats.update(STORED_FORMAT_RE.findall(zpl))
+
+    def recall(match):
+        body = formats.get(match.group(1))
+        if body is None:
+            raise ValueError("Format {} is recalled but not downloaded in this ZPL".format(match.group(1)))
+        data = dict(FIELD_DATA_RE.findall(match.group(2)))
+        return "^XA" + FIELD_NUMBER_RE.sub(lambda f: "^FD" + data.get(f.group(1), ""), body) + "^XZ"
+
+    return RECALL_RE.sub(recall, STORED_FORMAT_RE.sub("", zpl))
+
+def split_labels(zpl):
+
+    return re.findall(r"\^XA(.*?)\^XZ", zpl, re.S)
+
+def parse_params(params, n):
+
+    vals = params.split(",")
+    return vals + [""] * (n - len(vals))
+
+def to_int(value, default=0):
+
+    try:
+        return int(float(value))
+    except ValueError:
+        return default
+
+class Field:
+
+    def __init__(self, x=0, y=0, reverse=False):
+        self.x = x
+        self.y = y
+        self.reverse = reverse
+        self.font = None
+        self.block = None
+        self.barcode = None
+        self.box = None
+        self.graphic = None
+        self.data = None
+
+class ZPLRenderer:
+
+    def __init__(self, width, height, dpmm=8.0):
+
+        # width and height in millimeters, as for zpl.Label
+        self.dpmm = dpmm
+        self.size = (int(round(width * dpmm)), int(round(height * dpmm)))
+
+    def render(self, zpl, index=0):
+
+        labels = split_labels(expand_formats(zpl))
+        if index >= len(labels):
+            raise ValueError("No label at index {} in ZPL document".format(index))
+
+        self.stored = stored_graphics(zpl)
+        self.canvas = Image.new("L", self.size, 255)
+        self.reverse_all = False
+        self.home = (0, 0)
+        self.default_font = ("N", 9, 5)
+
+        field = None
+        for prefix, cmd, params in COMMAND_RE.findall(labels[index]):
+            if cmd == "FO" or cmd == "FT":
+                x, y = parse_params(params, 2)[:2]
+                field = Field(to_int(x) + self.home[0], to_int(y) + self.home[1], self.reverse_all)
+                continue
+
+            if field is None:
+                if cmd == "LR":
+                    self.reverse_all = params.startswith("Y")
+                elif cmd == "LH":
+                    x, y = parse_params(params, 2)[:2]
+                    self.home = (to_int(x), to_int(y))
+                elif cmd == "CF":
+                    _, h, w = parse_params(params, 3)
+                    self.default_font = ("N", to_int(h, 9), to_int(w, to_int(h, 9)))
+                continue
+
+            if cmd[0] == "A":
+                o, h, w = parse_params(params, 3)[:3]
+                h = to_int(h, self.default_font[1])
+                field.font = (o or "N", h, to_int(w, h))
+            elif cmd == "FB":
+                w, lines, spacing, just = parse_params(params, 4)[:4]
+                field.block = (to_int(w), max(to_int(lines, 1), 1), to_int(spacing), just or "L")
+            elif cmd == "FR":
+                field.reverse = True
+            elif cmd == "BX":
+                o, h = parse_params(params, 2)[:2]
+                field.barcode = max(to_int(h, 1), 1)
+            elif cmd == "GB":
+                w, h, t, c, r = parse_params(params, 5)[:5]
+                field.box = (to_int(w, 1), to_int(h, 1), to_int(t, 1), c or "B", to_int(r))
+            elif cmd == "GF":
+                field.graphic = params
+            elif cmd == "XG":
+                name = parse_params(params, 1)[0].split(":")[-1].split(".")[0]
+                field.graphic = self.stored.get(name)
+            elif cmd == "FD":
+                field.data = params
+            elif cmd == "LR":
+                self.reverse_all = params.startswith("Y")
+                field.reverse = self.reverse_all
+            elif cmd == "FS":
+                self.draw_field(field)
+                field = None
+
+        return self.canvas.convert("1")
+
+    def draw_field(self, field):
+
+        if field.box is not None:
+            mask, color = box_mask(*field.box)
+        elif field.graphic is not None:
+            mask, color = graphic_mask(field.graphic), 0
+        elif field.barcode is not None and field.data is not None:
+            mask, color = datamatrix.symbol_image(field.data, field.barcode), 0
+        elif field.data is not None:
+            mask, dx, dy = text_mask(field.data, field.font or self.default_font, field.block)
+            self.composite(mask, field.x + dx, field.y + dy, 0, field.reverse)
+            return
+        else:
+            return
+
+        self.composite(mask, field.x, field.y, color, field.reverse)
+
+    def composite(self, mask, x, y, color=0, reverse=False):
+
+        w, h = mask.size
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + w, self.size[0]), min(y + h, self.size[1])
+        if right <= left or bottom <= top:
+            return
+
+        mask = mask.crop((left - x, top - y, right - x, bottom - y))
+        box = (left, top, right, bottom)
+
+        if reverse:
+            region = self.canvas.crop(box)
+            region.paste(ImageChops.invert(region), (0, 0), mask)
+            self.canvas.paste(region, box)
+        else:
+            self.canvas.paste(color, box, mask)
+
+# The masks below are shared through their caches, composite only ever reads them.
+# Most of a strip repeats from label to label (type codes, boxes, logos), so after the
+# first label only the serials and their DataMatrix symbols are drawn
+@lru_cache(maxsize=MASK_CACHE)
+def box_mask(w, h, t, color, rounding):
+
+    w = max(w, t)
+    h = max(h, t)
+    mask = Image.new("L", (w, h), 0)
+    draw = ImageDraw.Draw(mask)
+    radius = int(min(w, h) / 2 * rounding / 8)
+
+    if t * 2 >= min(w, h):
+        draw.rounded_rectangle((0, 0, w - 1, h - 1), radius=radius, fill=255)
+    else:
+        draw.rounded_rectangle((0, 0, w - 1, h - 1), radius=radius, outline=255, width=t)
+
+    return mask, (255 if color == "W" else 0)
+
+@lru_cache(maxsize=MASK_CACHE)
+def graphic_mask(params):
+
+    # ACS data has commas of its own
+    fmt, _, total, row_bytes, data = (params.split(",", 4) + [""] * 5)[:5]
+    total = to_int(total)
+    row_bytes = to_int(row_bytes, 1)
+    raw = decode_graphic(data, total, row_bytes)
+
+    return Image.frombytes("1", (row_bytes * 8, total // row_bytes), raw).convert("L")
+
+@lru_cache(maxsize=MASK_CACHE)
+def text_mask(data, font, block):
+
+    # font is (orientation, height, width), block the ^FB (width, lines, spacing, justification)
+    orientation, h, w = font
+    h = max(h, 1)
+    lines = data.split("\\&")
+    if block is None:
+        lines = [" ".join(lines).strip()]
+    else:
+        lines = lines[:block[1]]
+
+    glyphs = [line_mask(line, h, w) for line in lines]
+    text_w = max(g.size[0] for g in glyphs)
+    block_w = block[0] if block else text_w
+    just = block[3] if block else "L"
+
+    # Text wider than its ^FB block spills over the edges like on the printer
+    overflow = max(text_w - block_w, 0)
+    if just == "C":
+        dx = -(overflow // 2)
+    elif just == "R":
+        dx = -overflow
+    else:
+        dx = 0
+
+    mask = Image.new("L", (max(block_w, 1) + overflow, h * len(lines)), 0)
+    for i, glyph in enumerate(glyphs):
+        if just == "C":
+            lx = (block_w - glyph.size[0]) // 2 - dx
+        elif just == "R":
+            lx = block_w - glyph.size[0] - dx
+        else:
+            lx = 0
+        mask.paste(glyph, (lx, i * h))
+
+    if orientation == "R":
+        return mask.transpose(Image.ROTATE_270), 0, dx
+    elif orientation == "I":
+        return mask.transpose(Image.ROTATE_180), 0, 0
+    elif orientation == "B":
+        return mask.transpose(Image.ROTATE_90), 0, dx
+
+    return mask, dx, 0
+
+@lru_cache(maxsize=MASK_CACHE)
+def glyph_mask(char, h):
+
+    # Atlas entry: one character as FreeType draws it inside a line, or None when its
+    # advance is not whole dots or its ink reaches outside the advance
+    font = get_font(h)
+    advance = font.getlength(char)
+    if advance < 1 or advance != int(advance):
+        return None
+
+    advance = int(advance)
+    glyph = Image.new("L", (advance + 2 * h, h), 0)
+    ImageDraw.Draw(glyph).text((h, int(h * 0.8)), char, fill=255, font=font, anchor="ls")
+    bbox = glyph.getbbox()
+    if bbox is not None and (bbox[0] < h or bbox[2] > h + advance):
+        return None
+
+    return glyph.crop((h, 0, h + advance, h))
+
+def line_mask(line, h, w):
+
+    font = get_font(h)
+    length = font.getlength(line)
+    width = max(int(length), 1)
+
+    # Lines of atlas characters without kerning are pasted together from the atlas,
+    # dot for dot what FreeType draws for the whole line
+    glyphs = [glyph_mask(char, h) for char in line]
+    if line and None not in glyphs and sum(g.size[0] for g in glyphs) == length:
+        glyph = Image.new("L", (width, h), 0)
+        x = 0
+        for g in glyphs:
+            glyph.paste(g, (x, 0))
+            x += g.size[0]
+    else:
+        glyph = Image.new("L", (width, h), 0)
+        ImageDraw.Draw(glyph).text((0, int(h * 0.8)), line, fill=255, font=font, anchor="ls")
+
+    scaled = max(int(width * FONT_CONDENSE * w / h), 1)
+    if scaled != width:
+        glyph = glyph.resize((scaled, h), Image.NEAREST)
+
+    return glyph
+
+def render_zpl(zpl, width, height, dpmm=8.0, index=0):
+
+    return ZPLRenderer(width, height, dpmm).render(zpl, index)
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a ZPL file to PNG without a printer or network")
+    parser.add_argument("input", help="ZPL file to render")
+    parser.add_argument("--width", type=float, default=88.9, help="Label width in mm (default: 88.9)")
+    parser.add_argument("--height", type=float, default=25.375, help="Label height in mm (default: 25.375)")
+    parser.add_argument("--dpmm", type=float, default=8.0, help="Printer dots per mm (default: 8)")
+    parser.add_argument("--index", type=int, default=0, help="Which ^XA...^XZ label in the file to render")
+    parser.add_argument("--output", default="tmp/tmp_label.png", help="Output PNG path")
+    args = parser.parse_args()
+
+    with open(args.input, "r") as f:
+        zpl = f.read()
+
+    render_zpl(zpl, args.width, args.height, args.dpmm, args.index).save(args.output)
+    print("Rendered label {} of {} to {}".format(args.index, args.input, args.output))
+
+if __name__ == "__main__":
+    main()